@@ -0,0 +1,508 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+
+import change_feed
+import enhancement_cleaning
+import memory_budget
+import page_fetch
+import recipe_extraction
+from batch_records import LogEntry, ScrapeResult
+from scraper_metrics import MetricsRegistry
+from scraper_profiling import profile_mode, profile_run
+
+
+def load_recipes(path):
+    """Read a batch list: a JSON array of {id, title, url}, one JSON object, or JSONL with one recipe per line
+
+    Always returns a list.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+class BatchScraper:
+    """Headless batch scraping engine shared by the GUI and the benchmarks
+
+    Scrapes a list of {id, title, url} recipes, writes one JSON file per recipe
+    (or one row per recipe when given a StagingStore) plus batch_scrape_log.json
+    and batch_scrape_metrics.* into results_dir, and optionally upserts each
+    result into Supabase. A RecrawlScheduler, if given, records each result's
+    content hash so later runs can skip pages that rarely change, and each
+    failure so failing pages back off.
+
+    When clean_workers (or PANTRYPAL_CLEAN_WORKERS) turns cleaning on, every
+    result is also run through rule-based cleaning in a process pool while the fetch
+    threads carry on, and saved with both `enhancements` (raw) and
+    `cleaned_enhancements`.
+
+    A change_feed.ChangeFeed, if given, compares each result with the previous
+    runs and writes the added/modified/removed recipes to
+    results_dir/changes/<timestamp>.jsonl (pages answering 404/410 count as
+    removed). The feed is closed even when the run fails, and every event in
+    it stays there for change_feed.py apply to replay if a consumer fails.
+
+    With memory_budget_mb (or PANTRYPAL_MEMORY_BUDGET_MB), no new recipe is
+    started while the process RSS is over the budget and other recipes are
+    still in flight; see memory_budget.py.
+
+    Callbacks (all optional) let a caller follow progress:
+        on_log(message)
+        on_recipe_start(index, total, recipe, site_type)
+        on_recipe_done(index, total, recipe, enhancements_or_None)
+
+    should_stop() is polled before each recipe; once it returns True the
+    remaining recipes are logged as 'cancelled' instead of being fetched.
+
+    run() scrapes a list in-process; run_queue() instead leases recipes from
+    a shared work_queue.WorkQueue so several workers can split one list.
+    """
+
+    def __init__(self, results_dir, supabase_client=None, concurrency=1, delay_range=(1.5, 3.0),
+                 timeout=15, max_retries=2, max_retry_after=30.0, max_bytes=None, early_stop=None, jsonld_fast_path=True,
+                 http2=None, clean_workers=None, staging_store=None, scheduler=None, change_feed=None, memory_budget_mb=None,
+                 on_log=None, on_recipe_start=None, on_recipe_done=None, should_stop=None):
+        self.results_dir = results_dir
+        self.supabase_client = supabase_client
+        self.staging_store = staging_store
+        self.scheduler = scheduler
+        self.change_feed = change_feed
+        self.run_id = None
+        self.concurrency = max(1, int(concurrency))
+        self.delay_range = delay_range
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.max_bytes = page_fetch.max_page_bytes() if max_bytes is None else max_bytes
+        self.early_stop = page_fetch.early_stop_enabled() if early_stop is None else early_stop
+        self.jsonld_fast_path = jsonld_fast_path
+        self.on_log = on_log or print
+        self.on_recipe_start = on_recipe_start
+        self.on_recipe_done = on_recipe_done
+        self.should_stop = should_stop
+        self.metrics = MetricsRegistry()
+        self.profile_artefacts = None
+        self.clean_workers = enhancement_cleaning.clean_workers(clean_workers)
+        self.cleaning = None
+        self.change_counts = None
+
+        # memory_budget_mb=None follows PANTRYPAL_MEMORY_BUDGET_MB; 0 turns the budget off
+        limit = memory_budget.budget_bytes(memory_budget_mb)
+        self.memory_budget = memory_budget.MemoryBudget(limit) if limit else None
+        if self.memory_budget and not memory_budget.rss_supported():
+            self.on_log("Memory budget set but the process RSS cannot be read here (no /proc, no psutil); ignoring it")
+            self.memory_budget = None
+
+        # http2=None follows PANTRYPAL_HTTP2; True or 'h2c' asks for it outright
+        self.http2 = page_fetch.http2_mode(http2)
+        if self.http2 and not page_fetch.http2_available():
+            if http2 is not None:
+                raise RuntimeError("HTTP/2 fetching needs httpx with HTTP/2 support: pip install 'httpx[http2]'")
+            self.on_log(f"{page_fetch.HTTP2_ENV} is set but httpx[http2] is not installed; using HTTP/1.1")
+            self.http2 = None
+        if self.http2:
+            # One connection per host, with every worker thread's requests multiplexed on it
+            self.session = page_fetch.Http2Session(recipe_extraction.REQUEST_HEADERS, self.concurrency, self.http2)
+        else:
+            # One pooled session so keep-alive connections are reused across recipes
+            # (requests is imported here so the GUI can start without loading it)
+            import requests
+            from requests.adapters import HTTPAdapter
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            self.session.headers.update(recipe_extraction.REQUEST_HEADERS)
+
+    def run(self, recipes):
+        """Scrape every recipe and return the results log"""
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        entries = [None] * len(recipes)
+        batch_start = time.perf_counter()
+        if self.staging_store:
+            self.run_id = self.staging_store.start_run()
+
+        with profile_run('batch_scrape', self.results_dir) as profile_artefacts, self._change_feed_run(), self._cleaning_stage():
+            if self.concurrency == 1:
+                for i, recipe in enumerate(recipes, 1):
+                    entries[i - 1] = self._process(i, len(recipes), recipe)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='batch') as executor:
+                    # Submit one recipe per worker thread as others finish (not the whole list upfront),
+                    # so the memory budget can hold intake back
+                    in_flight = {}
+                    pending = iter(enumerate(recipes, 1))
+                    exhausted = False
+                    while True:
+                        while not exhausted and len(in_flight) < self.concurrency and self._allows_intake(in_flight):
+                            item = next(pending, None)
+                            if item is None:
+                                exhausted = True
+                                break
+                            i, recipe = item
+                            in_flight[executor.submit(self._process, i, len(recipes), recipe)] = i
+                        if not in_flight:
+                            break
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            entries[in_flight.pop(future) - 1] = future.result()
+        self.profile_artefacts = profile_artefacts
+        return self._finish(entries, batch_start, "batch_scrape_log.json", "batch_scrape_metrics")
+
+    def run_queue(self, queue, worker_id, lease_seconds=300):
+        """Lease recipes from a work queue until it is empty, acking each one; returns this worker's log
+
+        Up to `concurrency` recipes are leased at a time and a background thread
+        renews the leases every lease_seconds / 3. Cancelled recipes are released
+        back to the queue for other workers. The log and metrics are written as
+        batch_scrape_log_<worker_id>.json / batch_scrape_metrics_<worker_id>.*.
+        """
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        entries = []
+        batch_start = time.perf_counter()
+        if self.staging_store:
+            self.run_id = self.staging_store.start_run()
+
+        stop_renewing = threading.Event()
+        renewer = threading.Thread(target=self._renew_leases, args=(queue, worker_id, lease_seconds, stop_renewing),
+                                   name='lease-renewer', daemon=True)
+        renewer.start()
+        try:
+            with profile_run('batch_scrape', self.results_dir) as profile_artefacts, \
+                    self._change_feed_run(f"_{worker_id}"), self._cleaning_stage():
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='batch') as executor:
+                    in_flight = {}
+                    leased = 0
+                    while True:
+                        # Top up to one leased recipe per worker thread
+                        stopping = self.should_stop and self.should_stop()
+                        if not stopping and len(in_flight) < self.concurrency and self._allows_intake(in_flight):
+                            for recipe in queue.lease(worker_id, self.concurrency - len(in_flight), lease_seconds):
+                                leased += 1
+                                in_flight[executor.submit(self._process, leased, '?', recipe)] = recipe
+                        if not in_flight:
+                            break
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            recipe = in_flight.pop(future)
+                            entry = future.result()
+                            entries.append(entry)
+                            if entry['status'] == 'cancelled':
+                                queue.release(worker_id, [recipe['id']])
+                            elif not queue.ack(worker_id, recipe['id'], entry['status'], entry.get('error')):
+                                self.metrics.inc('queue_lost_leases_total')
+                                self.on_log(f"Lease on recipe {recipe['id']} expired before it finished")
+        finally:
+            stop_renewing.set()
+            renewer.join()
+        self.profile_artefacts = profile_artefacts
+        self.metrics.inc('queue_leases_total', value=leased)
+        return self._finish(entries, batch_start, f"batch_scrape_log_{worker_id}.json", f"batch_scrape_metrics_{worker_id}")
+
+    @contextmanager
+    def _change_feed_run(self, suffix=''):
+        """Open this run's change feed file and close it afterwards, even when the run fails"""
+        if not self.change_feed:
+            yield
+            return
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}{suffix}.jsonl"
+        self.change_feed.open_feed(os.path.join(self.results_dir, 'changes', name))
+        try:
+            yield
+        finally:
+            self.change_counts = self.change_feed.close_feed()
+
+    @contextmanager
+    def _cleaning_stage(self):
+        """Start the cleaning worker processes for one run and stop them afterwards"""
+        if self.clean_workers is None:
+            yield
+            return
+        self.cleaning = enhancement_cleaning.CleaningStage(self.clean_workers, profile_dir=self.results_dir)
+        try:
+            yield
+        finally:
+            self.cleaning.close()
+            self.cleaning = None
+            if self.clean_workers and profile_mode():
+                self.on_log(f"Cleaning worker profiles written: {self.results_dir}/profile_clean_worker_*")
+
+    def _allows_intake(self, in_flight):
+        if not self.memory_budget:
+            return True
+        if self.memory_budget.allows_intake(len(in_flight)):
+            return True
+        self.metrics.inc('memory_throttled_total')
+        return False
+
+    def _renew_leases(self, queue, worker_id, lease_seconds, stop):
+        while not stop.wait(lease_seconds / 3):
+            try:
+                queue.renew(worker_id, lease_seconds)
+            except Exception as e:
+                self.on_log(f"Could not renew leases: {e}")
+
+    def _finish(self, entries, batch_start, log_name, metrics_name):
+        """Tally the entries, write the results log and metrics, and return the log"""
+        results_log = {
+            'total': len(entries),
+            'successful': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'changed': 0,
+            'truncated': 0,
+            'cleaned_points': 0,
+            'extraction_paths': {path: 0 for path in recipe_extraction.EXTRACTION_PATHS},
+            'recipes': []
+        }
+        for entry in entries:
+            if entry['status'] == 'success':
+                results_log['successful'] += 1
+            elif entry['status'] == 'cancelled':
+                results_log['cancelled'] += 1
+            else:
+                results_log['failed'] += 1
+            if entry.get('truncated'):
+                results_log['truncated'] += 1
+            if entry.get('changed'):
+                results_log['changed'] += 1
+            results_log['cleaned_points'] += entry.get('cleaned_count', 0)
+            if 'extraction_path' in entry:
+                results_log['extraction_paths'][entry['extraction_path']] += 1
+            results_log['recipes'].append(entry.to_dict())
+        if self.change_feed:
+            results_log['changes'] = self.change_counts
+            results_log['change_feed'] = self.change_feed.feed_path
+
+        # Record run-level throughput
+        wall_time = time.perf_counter() - batch_start
+        self.metrics.set_gauge('batch_wall_seconds', round(wall_time, 3))
+        self.metrics.set_gauge('batch_recipes_per_second', round(len(entries) / wall_time, 4) if wall_time else 0)
+        self.metrics.set_gauge('batch_concurrency', self.concurrency)
+        if self.memory_budget:
+            self.metrics.set_gauge('memory_budget_bytes', self.memory_budget.limit_bytes)
+            self.metrics.set_gauge('peak_rss_bytes', self.memory_budget.peak_rss)
+            self.metrics.set_gauge('memory_gc_collections', self.memory_budget.collections)
+            results_log['memory'] = {
+                'budget_mb': round(self.memory_budget.limit_bytes / 1048576, 1),
+                'peak_rss_mb': round(self.memory_budget.peak_rss / 1048576, 1),
+                'throttled': self.memory_budget.throttled,
+            }
+
+        # Save the results log and metrics side by side
+        log_file = os.path.join(self.results_dir, log_name)
+        with open(log_file, 'w', encoding='utf-8') as f:
+            json.dump(results_log, f, indent=2, ensure_ascii=False)
+        self.metrics.export(self.results_dir, metrics_name)
+        if self.staging_store:
+            self.staging_store.finish_run(self.run_id, results_log)
+
+        if self.profile_artefacts:
+            self.on_log(f"Profile written: {', '.join(self.profile_artefacts)}")
+        self.on_log(f"Batch timings: {self.metrics.summary(['fetch', 'jsonld', 'parse', 'extract', 'clean_wait', 'supabase_upsert'])}")
+        paths = results_log['extraction_paths']
+        if results_log['successful']:
+            shares = ", ".join(f"{path} {count / results_log['successful']:.0%}" for path, count in paths.items())
+            self.on_log(f"Extraction paths: {shares}")
+        if self.change_feed:
+            changes = results_log['changes']
+            self.on_log(f"Changes: {changes['added']} added, {changes['modified']} modified, {changes['removed']} removed, "
+                        f"{changes['unchanged']} unchanged ({results_log['change_feed']})")
+        return results_log
+
+    def fetch(self, url, site_type):
+        """Stream a page within the byte budget, honouring 429 Retry-After up to max_retries"""
+        for attempt in range(self.max_retries + 1):
+            with self.metrics.timer('fetch', site=site_type):
+                page = page_fetch.fetch_page(self.session, url, site_type, self.timeout,
+                                             max_bytes=self.max_bytes or 0, early_stop=self.early_stop)
+            self.metrics.inc('http_responses_total', site=site_type, code=page.status_code)
+            self.metrics.inc('http_protocol_total', site=site_type, version=page.http_version)
+            if page.status_code != 429 or attempt == self.max_retries:
+                break
+            retry_after = _retry_after_seconds(page.headers.get('Retry-After'))
+            self.metrics.inc('rate_limited_retries_total', site=site_type)
+            with self.metrics.timer('rate_limit_wait', site=site_type):
+                time.sleep(min(retry_after, self.max_retry_after))
+        page.raise_for_status()
+        self.metrics.inc('bytes_fetched_total', page.bytes_read, site=site_type)
+        self.metrics.inc('fetch_stop_total', site=site_type, reason=page.stop_reason)
+        if page.truncated:
+            self.metrics.inc('pages_truncated_total', site=site_type)
+        return page
+
+    def scrape_recipe(self, recipe, site_type):
+        """Fetch, parse, extract and (with a cleaning stage) clean one recipe, returning a ScrapeResult"""
+        page = self.fetch(recipe['url'], site_type)
+
+        # Structured data fast path: no DOM parse when JSON-LD has tips/notes
+        enhancements = []
+        if self.jsonld_fast_path:
+            with self.metrics.timer('jsonld', site=site_type):
+                enhancements = recipe_extraction.extract_jsonld_enhancements(page.content)
+            path = 'jsonld'
+
+        if not enhancements:
+            from bs4 import BeautifulSoup
+            with self.metrics.timer('parse', site=site_type):
+                soup = BeautifulSoup(page.content, "html.parser")
+
+            # Extract enhancements
+            with self.metrics.timer('extract', site=site_type):
+                enhancements = recipe_extraction.extract_enhancements(soup, site_type)
+                path = 'site'
+                if not enhancements:
+                    self.metrics.inc('generic_fallback_total', site=site_type)
+                    enhancements = recipe_extraction.extract_generic_enhancements(soup)
+                    path = 'generic'
+            # The tree is full of parent/child reference cycles; break them now rather than at the next gc pass
+            soup.decompose()
+        page.release()
+        self.metrics.inc('extraction_path_total', site=site_type, path=path)
+        self.metrics.inc('enhancements_extracted_total', len(enhancements), site=site_type)
+        if not enhancements:
+            self.metrics.inc('empty_extractions_total', site=site_type)
+        cleaning = self.cleaning.submit(enhancements, site_type) if self.cleaning and enhancements else None
+
+        result = ScrapeResult(
+            recipe_id=recipe['id'],
+            recipe_title=recipe['title'],
+            url=recipe['url'],
+            site_type=site_type,
+            enhancements=enhancements,
+            enhancement_count=len(enhancements),
+            extraction_path=path,
+            bytes_read=page.bytes_read,
+            truncated=page.truncated,
+            scraped_at=datetime.now().isoformat()
+        )
+        if self.cleaning:
+            # Only this recipe's thread waits; the cleaning runs in a worker process, outside the GIL
+            with self.metrics.timer('clean_wait', site=site_type):
+                result['cleaned_enhancements'] = cleaning.result() if cleaning else []
+            self.metrics.inc('cleaned_points_total', len(result['cleaned_enhancements']), site=site_type)
+        return result
+
+    def save_result(self, result):
+        """Write the per-recipe JSON file (or staging row) and upsert to Supabase if connected
+
+        Returns whether the content changed since the last scrape (always True without a scheduler).
+        """
+        if self.staging_store:
+            with self.metrics.timer('save_staging'):
+                self.staging_store.save_result(result, self.run_id)
+        else:
+            result_file = os.path.join(self.results_dir, f"{result['recipe_id']}_enhancements.json")
+            with self.metrics.timer('save_file'):
+                with open(result_file, 'w', encoding='utf-8') as f:
+                    json.dump(result.to_dict(), f, indent=2, ensure_ascii=False)
+
+        if self.supabase_client:
+            db_data = {
+                'recipe_id': str(result['recipe_id']),
+                'enhancements': result['enhancements'],
+                'source': result['url']
+            }
+            try:
+                with self.metrics.timer('supabase_upsert', table='scraped_enhancements'):
+                    self.supabase_client.table('scraped_enhancements').upsert(db_data).execute()
+            except Exception:
+                self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='error')
+                raise
+            self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='success')
+
+        if self.change_feed:
+            op = self.change_feed.record(result)
+            self.metrics.inc('changes_total', site=result['site_type'], op=op or 'unchanged')
+
+        if not self.scheduler:
+            return True
+        changed = self.scheduler.record(result)
+        self.metrics.inc('content_checks_total', site=result['site_type'], changed=str(changed).lower())
+        return changed
+
+    def _process(self, index, total, recipe):
+        """Scrape and save one recipe, returning its results log entry"""
+        if self.should_stop and self.should_stop():
+            self.metrics.inc('recipes_total', status='cancelled')
+            return LogEntry(id=recipe['id'], title=recipe['title'], status='cancelled', elapsed_seconds=0.0)
+
+        site_type = recipe_extraction.detect_site_type(recipe['url'])
+        self.on_log(f"Processing recipe {index}/{total}: {recipe['title']}")
+        if self.on_recipe_start:
+            self.on_recipe_start(index, total, recipe, site_type)
+
+        start = time.perf_counter()
+        try:
+            result = self.scrape_recipe(recipe, site_type)
+            changed = self.save_result(result)
+            elapsed = time.perf_counter() - start
+            self.metrics.observe('recipe_seconds', elapsed, site=site_type)
+            self.metrics.inc('recipes_total', status='success', site=site_type)
+            if self.on_recipe_done:
+                self.on_recipe_done(index, total, recipe, result['enhancements'])
+            entry = LogEntry(
+                id=recipe['id'],
+                title=recipe['title'],
+                status='success',
+                enhancement_count=result['enhancement_count'],
+                extraction_path=result['extraction_path'],
+                bytes_read=result['bytes_read'],
+                elapsed_seconds=round(elapsed, 4)
+            )
+            if 'cleaned_enhancements' in result:
+                entry['cleaned_count'] = len(result['cleaned_enhancements'])
+            if self.scheduler:
+                entry['changed'] = changed
+            if result['truncated']:
+                entry['truncated'] = True
+                self.on_log(f"Recipe {recipe['id']} page cut at {result['bytes_read']} bytes (max page size)")
+
+            # Add a small delay to avoid being blocked
+            if self.delay_range and self.delay_range[1] > 0:
+                with self.metrics.timer('politeness_delay'):
+                    time.sleep(random.uniform(*self.delay_range))
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe('recipe_seconds', elapsed, site=site_type)
+            self.metrics.inc('recipes_total', status='failed', site=site_type)
+            error_msg = str(e)
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            self.on_log(f"Error processing recipe {recipe['id']}: {error_msg}")
+            if self.change_feed and status in change_feed.GONE_STATUSES and self.change_feed.remove(recipe['id']):
+                self.metrics.inc('changes_total', site=site_type, op='removed')
+            if self.scheduler:
+                self.scheduler.record_failure(recipe['id'], recipe['url'], error=error_msg)
+                self.metrics.inc('recrawl_failures_total', site=site_type)
+            if self.on_recipe_done:
+                self.on_recipe_done(index, total, recipe, None)
+            entry = LogEntry(
+                id=recipe['id'],
+                title=recipe['title'],
+                status='failed',
+                error=error_msg,
+                elapsed_seconds=round(elapsed, 4)
+            )
+            if status:
+                entry['http_status'] = status
+        return entry
+
+
+def _retry_after_seconds(value, default=1.0):
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
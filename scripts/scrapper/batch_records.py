@@ -0,0 +1,65 @@
+"""Compact record types for the batch engine
+
+A batch keeps one results-log entry per recipe for the whole run and one
+result per recipe in flight. As dicts, every one of them carries its own hash
+table; these classes keep the same fields in __slots__ instead (roughly a
+third of the size). They read like the dicts they replace, e.g.
+entry['status'], entry.get('error') and 'changed' in entry, so the stores,
+the schedulers and the change feed take them unchanged. to_dict() gives the
+JSON form, leaving out optional fields that were never set.
+"""
+
+
+class _Record:
+    """Dict-style read access over __slots__; optional fields count as missing while None"""
+
+    __slots__ = ()
+    _required = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"{type(self).__name__} has no fields {', '.join(fields)}")
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.__slots__ else None
+        if value is None and key not in self._required:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and (key in self._required or getattr(self, key) is not None)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return [name for name in self.__slots__ if name in self]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ScrapeResult(_Record):
+    """One recipe's scrape: the fields of <recipe_id>_enhancements.json"""
+
+    __slots__ = ('recipe_id', 'recipe_title', 'url', 'site_type', 'enhancements', 'enhancement_count',
+                 'extraction_path', 'bytes_read', 'truncated', 'scraped_at', 'cleaned_enhancements')
+    _required = __slots__[:-1]
+
+
+class LogEntry(_Record):
+    """One recipe's line in the results log (batch_scrape_log.json "recipes")"""
+
+    __slots__ = ('id', 'title', 'status', 'error', 'enhancement_count', 'extraction_path', 'bytes_read',
+                 'elapsed_seconds', 'http_status', 'cleaned_count', 'changed', 'truncated')
+    _required = ('id', 'title', 'status', 'elapsed_seconds')
@@ -0,0 +1,171 @@
+"""End-to-end batch benchmark against the local replay server
+
+Generates N synthetic recipes spread across the fixture sites, drives them
+through BatchScraper against an in-process ReplayServer and reports wall
+time, throughput and per-recipe latency percentiles.
+
+With --check it doubles as a regression test for the batch engine: every
+recipe must be accounted for, and every successful result must match the
+fixture's expected_enhancements.json entry (exit code 1 otherwise).
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_batch.py --recipes 200 --concurrency 8 --latency-ms 80
+    python scripts/scrapper/benchmarks/bench_batch.py --recipes 50 --throttle-rate 0.1 --check
+    python scripts/scrapper/benchmarks/bench_batch.py --recipes 400 --bloat-kb 512 --concurrency 32 --memory-budget-mb 120
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_engine import BatchScraper
+from staging_store import StagingStore
+from replay_server import DEFAULT_FIXTURE, FIXTURES_DIR, ReplayServer, add_config_arguments, config_from_args
+
+SITES = ['allrecipes', 'foodnetwork', 'epicurious', 'bbcgoodfood', 'simplyrecipes', 'seriouseats', 'myfoodblog', 'jsonld_blog']
+
+
+def synthetic_recipes(base_url, count):
+    """Build a batch list cycling through every fixture site"""
+    return [
+        {
+            'id': 100000 + i,
+            'title': f"Synthetic recipe {i}",
+            'url': f"{base_url}/{SITES[i % len(SITES)]}/recipe/{100000 + i}"
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def check_results(recipes, results_log, results_dir, store=None):
+    """Verify the batch output against the recorded expected enhancements"""
+    with open(os.path.join(FIXTURES_DIR, 'expected_enhancements.json'), 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    problems = []
+    accounted = results_log['successful'] + results_log['failed'] + results_log['cancelled']
+    if accounted != len(recipes):
+        problems.append(f"{len(recipes)} recipes submitted but {accounted} accounted for")
+    logged_ids = [entry['id'] for entry in results_log['recipes']]
+    if logged_ids != [recipe['id'] for recipe in recipes]:
+        problems.append("results log order or ids do not match the input list")
+
+    for recipe, entry in zip(recipes, results_log['recipes']):
+        if entry['status'] != 'success':
+            continue
+        site = recipe['url'].split('/')[3]
+        expected = golden.get(site, golden[DEFAULT_FIXTURE])
+        if store:
+            result = store.get(recipe['id'])
+        else:
+            with open(os.path.join(results_dir, f"{recipe['id']}_enhancements.json"), 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        if result['enhancements'] != expected:
+            problems.append(f"recipe {recipe['id']} ({site}) output differs from expected_enhancements.json")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batch scraping against a local replay server")
+    parser.add_argument('--recipes', type=int, default=100, help="number of synthetic recipes")
+    parser.add_argument('--concurrency', type=int, default=1, help="BatchScraper worker threads")
+    parser.add_argument('--delay', type=float, nargs=2, default=(0.0, 0.0), metavar=('MIN', 'MAX'),
+                        help="politeness delay range in seconds (GUI default is 1.5 3.0)")
+    parser.add_argument('--max-retries', type=int, default=2, help="429 retries per recipe")
+    parser.add_argument('--max-bytes', type=int, default=None, help="per-page byte cap (0 = unlimited, default from env)")
+    parser.add_argument('--no-early-stop', action='store_true', help="always read pages to the end")
+    parser.add_argument('--results-dir', help="keep results here instead of a temp directory")
+    parser.add_argument('--staging', action='store_true', help="write results to a SQLite staging store in the results dir")
+    parser.add_argument('--http2', action='store_true', help="serve and fetch over cleartext HTTP/2 (needs httpx[http2])")
+    parser.add_argument('--clean-workers', help="cleaning stage: auto, worker processes, 0 = on the fetch threads, off (default from env, else off)")
+    parser.add_argument('--memory-budget-mb', type=float, help="hold intake back above this RSS (0 = none, default from env)")
+    parser.add_argument('--check', action='store_true', help="fail if any output differs from the fixtures")
+    parser.add_argument('--json', dest='json_path', help="also write the report to this JSON file")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with ReplayServer(config_from_args(args), http2=args.http2) as server:
+        recipes = synthetic_recipes(server.url, args.recipes)
+        with tempfile.TemporaryDirectory(prefix='bench_batch_') as tmp_dir:
+            results_dir = args.results_dir or tmp_dir
+            store = StagingStore(os.path.join(results_dir, 'staging.sqlite3')) if args.staging else None
+            engine = BatchScraper(
+                results_dir,
+                staging_store=store,
+                concurrency=args.concurrency,
+                delay_range=tuple(args.delay),
+                max_retries=args.max_retries,
+                max_bytes=args.max_bytes,
+                early_stop=False if args.no_early_stop else None,
+                http2='h2c' if args.http2 else False,
+                clean_workers=args.clean_workers,
+                memory_budget_mb=args.memory_budget_mb,
+                on_log=lambda message: None
+            )
+            start = time.perf_counter()
+            results_log = engine.run(recipes)
+            wall = time.perf_counter() - start
+            problems = check_results(recipes, results_log, results_dir, store) if args.check else []
+            if store:
+                store.close()
+
+    latencies = [entry['elapsed_seconds'] for entry in results_log['recipes']]
+    bytes_read = [entry['bytes_read'] for entry in results_log['recipes'] if 'bytes_read' in entry]
+    report = {
+        'recipes': len(recipes),
+        'concurrency': args.concurrency,
+        'protocol': 'h2c' if args.http2 else 'HTTP/1.1',
+        'clean_workers': engine.clean_workers,
+        'cleaned_points': results_log['cleaned_points'],
+        'successful': results_log['successful'],
+        'failed': results_log['failed'],
+        'truncated': results_log['truncated'],
+        'extraction_paths': results_log['extraction_paths'],
+        'avg_page_kb': round(sum(bytes_read) / len(bytes_read) / 1024, 1) if bytes_read else 0.0,
+        'wall_seconds': round(wall, 3),
+        'recipes_per_second': round(len(recipes) / wall, 2) if wall else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'latency_max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        'server': dict(server.stats),
+    }
+    if resource:
+        # ru_maxrss is in KB on Linux (bytes on macOS); it covers the replay server threads too
+        report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if 'memory' in results_log:
+        report['memory_budget'] = results_log['memory']
+
+    for key, value in report.items():
+        print(f"{key:<20} {value}")
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    for problem in problems:
+        print(f"CHECK FAILED: {problem}")
+    if args.check and not problems:
+        print("CHECK PASSED")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
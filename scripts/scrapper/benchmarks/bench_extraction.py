@@ -0,0 +1,201 @@
+"""Offline benchmark for the recipe enhancement extractors
+
+Runs every HTML fixture in benchmarks/fixtures through each installed parser
+backend and reports pages/second, peak memory, enhancements extracted and
+which extraction path (JSON-LD, site selectors, generic) served the page.
+Output is compared against expected_enhancements.json so that speed work
+cannot silently change results (exit code 1 on any mismatch). With
+--no-jsonld, pages the fast path serves (jsonld_blog) are compared against
+their DOM output in expected_dom_enhancements.json instead, so the site and
+generic extractors stay covered either way.
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_extraction.py
+    python scripts/scrapper/benchmarks/bench_extraction.py --iterations 50 --parsers lxml
+    python scripts/scrapper/benchmarks/bench_extraction.py --no-jsonld
+    python scripts/scrapper/benchmarks/bench_extraction.py --update-golden
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+import recipe_extraction
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+GOLDEN_FILE = os.path.join(FIXTURES_DIR, 'expected_enhancements.json')
+# DOM extractor output of the fixtures the JSON-LD fast path serves, checked under --no-jsonld
+DOM_GOLDEN_FILE = os.path.join(FIXTURES_DIR, 'expected_dom_enhancements.json')
+PARSERS = ['html.parser', 'lxml', 'html5lib']
+GOLDEN_PARSER = 'html.parser'
+
+
+def available_parsers():
+    """Return the parser backends BeautifulSoup can use here"""
+    found = []
+    for parser in PARSERS:
+        try:
+            BeautifulSoup("<p></p>", parser)
+            found.append(parser)
+        except Exception:
+            pass
+    return found
+
+
+def load_fixtures(names=None):
+    """Load fixtures as {name: (site_type, raw bytes)}"""
+    fixtures = {}
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if not filename.endswith('.html'):
+            continue
+        name = filename[:-len('.html')]
+        if names and name not in names:
+            continue
+        site_type = name if name in recipe_extraction.SITE_TYPES else 'other'
+        with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+            fixtures[name] = (site_type, f.read())
+    return fixtures
+
+
+def run_once(content, site_type, parser, jsonld=True):
+    """Extract one page, returning (parse_s, extract_s, enhancements, path)
+
+    With jsonld=True the structured-data fast path runs first and, when it
+    finds tips, the DOM is never parsed (parse_s is 0).
+    """
+    start = time.perf_counter()
+    if jsonld:
+        enhancements = recipe_extraction.extract_jsonld_enhancements(content)
+        if enhancements:
+            return 0.0, time.perf_counter() - start, enhancements, 'jsonld'
+    scanned = time.perf_counter()
+    soup = BeautifulSoup(content, parser)
+    parsed = time.perf_counter()
+    enhancements = recipe_extraction.extract_enhancements(soup, site_type)
+    path = 'site'
+    if not enhancements:
+        enhancements = recipe_extraction.extract_generic_enhancements(soup)
+        path = 'generic'
+    return parsed - scanned, time.perf_counter() - parsed + (scanned - start), enhancements, path
+
+
+def bench_fixture(content, site_type, parser, iterations, jsonld=True):
+    """Benchmark one fixture/parser pair"""
+    # Warm up once so imports and caches are not counted
+    _, _, enhancements, path = run_once(content, site_type, parser, jsonld)
+
+    parse_total = extract_total = 0.0
+    for _ in range(iterations):
+        parse_s, extract_s, _, _ = run_once(content, site_type, parser, jsonld)
+        parse_total += parse_s
+        extract_total += extract_s
+
+    # Peak memory is measured in a separate pass since tracemalloc skews timings
+    tracemalloc.start()
+    run_once(content, site_type, parser, jsonld)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = parse_total + extract_total
+    return {
+        'parser': parser,
+        'site_type': site_type,
+        'page_kb': round(len(content) / 1024, 1),
+        'parse_ms': round(parse_total / iterations * 1000, 3),
+        'extract_ms': round(extract_total / iterations * 1000, 3),
+        'pages_per_second': round(iterations / total, 1) if total else 0.0,
+        'peak_kb': round(peak / 1024, 1),
+        'enhancements': len(enhancements),
+        'path': path,
+    }, enhancements
+
+
+def load_golden(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark recipe enhancement extraction on recorded fixtures")
+    arg_parser.add_argument('--iterations', type=int, default=20, help="timed runs per fixture and parser")
+    arg_parser.add_argument('--parsers', help="comma-separated parser backends (default: all installed)")
+    arg_parser.add_argument('--fixtures', help="comma-separated fixture names (default: all)")
+    arg_parser.add_argument('--no-jsonld', action='store_true', help="skip the JSON-LD fast path (DOM extractors only)")
+    arg_parser.add_argument('--json', dest='json_path', help="also write results to this JSON file")
+    arg_parser.add_argument('--update-golden', action='store_true', help=f"rewrite expected output using {GOLDEN_PARSER}")
+    args = arg_parser.parse_args(argv)
+
+    parsers = args.parsers.split(',') if args.parsers else available_parsers()
+    fixtures = load_fixtures(args.fixtures.split(',') if args.fixtures else None)
+
+    if args.update_golden:
+        golden, dom_golden = {}, {}
+        for name, (site_type, content) in fixtures.items():
+            _, _, golden[name], path = run_once(content, site_type, GOLDEN_PARSER)
+            if path == 'jsonld':
+                dom_golden[name] = run_once(content, site_type, GOLDEN_PARSER, jsonld=False)[2]
+        for path, data in ((GOLDEN_FILE, golden), (DOM_GOLDEN_FILE, dom_golden)):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+        print(f"Wrote expected output for {len(golden)} fixtures to {GOLDEN_FILE} "
+              f"and DOM output for {len(dom_golden)} to {DOM_GOLDEN_FILE}")
+        return 0
+
+    golden = load_golden(GOLDEN_FILE)
+    if args.no_jsonld:
+        golden.update(load_golden(DOM_GOLDEN_FILE))
+
+    results = []
+    mismatches = []
+    header = f"{'fixture':<15} {'parser':<12} {'KB':>6} {'parse ms':>9} {'extract ms':>10} {'pages/s':>8} {'peak KB':>8} {'found':>5} {'path':>7}  stable"
+    print(header)
+    print("-" * len(header))
+    for name, (site_type, content) in fixtures.items():
+        for parser in parsers:
+            stats, enhancements = bench_fixture(content, site_type, parser, args.iterations, not args.no_jsonld)
+            expected = golden.get(name)
+            if expected is None:
+                stable = 'n/a'
+            elif enhancements == expected:
+                stable = 'yes'
+            else:
+                stable = 'NO'
+                mismatches.append((name, parser, expected, enhancements))
+            stats.update({'fixture': name, 'stable': stable})
+            results.append(stats)
+            print(f"{name:<15} {parser:<12} {stats['page_kb']:>6} {stats['parse_ms']:>9} {stats['extract_ms']:>10} "
+                  f"{stats['pages_per_second']:>8} {stats['peak_kb']:>8} {stats['enhancements']:>5} {stats['path']:>7}  {stable}")
+
+    for name, parser, expected, actual in mismatches:
+        print(f"\nOutput changed for {name} with {parser}:")
+        for text in expected:
+            if text not in actual:
+                print(f"  - {text}")
+        for text in actual:
+            if text not in expected:
+                print(f"  + {text}")
+        if set(expected) == set(actual):
+            print("  (same items, different order)")
+
+    paths = [stats['path'] for stats in results]
+    print("\nExtraction paths: " + ", ".join(
+        f"{path} {paths.count(path) / len(paths):.0%}" for path in recipe_extraction.EXTRACTION_PATHS
+    ))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'iterations': args.iterations, 'results': results}, f, indent=2)
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
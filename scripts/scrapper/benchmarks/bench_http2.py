@@ -0,0 +1,122 @@
+"""HTTP/1.1 vs HTTP/2 batch fetching benchmark
+
+Runs the same synthetic single-site-heavy batch through BatchScraper twice
+per concurrency level: once against the HTTP/1.1 replay server with the
+pooled requests session, and once against the h2c replay server with
+page_fetch.Http2Session, which multiplexes every worker's requests over one
+connection per host. Reports pages/second and how many connections each run
+opened, and fails if any run loses recipes or extracts different output.
+
+It also fetches bloated pages over one HTTP/2 connection with a byte cap,
+and fails unless the server sent less than a third of the full bodies and
+the connection still serves a whole page afterwards.
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_http2.py --recipes 400 --concurrency 1 4 8 16 --latency-ms 80 --jitter-ms 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import page_fetch
+from batch_engine import BatchScraper
+from bench_batch import check_results
+from replay_server import ReplayServer, add_config_arguments, config_from_args
+
+# Mostly one domain, like our real batch lists
+SITE_MIX = ['allrecipes'] * 6 + ['foodnetwork', 'myfoodblog']
+
+
+def single_site_recipes(base_url, count):
+    return [
+        {'id': 200000 + i, 'title': f"Synthetic recipe {i}",
+         'url': f"{base_url}/{SITE_MIX[i % len(SITE_MIX)]}/recipe/{200000 + i}"}
+        for i in range(count)
+    ]
+
+
+def run_once(args, concurrency, http2):
+    """Scrape the batch once; returns (pages/s, connections opened, problems)"""
+    with ReplayServer(config_from_args(args), http2=http2) as server, \
+            tempfile.TemporaryDirectory(prefix='bench_http2_') as results_dir:
+        recipes = single_site_recipes(server.url, args.recipes)
+        engine = BatchScraper(results_dir, concurrency=concurrency, delay_range=(0.0, 0.0),
+                              http2='h2c' if http2 else False, on_log=lambda message: None)
+        start = time.perf_counter()
+        results_log = engine.run(recipes)
+        wall = time.perf_counter() - start
+        engine.session.close()
+        problems = check_results(recipes, results_log, results_dir)
+        return len(recipes) / wall, server.stats['connections'], problems
+
+
+# Byte-capped fetches of padded pages, paced so a transfer that is not cancelled shows up in full
+CAPPED_FETCHES = 20
+CAP_BYTES = 64 * 1024
+CAP_BLOAT_KB = 512
+CAP_BANDWIDTH_KBPS = 8192
+
+
+def check_capped_fetches(args):
+    """Fetch bloated pages with a byte cap over one HTTP/2 connection; returns (body bytes sent, full bytes, problems)"""
+    config = config_from_args(args)
+    config.bloat_kb = max(config.bloat_kb, CAP_BLOAT_KB)
+    config.bandwidth_kbps = config.bandwidth_kbps or CAP_BANDWIDTH_KBPS
+    problems = []
+    with ReplayServer(config, http2=True) as server, page_fetch.Http2Session(mode='h2c') as session:
+        url = f"{server.url}/allrecipes/recipe/1"
+        full_bytes = len(server.page_for('/allrecipes')) * CAPPED_FETCHES
+        for _ in range(CAPPED_FETCHES):
+            page = page_fetch.fetch_page(session, url, 'allrecipes', timeout=30, max_bytes=CAP_BYTES, early_stop=False)
+            if page.stop_reason != 'max_bytes':
+                problems.append(f"capped fetch stopped at {page.stop_reason!r}, not 'max_bytes'")
+                break
+        time.sleep(0.2)  # let the server notice the last reset
+        sent = server.stats['body_bytes']
+        # A leaked flow-control window would stall this uncapped fetch on the same connection
+        page = page_fetch.fetch_page(session, url, 'allrecipes', timeout=30, max_bytes=0, early_stop=False)
+        if page.stop_reason != 'complete':
+            problems.append(f"uncapped fetch after the capped ones stopped at {page.stop_reason!r}")
+        if server.stats['connections'] != 1:
+            problems.append(f"capped fetches opened {server.stats['connections']} connections, not 1")
+    if sent * 3 > full_bytes:
+        problems.append(f"capped fetches transferred {sent} of {full_bytes} body bytes")
+    return sent, full_bytes, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare batch throughput over HTTP/1.1 and HTTP/2")
+    parser.add_argument('--recipes', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    if not page_fetch.http2_available():
+        print("httpx[http2] is not installed: pip install 'httpx[http2]'")
+        return 1
+
+    problems = []
+    print(f"{'workers':>7} {'HTTP/1.1 pages/s':>17} {'conns':>6} {'HTTP/2 pages/s':>15} {'conns':>6} {'speedup':>8}")
+    for concurrency in args.concurrency:
+        http1_rate, http1_conns, http1_problems = run_once(args, concurrency, http2=False)
+        http2_rate, http2_conns, http2_problems = run_once(args, concurrency, http2=True)
+        problems += [f"HTTP/1.1 x{concurrency}: {problem}" for problem in http1_problems]
+        problems += [f"HTTP/2 x{concurrency}: {problem}" for problem in http2_problems]
+        print(f"{concurrency:>7} {http1_rate:>17.1f} {http1_conns:>6} {http2_rate:>15.1f} {http2_conns:>6} "
+              f"{http2_rate / http1_rate:>7.2f}x")
+
+    sent, full_bytes, cap_problems = check_capped_fetches(args)
+    problems += [f"HTTP/2 byte cap: {problem}" for problem in cap_problems]
+    print(f"HTTP/2 byte cap: {CAPPED_FETCHES} fetches capped at {CAP_BYTES // 1024} KB transferred "
+          f"{sent // 1024} KB of {full_bytes // 1024} KB")
+
+    for problem in problems:
+        print(f"CHECK FAILED: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Before/after benchmark for the shared text normalization module
+
+Runs each enhancement text path (scrape post-processing, rule-based
+cleaning, DeepSeek response parsing, manual entry) over a corpus built from
+the fixture enhancements, once with the per-call re.sub code the GUI used
+to inline and once with text_normalize. Reports items per second for both
+and exits non-zero if any path produces different output.
+
+The clean_site_pages path cleans the corpus page by page, each page carrying
+the same site footer and notices, with a fresh SentenceCache per run (as a
+crawl of one site would).
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_normalize.py --items 20000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_normalize
+from replay_server import FIXTURES_DIR
+
+# Reference copies of the code text_normalize replaced
+
+LEGACY_KEYWORDS = list(text_normalize.TIP_KEYWORDS)
+LEGACY_TERMS = list(text_normalize.COOKING_TERMS)
+
+
+def legacy_process(enhancements):
+    processed = []
+    seen = set()
+    for text in enhancements:
+        text = re.sub(r'\s+', ' ', text)
+        text = text.strip()
+        if len(text) < 15 or text.lower() in seen:
+            continue
+        processed.append(text)
+        seen.add(text.lower())
+    return processed
+
+
+def legacy_clean(texts):
+    points = []
+    for text in texts:
+        if len(text) < 15 or text.startswith('Your Private Notes') or text.startswith('Click here'):
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', text):
+            sentence = sentence.strip()
+            if len(sentence) < 15:
+                continue
+            if any(keyword in sentence.lower() for keyword in LEGACY_KEYWORDS) or \
+               any(term in sentence.lower() for term in LEGACY_TERMS):
+                clean_sentence = re.sub(r'\s+', ' ', sentence)
+                clean_sentence = re.sub(r'[\(\[].*?[\)\]]', '', clean_sentence)
+                clean_sentence = re.sub(r'\b(?:I|we|you)\s+(?:can|should|could|might|may)\b', '', clean_sentence, flags=re.IGNORECASE)
+                if not clean_sentence.endswith(('.', '!', '?')):
+                    clean_sentence += '.'
+                if len(clean_sentence) >= 15:
+                    points.append(clean_sentence)
+    keys = []
+    for point in points:
+        simple_point = re.sub(r'[^\w\s]', '', point.lower())
+        keys.append(re.sub(r'\s+', ' ', simple_point).strip())
+    return points, keys
+
+
+def legacy_ai(cleaned_text):
+    cleaned_points = []
+    for line in cleaned_text.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith("Here"):
+            continue
+        clean_line = re.sub(r'^[\d\-\.\*•]+\s*', '', line).strip()
+        if clean_line and len(clean_line) > 10:
+            if not clean_line.endswith(('.', '!', '?')):
+                clean_line += '.'
+            cleaned_points.append(clean_line)
+    return cleaned_points
+
+
+def legacy_manual(content):
+    enhancements = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if line and len(line) > 5:
+            line = re.sub(r'^\d+\.\s*', '', line)
+            line = re.sub(r'^[\-\*•]\s*', '', line)
+            if not line.endswith(('.', '!', '?')):
+                line += '.'
+            enhancements.append(line)
+    return enhancements
+
+
+def new_clean(texts):
+    points = text_normalize.tip_sentences(texts)
+    return points, [text_normalize.dedup_key(point) for point in points]
+
+
+def cached_clean_pages(pages):
+    cache = text_normalize.SentenceCache()
+    return [new_clean_page(page, cache) for page in pages]
+
+
+def new_clean_page(page, cache):
+    points = text_normalize.tip_sentences(page, cache=cache)
+    return points, [text_normalize.dedup_key(point) for point in points]
+
+
+def legacy_clean_pages(pages):
+    return [legacy_clean(page) for page in pages]
+
+
+# What one site repeats on every page
+SITE_BOILERPLATE = [
+    "Never miss a recipe! Sign up for our newsletter and get the best tips delivered to your inbox every week.",
+    "Nutrition information is an estimate. We always recommend checking labels if you cook for allergies.",
+    "All rights reserved. Photos and text may not be reused without permission. Contact us for licensing.",
+    "Your Private Notes: add a note to this recipe",
+    "Click here to rate this recipe and let other readers know how it turned out.",
+    "Did you make this recipe? Tag us on social media so we can see it. Leave a comment below!",
+]
+
+
+def site_pages(corpus, page_size=12):
+    return [corpus[i:i + page_size] + SITE_BOILERPLATE for i in range(0, len(corpus), page_size)]
+
+
+def build_corpus(count, seed):
+    """Fixture enhancements, re-spaced, re-cased and decorated so every rule has work to do"""
+    with open(os.path.join(FIXTURES_DIR, 'expected_enhancements.json'), 'r', encoding='utf-8') as f:
+        base = [text for texts in json.load(f).values() for text in texts]
+    extras = [" (about 5 minutes)", " [optional]", " You can skip this.", " We should   let it rest.", "", "  "]
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        text = rng.choice(base)
+        if rng.random() < 0.5:
+            text = text.replace(' ', '  \n', rng.randint(0, 3))
+        if rng.random() < 0.3:
+            text = text.upper() if rng.random() < 0.2 else text.lower()
+        corpus.append(text + rng.choice(extras) + (f" #{i % 97}" if rng.random() < 0.5 else ""))
+    corpus += ["Click here to save this recipe", "Your Private Notes: none", "short"]
+    return corpus
+
+
+def as_list_text(corpus, rng):
+    markers = ["{n}. ", "- ", "* ", "• ", "{n}) ", "", "  {n}.   "]
+    lines = ["Here are the cleaned tips:", "# Tips", ""]
+    for n, text in enumerate(corpus, 1):
+        lines.append(rng.choice(markers).format(n=n) + text)
+    return "\n".join(lines)
+
+
+def timed(fn, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return output, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the inline regex cleanup with text_normalize")
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5, help="best of N runs")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.items, args.seed)
+    rng = random.Random(args.seed)
+    ai_text = as_list_text(corpus, rng)
+    manual_text = as_list_text(corpus, rng)
+    pages = site_pages(corpus)
+    paths = [
+        ('process_enhancements', legacy_process, text_normalize.unique_texts, corpus, len(corpus)),
+        ('clean_enhancements', legacy_clean, new_clean, corpus, len(corpus)),
+        ('clean_site_pages', legacy_clean_pages, cached_clean_pages, pages, sum(map(len, pages))),
+        ('deepseek_parse', legacy_ai, text_normalize.ai_points, ai_text, len(corpus)),
+        ('manual_entry', legacy_manual, text_normalize.manual_points, manual_text, len(corpus)),
+    ]
+
+    failed = False
+    print(f"{'path':<22} {'before items/s':>15} {'after items/s':>14} {'speedup':>8}")
+    for name, before_fn, after_fn, data, items in paths:
+        before, before_s = timed(before_fn, data, args.repeat)
+        after, after_s = timed(after_fn, data, args.repeat)
+        print(f"{name:<22} {items / before_s:>15,.0f} {items / after_s:>14,.0f} {before_s / after_s:>7.2f}x")
+        if before != after:
+            failed = True
+            print(f"CHECK FAILED: {name} output differs from the previous implementation")
+    if not failed:
+        print("CHECK PASSED")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
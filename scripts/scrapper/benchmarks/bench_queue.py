@@ -0,0 +1,132 @@
+"""Multi-process work queue benchmark against the local replay server
+
+Loads N synthetic recipes into a temporary work queue and drains it with 1,
+2, 4... worker processes (each running BatchScraper.run_queue), reporting
+throughput per worker count. Every run is also checked: each recipe must end
+up acked as successful exactly once, the worker logs must not overlap, and
+every result must match expected_enhancements.json.
+
+--broker routes workers through an in-process HTTP broker instead of the
+shared SQLite file. --crash-after kills the first worker mid-run to check
+that its leases expire and the other workers finish its recipes.
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_queue.py --recipes 200 --workers 1 2 4 --latency-ms 100
+    python scripts/scrapper/benchmarks/bench_queue.py --recipes 60 --workers 3 --crash-after 1 --lease-seconds 2
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch import SITES, synthetic_recipes
+from replay_server import DEFAULT_FIXTURE, FIXTURES_DIR, ReplayServer, add_config_arguments, config_from_args
+from work_queue import BrokerServer, WorkQueue, open_queue, run_worker
+
+
+def _worker(queue_path, broker_url, results_dir, worker_id, concurrency, lease_seconds):
+    with open_queue(queue_path, broker_url) as queue:
+        run_worker(queue, results_dir, worker_id, concurrency, lease_seconds,
+                   delay_range=(0.0, 0.0), staging=False, on_log=lambda message: None)
+
+
+def check_queue(queue, recipes, results_dir, crashed):
+    """Every recipe succeeded once, worker logs do not overlap, and outputs match the fixtures"""
+    with open(os.path.join(FIXTURES_DIR, 'expected_enhancements.json'), 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    problems = []
+    stats = queue.stats()
+    if stats['success'] != len(recipes):
+        problems.append(f"{stats['success']} of {len(recipes)} recipes acked as successful: {stats}")
+
+    logged = []
+    for path in glob.glob(os.path.join(results_dir, 'batch_scrape_log_*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            logged.extend(entry['id'] for entry in json.load(f)['recipes'] if entry['status'] == 'success')
+    # A killed worker never writes its log, so its recipes appear once (in whoever finished them)
+    if len(logged) != len(set(logged)):
+        problems.append(f"{len(logged) - len(set(logged))} recipes were processed by more than one worker")
+    if not crashed and len(logged) != len(recipes):
+        problems.append(f"worker logs cover {len(logged)} of {len(recipes)} recipes")
+
+    for recipe in recipes:
+        site = recipe['url'].split('/')[3]
+        with open(os.path.join(results_dir, f"{recipe['id']}_enhancements.json"), 'r', encoding='utf-8') as f:
+            if json.load(f)['enhancements'] != golden.get(site, golden[DEFAULT_FIXTURE]):
+                problems.append(f"recipe {recipe['id']} ({site}) output differs from expected_enhancements.json")
+    return problems
+
+
+def run_once(server, args, workers):
+    recipes = synthetic_recipes(server.url, args.recipes)
+    with tempfile.TemporaryDirectory(prefix='bench_queue_') as tmp_dir:
+        results_dir = os.path.join(tmp_dir, 'results')
+        queue = WorkQueue(os.path.join(tmp_dir, 'queue.sqlite3'))
+        queue.enqueue(recipes)
+        broker = BrokerServer(queue, port=0).start() if args.broker else None
+
+        start = time.perf_counter()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(
+                None if broker else queue.path, broker.url if broker else None, results_dir,
+                f"worker{i}", args.concurrency, args.lease_seconds))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        crashed = False
+        if args.crash_after is not None:
+            time.sleep(args.crash_after)
+            processes[0].kill()
+            crashed = True
+        for process in processes:
+            process.join()
+        wall = time.perf_counter() - start
+
+        problems = check_queue(queue, recipes, results_dir, crashed) if args.check else []
+        retried = queue.stats()['retried']
+        if broker:
+            broker.stop()
+        queue.close()
+    return wall, retried, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark multi-process batch scraping through the work queue")
+    parser.add_argument('--recipes', type=int, default=100, help="number of synthetic recipes")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="worker process counts to try")
+    parser.add_argument('--concurrency', type=int, default=1, help="threads per worker")
+    parser.add_argument('--lease-seconds', type=float, default=30.0)
+    parser.add_argument('--broker', action='store_true', help="go through the HTTP broker instead of the SQLite file")
+    parser.add_argument('--crash-after', type=float, help="kill the first worker after this many seconds")
+    parser.add_argument('--no-check', dest='check', action='store_false', help="skip the exactly-once check")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    failed = False
+    with ReplayServer(config_from_args(args)) as server:
+        print(f"{len(SITES)} sites, {args.recipes} recipes, {args.concurrency} thread(s) per worker")
+        print(f"{'workers':>7} {'wall s':>8} {'recipes/s':>10} {'speedup':>8} {'retried':>8}")
+        baseline = None
+        for workers in args.workers:
+            wall, retried, problems = run_once(server, args, workers)
+            rate = args.recipes / wall if wall else 0.0
+            baseline = baseline or rate
+            print(f"{workers:>7} {wall:>8.2f} {rate:>10.1f} {rate / baseline:>7.2f}x {retried:>8}")
+            for problem in problems:
+                print(f"CHECK FAILED: {problem}")
+            failed = failed or bool(problems)
+    if args.check and not failed:
+        print("CHECK PASSED")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
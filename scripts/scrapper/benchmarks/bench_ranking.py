@@ -0,0 +1,66 @@
+"""Batch relevance scoring benchmark
+
+Builds candidate tip sentences for N synthetic recipes from the fixture
+enhancements and ranks the top-k per recipe with each available backend
+(NumPy and pure Python), next to the old length sort for reference.
+Fails if the two backends pick different points.
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_ranking.py --recipes 100000 --per-recipe 12 --k 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import enhancement_ranking
+import text_normalize
+from bench_normalize import build_corpus
+
+
+def build_groups(recipes, per_recipe, seed):
+    sentences = text_normalize.tip_sentences(build_corpus(max(1000, per_recipe * 50), seed))
+    rng = random.Random(seed)
+    return [rng.sample(sentences, rng.randint(1, 2 * per_recipe - 1)) for _ in range(recipes)]
+
+
+def length_sort(groups, k):
+    return [sorted(group, key=len, reverse=True)[:k] for group in groups]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batch relevance scoring of enhancement points")
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--per-recipe', type=int, default=12, help="average candidate sentences per recipe")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    groups = build_groups(args.recipes, args.per_recipe, args.seed)
+    sentences = sum(map(len, groups))
+    print(f"{args.recipes} recipes, {sentences} candidate sentences, top {args.k} each")
+
+    runs = [('length sort (old)', lambda: length_sort(groups, args.k))]
+    backends = ['numpy', 'python'] if enhancement_ranking.numpy_available() else ['python']
+    for backend in backends:
+        runs.append((f"{backend} scoring", lambda backend=backend: enhancement_ranking.rank_groups(groups, args.k, backend)))
+
+    outputs = {}
+    print(f"{'method':<20} {'seconds':>8} {'sentences/s':>12}")
+    for name, fn in runs:
+        start = time.perf_counter()
+        outputs[name] = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<20} {elapsed:>8.2f} {sentences / elapsed:>12,.0f}")
+
+    if len(backends) == 2 and outputs['numpy scoring'] != outputs['python scoring']:
+        print("CHECK FAILED: numpy and python backends ranked differently")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Enhancement search index benchmark
+
+Indexes N synthetic recipes (tips drawn from the fixture corpus, spread over
+the supported sites) into a fresh index, then times a mix of term, phrase,
+prefix, exclusion and site-filtered queries. Reports index build time and
+per-query p50/p95 latency; re-adding the same recipes must find them all
+unchanged.
+
+Usage:
+    python scripts/scrapper/benchmarks/bench_search.py --recipes 20000 --tips 10 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enhancement_search import SearchIndex
+from bench_normalize import build_corpus
+
+SITES = ['allrecipes', 'foodnetwork', 'epicurious', 'seriouseats', 'simplyrecipes']
+QUERIES = [
+    ('term', 'buttermilk', None),
+    ('stemmed term', 'resting', None),
+    ('phrase', '"flaky sea salt"', None),
+    ('prefix', 'butter*', None),
+    ('exclusion', 'salt -avocado', None),
+    ('either', 'oven OR grill', None),
+    ('site filter', 'oven', 'allrecipes'),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the enhancement full-text search index")
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument('--tips', type=int, default=10, help="tips per recipe")
+    parser.add_argument('--repeat', type=int, default=20, help="runs of each query")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(max(1000, args.tips * 100), args.seed)
+    rng = random.Random(args.seed)
+    results = [{'recipe_id': recipe_id, 'recipe_title': f"Recipe {recipe_id}", 'site_type': SITES[recipe_id % len(SITES)],
+                'enhancements': rng.sample(corpus, args.tips)} for recipe_id in range(args.recipes)]
+
+    with tempfile.TemporaryDirectory() as tmp, SearchIndex(os.path.join(tmp, 'search.sqlite3')) as index:
+        start = time.perf_counter()
+        index.add_many(results)
+        index.optimize()
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        indexed, unchanged = index.add_many(results)
+        readd_s = time.perf_counter() - start
+        print(f"Indexed {args.recipes} recipes ({args.recipes * args.tips} tips) in {build_s:.2f}s; "
+              f"re-add {readd_s:.2f}s ({unchanged} unchanged)")
+
+        print(f"{'query':<28} {'hits':>5} {'tips p50':>9} {'tips p95':>9} {'recipes p50':>12}")
+        for name, query, site in QUERIES:
+            tip_ms, recipe_ms = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = index.search(query, site=site, limit=args.limit)
+                tip_ms.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                index.search_recipes(query, site=site, limit=args.limit)
+                recipe_ms.append((time.perf_counter() - start) * 1000)
+            print(f"{name + ' ' + query:<28.28} {len(hits):>5} {statistics.median(tip_ms):>7.1f}ms "
+                  f"{percentile(tip_ms, 95):>7.1f}ms {statistics.median(recipe_ms):>10.1f}ms")
+
+    if indexed:
+        print(f"CHECK FAILED: {indexed} unchanged recipes were re-indexed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""Local HTTP server that replays the recorded recipe fixtures
+
+Every path is answered with a fixture page: the first path segment picks the
+site (e.g. /allrecipes/recipe/42 serves fixtures/allrecipes.html, unknown
+sites get generic_blog.html). Latency, bandwidth, error rate and 429
+behaviour are configurable so batch runs can be benchmarked and regression
+tested without touching real sites.
+
+With --http2 the server speaks cleartext HTTP/2 (h2c with prior knowledge,
+needs the h2 package) instead of HTTP/1.1, answering each stream of a
+connection concurrently.
+
+Usage:
+    python scripts/scrapper/benchmarks/replay_server.py --port 8765 --latency-ms 120 --throttle-rate 0.05
+    python scripts/scrapper/benchmarks/replay_server.py --port 8766 --latency-ms 120 --http2
+"""
+import argparse
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEFAULT_FIXTURE = 'generic_blog'
+
+
+class ReplayConfig:
+    """Network conditions the replay server simulates"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, bandwidth_kbps=0.0, error_rate=0.0,
+                 throttle_rate=0.0, max_rps=0.0, retry_after=1, bloat_kb=0, connect_ms=0.0, seed=None):
+        self.latency_ms = latency_ms          # base time to first byte
+        self.connect_ms = connect_ms          # setup cost of each new connection, like a TCP + TLS handshake
+        self.jitter_ms = jitter_ms            # uniform extra latency
+        self.bandwidth_kbps = bandwidth_kbps  # per-response body rate, 0 = unlimited
+        self.error_rate = error_rate          # probability of a 500 response
+        self.throttle_rate = throttle_rate    # probability of a 429 response
+        self.max_rps = max_rps                # global requests/second before 429s, 0 = unlimited
+        self.retry_after = retry_after        # Retry-After seconds sent with 429s
+        self.bloat_kb = bloat_kb              # inline script padding before </body>, like ad-heavy blogs
+        self.random = random.Random(seed)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """Threaded server that ignores clients hanging up early (e.g. byte-capped fetches)"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class ReplayServer:
+    """Threaded replay server that can be started in-process for benchmarks and checks"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0, http2=False):
+        self.config = config or ReplayConfig()
+        self.pages = load_pages(self.config.bloat_kb)
+        self.stats = Counter()
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.httpd = _QuietHTTPServer((host, port), self._h2_handler_class() if http2 else self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def page_for(self, path):
+        site = path.strip('/').split('/', 1)[0]
+        return self.pages.get(site, self.pages[DEFAULT_FIXTURE])
+
+    def decide(self):
+        """Pick the status code for the next request"""
+        config = self.config
+        with self._lock:
+            self.stats['requests'] += 1
+            if config.max_rps:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > config.max_rps:
+                    self.stats['429'] += 1
+                    return 429
+            roll = config.random.random()
+            if roll < config.throttle_rate:
+                self.stats['429'] += 1
+                return 429
+            if roll < config.throttle_rate + config.error_rate:
+                self.stats['500'] += 1
+                return 500
+            self.stats['200'] += 1
+            return 200
+
+    def open_connection(self):
+        """Count a new client connection and charge its simulated handshake time"""
+        with self._lock:
+            self.stats['connections'] += 1
+        if self.config.connect_ms:
+            time.sleep(self.config.connect_ms / 1000)
+
+    def count_body_bytes(self, count):
+        """Count response body bytes actually written to clients"""
+        with self._lock:
+            self.stats['body_bytes'] += count
+
+    def respond(self, path):
+        """Wait out the simulated latency, then pick (status, headers, body) for a request"""
+        config = self.config
+        delay = config.latency_ms + (config.random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+        status = self.decide()
+        body = self.page_for(path) if status == 200 else f"{status}\n".encode()
+        headers = [('Content-Type', 'text/html; charset=utf-8' if status == 200 else 'text/plain'),
+                   ('Content-Length', str(len(body)))]
+        if status == 429:
+            headers.append(('Retry-After', str(config.retry_after)))
+        return status, headers, body
+
+    def body_chunks(self, body):
+        """Yield the body in pieces, sleeping between them to hold the configured bandwidth"""
+        if not self.config.bandwidth_kbps:
+            yield body
+            return
+        chunk = 16 * 1024
+        seconds_per_chunk = chunk / (self.config.bandwidth_kbps * 1024)
+        for offset in range(0, len(body), chunk):
+            yield body[offset:offset + chunk]
+            time.sleep(seconds_per_chunk)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                server.open_connection()
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path)
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                for piece in server.body_chunks(body):
+                    self.wfile.write(piece)
+                    server.count_body_bytes(len(piece))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _h2_handler_class(self):
+        server = self
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        class H2Handler(socketserver.BaseRequestHandler):
+            """One h2c connection; every stream is answered on its own thread so they overlap"""
+
+            def handle(self):
+                server.open_connection()
+                self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+                # Guards the (not thread-safe) connection state; notified when flow-control windows open
+                self.state = threading.Condition()
+                self.closed = False
+                with self.state:
+                    self.conn.initiate_connection()
+                    self._flush()
+                try:
+                    while True:
+                        data = self.request.recv(65536)
+                        if not data:
+                            break
+                        with self.state:
+                            for event in self.conn.receive_data(data):
+                                if isinstance(event, h2.events.RequestReceived):
+                                    path = dict(event.headers)[':path']
+                                    threading.Thread(target=self._respond, args=(event.stream_id, path), daemon=True).start()
+                                elif isinstance(event, h2.events.ConnectionTerminated):
+                                    return
+                            self.state.notify_all()
+                            self._flush()
+                except (OSError, h2.exceptions.ProtocolError):
+                    pass
+                finally:
+                    with self.state:
+                        self.closed = True
+                        self.state.notify_all()
+
+            def _flush(self):
+                data = self.conn.data_to_send()
+                if data:
+                    self.request.sendall(data)
+
+            def _respond(self, stream_id, path):
+                status, headers, body = server.respond(path)
+                try:
+                    with self.state:
+                        self.conn.send_headers(stream_id, [(':status', str(status))] +
+                                               [(name.lower(), value) for name, value in headers], end_stream=not body)
+                        self._flush()
+                    sent = 0
+                    for piece in server.body_chunks(body):
+                        sent += len(piece)
+                        self._send_data(stream_id, piece, sent == len(body))
+                except (OSError, h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError):
+                    pass  # the client reset the stream (e.g. an early-stopped fetch) or hung up
+
+            def _send_data(self, stream_id, data, end_stream):
+                with self.state:
+                    while data:
+                        if self.closed:
+                            raise ConnectionError("connection closed")
+                        window = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+                        if window <= 0:
+                            self.state.wait()
+                            continue
+                        self.conn.send_data(stream_id, data[:window], end_stream=end_stream and len(data) <= window)
+                        self._flush()
+                        server.count_body_bytes(len(data[:window]))
+                        data = data[window:]
+
+        return H2Handler
+
+
+def load_pages(bloat_kb=0):
+    """Load every fixture page into memory keyed by site name, optionally padded"""
+    padding = b""
+    if bloat_kb:
+        padding = b"<script>window.__TRACKING__='" + b"x" * (bloat_kb * 1024) + b"';</script>\n"
+    pages = {}
+    for filename in os.listdir(FIXTURES_DIR):
+        if filename.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+                page = f.read()
+            pages[filename[:-len('.html')]] = page.replace(b"</body>", padding + b"</body>", 1)
+    return pages
+
+
+def add_config_arguments(parser):
+    """Add the network-condition flags shared by the server and the batch harness"""
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="base response latency")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="uniform extra latency")
+    parser.add_argument('--bandwidth-kbps', type=float, default=0.0, help="per-response body rate (0 = unlimited)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a 500 response")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="probability of a 429 response")
+    parser.add_argument('--max-rps', type=float, default=0.0, help="global requests/second before 429s (0 = unlimited)")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--bloat-kb', type=int, default=0, help="inline script padding added before </body>")
+    parser.add_argument('--connect-ms', type=float, default=0.0, help="setup time of each new connection (TCP + TLS handshake)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible runs")
+
+
+def config_from_args(args):
+    return ReplayConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        bandwidth_kbps=args.bandwidth_kbps,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        max_rps=args.max_rps,
+        retry_after=args.retry_after,
+        bloat_kb=args.bloat_kb,
+        connect_ms=args.connect_ms,
+        seed=args.seed
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded recipe pages with simulated network conditions")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--http2', action='store_true', help="serve cleartext HTTP/2 (h2c) instead of HTTP/1.1")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = ReplayServer(config_from_args(args), args.host, args.port, args.http2)
+    print(f"Replaying {len(server.pages)} fixtures on {server.url} over {'h2c' if args.http2 else 'HTTP/1.1'} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served: {dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Change feed of scrape results between batch runs
+
+Every batch run compares each recipe's enhancements with what the previous
+runs saw (a content hash per recipe, kept with the texts in a small SQLite
+state database) and writes only the differences as JSONL, one event per
+changed recipe:
+
+    {"op": "added",    "recipe_id": 42, "recipe": {...}, "enhancements": {"added": [...], "removed": []}, ...}
+    {"op": "modified", "recipe_id": 42, "recipe": {...}, "enhancements": {"added": [...], "removed": [...]}, ...}
+    {"op": "removed",  "recipe_id": 42, "enhancements": {"added": [], "removed": [...]}, ...}
+
+"recipe" is the full current record (title, url, site, enhancements and,
+after batch cleaning, cleaned_enhancements); "cleaned_enhancements" carries
+the same added/removed diff for the cleaned points. A recipe is removed when
+its page answers 404/410, or when a `diff --full` no longer finds it.
+Unchanged recipes produce no event, so downstream work follows the change
+volume instead of the corpus size.
+
+Set PANTRYPAL_CHANGE_STATE to a database path to make batch runs write
+<results_dir>/changes/<timestamp>.jsonl; the scraper then refreshes the
+bundles and search index from the feed only, and the uploader can upload a
+feed. Feeds can also be applied by hand.
+
+Usage:
+    python scripts/scrapper/change_feed.py diff "scraped_enhancements/*_enhancements.json" --output changes.jsonl
+    python scripts/scrapper/change_feed.py diff --staging --full --output changes.jsonl
+    python scripts/scrapper/change_feed.py apply "scraped_enhancements/changes/*.jsonl" --bundles public/enhancements --search
+    python scripts/scrapper/change_feed.py stats
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+STATE_ENV = 'PANTRYPAL_CHANGE_STATE'
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'change_state.sqlite3')
+OPS = ('added', 'modified', 'removed')
+GONE_STATUSES = (404, 410)
+
+# Result fields carried in "recipe" so consumers never need the result files
+RECIPE_FIELDS = ('recipe_title', 'url', 'site_type', 'enhancements', 'cleaned_enhancements')
+
+
+def open_from_env():
+    """Open the state named by PANTRYPAL_CHANGE_STATE, or return None when it is not set"""
+    path = os.getenv(STATE_ENV)
+    return ChangeFeed(path) if path else None
+
+
+def content_hash(enhancements, cleaned_enhancements=None):
+    payload = json.dumps([enhancements, cleaned_enhancements], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def diff_texts(old, new):
+    """{"added": texts only in new, "removed": texts only in old}, each in list order"""
+    old_set, new_set = set(old), set(new)
+    return {'added': [text for text in new if text not in old_set],
+            'removed': [text for text in old if text not in new_set]}
+
+
+class ChangeFeed:
+    """Last-seen content per recipe, plus the JSONL file the current run's events go to
+
+    record() and remove() are safe to call from the batch worker threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(STATE_ENV) or DEFAULT_STATE_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                recipe_id TEXT PRIMARY KEY,
+                recipe_id_json TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                enhancements TEXT NOT NULL,
+                cleaned_enhancements TEXT,
+                updated_at TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+        self.feed_path = None
+        self._feed = None
+        self.counts = Counter()
+
+    def open_feed(self, feed_path):
+        """Start writing this run's events to feed_path (appended to if it exists)"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(feed_path)), exist_ok=True)
+            self._feed = open(feed_path, 'a', encoding='utf-8')
+            self.feed_path = feed_path
+            self.counts = Counter({op: 0 for op in OPS + ('unchanged',)})
+
+    def close_feed(self):
+        """Stop writing events; returns the run's counts per op (plus 'unchanged')"""
+        with self._lock:
+            if self._feed:
+                self._feed.close()
+                self._feed = None
+            return dict(self.counts)
+
+    def record(self, result):
+        """Compare a result with the last-seen state, emit its event and store it; returns the op or None
+
+        A result without cleaned_enhancements (cleaning turned off) keeps the
+        cleaned points seen before instead of reporting them all removed. The
+        event is written and flushed before the state moves on, so a change is
+        never marked seen without being in a feed; raises RuntimeError when no
+        feed is open.
+        """
+        recipe_id = str(result['recipe_id'])
+        enhancements = result['enhancements']
+        with self._lock, self.conn:
+            self._require_feed()
+            row = self.conn.execute("SELECT * FROM recipes WHERE recipe_id = ?", (recipe_id,)).fetchone()
+            old = json.loads(row[3]) if row else []
+            old_cleaned = json.loads(row[4]) if row and row[4] is not None else None
+            cleaned = result.get('cleaned_enhancements')
+            if cleaned is None:
+                cleaned = old_cleaned
+            new_hash = content_hash(enhancements, cleaned)
+            if row and row[2] == new_hash:
+                self.counts['unchanged'] += 1
+                return None
+            op = 'modified' if row else 'added'
+            recipe = {field: result[field] for field in RECIPE_FIELDS if result.get(field) is not None}
+            if cleaned is not None:
+                recipe['cleaned_enhancements'] = cleaned
+            event = {'op': op, 'recipe_id': result['recipe_id'], 'recipe': recipe,
+                     'enhancements': diff_texts(old, enhancements)}
+            if cleaned is not None:
+                event['cleaned_enhancements'] = diff_texts(old_cleaned or [], cleaned)
+            self._emit(event)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recipes (recipe_id, recipe_id_json, content_hash, enhancements, "
+                "cleaned_enhancements, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (recipe_id, json.dumps(result['recipe_id']), new_hash, json.dumps(enhancements, ensure_ascii=False),
+                 None if cleaned is None else json.dumps(cleaned, ensure_ascii=False), datetime.now().isoformat()))
+            return op
+
+    def remove(self, recipe_id):
+        """Emit a 'removed' event for a recipe whose page is gone, then forget it; None if it was never seen"""
+        with self._lock, self.conn:
+            self._require_feed()
+            row = self.conn.execute("SELECT * FROM recipes WHERE recipe_id = ?", (str(recipe_id),)).fetchone()
+            if not row:
+                return None
+            event = {'op': 'removed', 'recipe_id': json.loads(row[1]),
+                     'enhancements': diff_texts(json.loads(row[3]), [])}
+            if row[4] is not None:
+                event['cleaned_enhancements'] = diff_texts(json.loads(row[4]), [])
+            self._emit(event)
+            self.conn.execute("DELETE FROM recipes WHERE recipe_id = ?", (str(recipe_id),))
+            return 'removed'
+
+    def recipe_ids(self):
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT recipe_id FROM recipes")]
+
+    def _require_feed(self):
+        if self._feed is None:
+            raise RuntimeError("no change feed is open: call open_feed() before recording results")
+
+    def _emit(self, event):
+        event['at'] = datetime.now().isoformat()
+        self._feed.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self._feed.flush()
+        self.counts[event['op']] += 1
+
+    def stats(self):
+        with self._lock:
+            recipes = self.conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+        return {'path': self.path, 'recipes': recipes}
+
+    def close(self):
+        self.close_feed()
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_feed(patterns):
+    """Yield the events of JSONL feed files (glob patterns allowed), oldest file first"""
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern) or [pattern]):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def latest_changes(events):
+    """Collapse events to the last one per recipe: (results to update, recipe ids to remove)"""
+    last = {}
+    for event in events:
+        last[str(event['recipe_id'])] = event
+    updated = [dict(event['recipe'], recipe_id=event['recipe_id'])
+               for event in last.values() if event['op'] != 'removed']
+    removed = [event['recipe_id'] for event in last.values() if event['op'] == 'removed']
+    return updated, removed
+
+
+def apply(events, bundles=None, search_index=None):
+    """Bring the static bundles and/or the search index up to date from change events; returns a summary"""
+    updated, removed = latest_changes(events)
+    summary = {'updated': len(updated), 'removed': len(removed)}
+    if bundles:
+        summary['bundles'] = bundles.update(updated)
+        if removed:
+            summary['bundles']['removed_recipes'] = bundles.remove(removed)
+    if search_index:
+        summary['search'] = search_index.add_many(updated)
+        for recipe_id in removed:
+            search_index.remove(recipe_id)
+    return summary
+
+
+def _results_from_files(patterns):
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern) or [pattern]):
+            if os.path.basename(path).startswith('batch_scrape_'):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('recipe_id') is not None and 'enhancements' in data:
+                data.setdefault('url', data.get('source_url'))
+                yield data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Change feed of scrape results between runs")
+    parser.add_argument('--state', help=f"state database (default: ${STATE_ENV} or {DEFAULT_STATE_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    diff = commands.add_parser('diff', help="record results and write what changed since the last time")
+    diff.add_argument('paths', nargs='*', help="*_enhancements.json files or glob patterns")
+    diff.add_argument('--staging', nargs='?', const=os.getenv('PANTRYPAL_STAGING_DB'), default=None,
+                      help="every result in the staging database (default path: $PANTRYPAL_STAGING_DB)")
+    diff.add_argument('--full', action='store_true', help="the input is the whole corpus: recipes missing from it are removed")
+    diff.add_argument('--output', required=True, help="JSONL feed to append the events to")
+    apply_parser = commands.add_parser('apply', help="update the bundles and/or search index from feeds")
+    apply_parser.add_argument('feeds', nargs='+', help="JSONL feed files or glob patterns, applied in name order")
+    apply_parser.add_argument('--bundles', help="bundle directory to update")
+    apply_parser.add_argument('--search', nargs='?', const='', default=None,
+                              help="search index to update (default path: $PANTRYPAL_SEARCH_INDEX)")
+    commands.add_parser('stats', help="recipes in the state database")
+    args = parser.parse_args(argv)
+
+    if args.command == 'apply':
+        import enhancement_bundles
+        import enhancement_search
+        if not args.bundles and args.search is None:
+            parser.error("pass --bundles and/or --search")
+        bundles = enhancement_bundles.BundleWriter(args.bundles) if args.bundles else None
+        search_index = enhancement_search.SearchIndex(args.search or None) if args.search is not None else None
+        try:
+            summary = apply(read_feed(args.feeds), bundles, search_index)
+        finally:
+            if search_index:
+                search_index.close()
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    with ChangeFeed(args.state) as feed:
+        if args.command == 'stats':
+            print(json.dumps(feed.stats(), indent=2))
+            return 0
+        if not args.paths and not args.staging:
+            parser.error("pass result files or --staging")
+        feed.open_feed(args.output)
+        seen = set()
+        for result in _results_from_files(args.paths):
+            seen.add(str(result['recipe_id']))
+            feed.record(result)
+        if args.staging:
+            import staging_store
+            with staging_store.StagingStore(args.staging) as store:
+                for result in store.iter_results():
+                    seen.add(str(result['recipe_id']))
+                    feed.record(result)
+        if args.full:
+            for recipe_id in feed.recipe_ids():
+                if recipe_id not in seen:
+                    feed.remove(recipe_id)
+        counts = feed.close_feed()
+        print(f"{counts['added']} added, {counts['modified']} modified, {counts['removed']} removed, "
+              f"{counts['unchanged']} unchanged; events appended to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Pre-gzipped, sharded enhancement bundles for the web app
+
+Exports scrape results as static files a CDN can serve without a database
+round trip. Recipes are grouped into shards by id range (id // shard_size)
+and each shard is one compact, gzipped JSON file:
+
+    <out_dir>/manifest.json                          shard index, small and short-lived in caches
+    <out_dir>/shards/00001000-00001999.<sha>.json.gz  recipes 1000..1999, immutable
+
+To look up a recipe, read manifest["shards"][str(id // manifest["shard_size"])]["file"]
+and take bundle["recipes"][str(id)] = {title, source, enhancements}.
+Shard files are content-addressed, so a shard is only rewritten (and only
+gets a new URL) when its recipes actually changed. The previous file of a
+shard is kept for one more update so clients holding an old manifest still
+find it.
+
+Set PANTRYPAL_BUNDLE_DIR to update the bundles after every batch scrape and
+upload, or run a full export from result files or the staging database.
+
+Usage:
+    python scripts/scrapper/enhancement_bundles.py build public/enhancements "scraped_enhancements/*_enhancements.json"
+    python scripts/scrapper/enhancement_bundles.py build public/enhancements --staging --full
+    python scripts/scrapper/enhancement_bundles.py get public/enhancements 640803
+    python scripts/scrapper/enhancement_bundles.py stats public/enhancements
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+BUNDLE_DIR_ENV = 'PANTRYPAL_BUNDLE_DIR'
+SHARD_SIZE = 1000
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# One writer at a time per process (the scraper's batch and upload tasks can overlap)
+_update_lock = threading.Lock()
+
+
+def open_from_env():
+    """A BundleWriter for PANTRYPAL_BUNDLE_DIR, or None when it is not set"""
+    out_dir = os.getenv(BUNDLE_DIR_ENV)
+    return BundleWriter(out_dir) if out_dir else None
+
+
+def bundle_record(result):
+    """The fields the web app needs, from a batch result, save_to_file output or staging row
+
+    No timestamps, so re-scraping a recipe with the same tips leaves its shard untouched.
+    """
+    return {
+        'title': result.get('recipe_title'),
+        'source': result.get('url') or result.get('source_url') or result.get('source'),
+        'enhancements': result['enhancements'],
+    }
+
+
+def batch_results(results_log, results_dir, store=None):
+    """Yield the saved result of every successful recipe in a batch results log"""
+    for entry in results_log['recipes']:
+        if entry['status'] != 'success':
+            continue
+        if store:
+            result = store.get(entry['id'])
+        else:
+            with open(os.path.join(results_dir, f"{entry['id']}_enhancements.json"), 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        if result:
+            yield result
+
+
+class BundleWriter:
+    """Merges results into shard files and keeps the manifest in step"""
+
+    def __init__(self, out_dir, shard_size=None):
+        self.out_dir = out_dir
+        self.shard_dir = os.path.join(out_dir, 'shards')
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self.shard_size = shard_size  # None: whatever the existing export uses, else SHARD_SIZE
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            self.shard_size = self.shard_size or SHARD_SIZE
+            return {'version': MANIFEST_VERSION, 'shard_size': self.shard_size, 'recipes': 0, 'shards': {}}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.shard_size = self.shard_size or manifest['shard_size']
+        if manifest['shard_size'] != self.shard_size:
+            raise ValueError(f"{self.manifest_path} uses shard size {manifest['shard_size']}, not {self.shard_size}; "
+                             "export into a new directory to change it")
+        return manifest
+
+    def shard_of(self, recipe_id):
+        """Shard number of a recipe; ValueError for ids that are not integers"""
+        return int(recipe_id) // self.shard_size
+
+    def read_shard(self, manifest, shard):
+        entry = manifest['shards'].get(str(shard))
+        if not entry:
+            return {}
+        with gzip.open(os.path.join(self.out_dir, entry['file']), 'rt', encoding='utf-8') as f:
+            return json.load(f)['recipes']
+
+    def update(self, results, full=False):
+        """Merge results into their shards, rewriting only shards whose content changed
+
+        With full=True the results replace the whole export: shards and recipes
+        that are not in `results` are removed. Returns a summary dict.
+        """
+        with _update_lock:
+            manifest = self._load_manifest()
+            by_shard = defaultdict(dict)
+            skipped = 0
+            for result in results:
+                try:
+                    shard = self.shard_of(result['recipe_id'])
+                except (TypeError, ValueError):
+                    skipped += 1  # e.g. sample files without a numeric recipe id
+                    continue
+                by_shard[shard][str(int(result['recipe_id']))] = bundle_record(result)
+
+            summary = {'written': 0, 'unchanged': 0, 'removed': 0, 'skipped': skipped}
+            for shard, records in sorted(by_shard.items()):
+                recipes = {} if full else self.read_shard(manifest, shard)
+                for recipe_id, record in records.items():
+                    # Keep fields the new result does not know (the uploader has no title)
+                    previous = recipes.get(recipe_id, {})
+                    recipes[recipe_id] = {key: value if value is not None else previous.get(key)
+                                          for key, value in record.items()}
+                written = self._write_shard(manifest, shard, recipes)
+                summary['written' if written else 'unchanged'] += 1
+
+            if full:
+                for shard in [key for key in manifest['shards'] if int(key) not in by_shard]:
+                    self._remove_shard(manifest, shard)
+                    summary['removed'] += 1
+
+            if summary['written'] or summary['removed'] or not os.path.exists(self.manifest_path):
+                self._save_manifest(manifest)
+            summary['recipes'] = manifest['recipes']
+            return summary
+
+    def remove(self, recipe_ids):
+        """Drop recipes from their shards (deleting shards left empty); returns how many were found"""
+        with _update_lock:
+            manifest = self._load_manifest()
+            by_shard = defaultdict(set)
+            for recipe_id in recipe_ids:
+                try:
+                    by_shard[self.shard_of(recipe_id)].add(str(int(recipe_id)))
+                except (TypeError, ValueError):
+                    continue
+            removed = 0
+            for shard, ids in sorted(by_shard.items()):
+                recipes = self.read_shard(manifest, shard)
+                found = ids & recipes.keys()
+                if not found:
+                    continue
+                removed += len(found)
+                for recipe_id in found:
+                    del recipes[recipe_id]
+                if recipes:
+                    self._write_shard(manifest, shard, recipes)
+                else:
+                    self._remove_shard(manifest, str(shard))
+            if removed:
+                self._save_manifest(manifest)
+            return removed
+
+    def _save_manifest(self, manifest):
+        manifest['recipes'] = sum(entry['count'] for entry in manifest['shards'].values())
+        manifest['updated_at'] = datetime.now().isoformat()
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+
+    def _write_shard(self, manifest, shard, recipes):
+        # Deterministic bytes: sorted keys, compact separators and a fixed gzip mtime
+        payload = json.dumps({'shard': shard, 'recipes': recipes}, ensure_ascii=False, sort_keys=True,
+                             separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        key = str(shard)
+        entry = manifest['shards'].get(key)
+        if entry and entry['sha256'] == digest:
+            return False
+
+        start = shard * self.shard_size
+        name = f"shards/{start:08d}-{start + self.shard_size - 1:08d}.{digest[:12]}.json.gz"
+        os.makedirs(self.shard_dir, exist_ok=True)
+        compressed = gzip.compress(payload, compresslevel=9, mtime=0)
+        _write_atomic(os.path.join(self.out_dir, name), compressed)
+        if entry and entry.get('previous') != name:
+            self._delete(entry.get('previous'))
+        manifest['shards'][key] = {
+            'file': name,
+            'previous': entry['file'] if entry else None,
+            'count': len(recipes),
+            'first_id': min(map(int, recipes)),
+            'last_id': max(map(int, recipes)),
+            'sha256': digest,
+            'bytes': len(compressed),
+            'updated_at': datetime.now().isoformat(),
+        }
+        return True
+
+    def _remove_shard(self, manifest, shard):
+        entry = manifest['shards'].pop(shard)
+        self._delete(entry.get('previous'))
+        self._delete(entry['file'])
+
+    def _delete(self, name):
+        if name and os.path.exists(os.path.join(self.out_dir, name)):
+            os.remove(os.path.join(self.out_dir, name))
+
+    def get(self, recipe_id):
+        """Look a recipe up the way the web app would (manifest, then shard); None if absent"""
+        manifest = self._load_manifest()
+        return self.read_shard(manifest, self.shard_of(recipe_id)).get(str(int(recipe_id)))
+
+    def stats(self):
+        manifest = self._load_manifest()
+        shards = manifest['shards'].values()
+        return {
+            'recipes': manifest['recipes'],
+            'shards': len(manifest['shards']),
+            'shard_size': manifest['shard_size'],
+            'gzip_bytes': sum(entry['bytes'] for entry in shards),
+            'updated_at': manifest.get('updated_at'),
+        }
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _results_from_files(patterns):
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern) or [pattern]):
+            if os.path.basename(path).startswith('batch_scrape_log'):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if 'enhancements' in data:
+                data.setdefault('recipe_id', None)
+                yield data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export scrape results as sharded, gzipped JSON bundles")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="merge results into the bundles")
+    build.add_argument('out_dir')
+    build.add_argument('paths', nargs='*', help="*_enhancements.json files or glob patterns")
+    build.add_argument('--staging', nargs='?', const=os.getenv('PANTRYPAL_STAGING_DB'), default=None,
+                       help="read every result from the staging database (default path: $PANTRYPAL_STAGING_DB)")
+    build.add_argument('--full', action='store_true', help="drop recipes and shards that are not in the input")
+    build.add_argument('--shard-size', type=int, help=f"recipes per shard for a new export (default {SHARD_SIZE})")
+    get = commands.add_parser('get', help="print one recipe's bundle record")
+    get.add_argument('out_dir')
+    get.add_argument('recipe_id')
+    stats = commands.add_parser('stats', help="recipe, shard and size totals")
+    stats.add_argument('out_dir')
+    args = parser.parse_args(argv)
+
+    writer = BundleWriter(args.out_dir, getattr(args, 'shard_size', None))
+    if args.command == 'build':
+        if args.staging:
+            import staging_store
+            with staging_store.StagingStore(args.staging) as store:
+                summary = writer.update(store.iter_results(), full=args.full)
+        elif args.paths:
+            summary = writer.update(_results_from_files(args.paths), full=args.full)
+        else:
+            parser.error("pass result files or --staging")
+        print(f"{summary['written']} shards written, {summary['unchanged']} unchanged, {summary['removed']} removed, "
+              f"{summary['skipped']} results without a numeric recipe id skipped; {summary['recipes']} recipes in bundles")
+    elif args.command == 'get':
+        print(json.dumps(writer.get(args.recipe_id), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(writer.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
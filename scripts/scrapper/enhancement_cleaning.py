@@ -0,0 +1,189 @@
+"""Rule-based enhancement cleaning as a batch stage
+
+clean_points() is the "Clean Enhancements" button of the scraper GUI as a
+plain function: split the raw scraped texts into tip sentences, drop
+near-duplicates (80% word overlap) and keep the 15 most relevant points.
+
+CleaningStage runs it for a batch scrape in a pool of worker processes, so
+cleaning a recipe never holds the GIL that the fetching and parsing threads
+need. Each result keeps its raw `enhancements` and gains
+`cleaned_enhancements`.
+
+Every process keeps one text_normalize.SentenceCache per site, so the
+footers and notices a site repeats on each page are cleaned once; later
+pages of a crawl cost less to clean than the first ones.
+
+PANTRYPAL_CLEAN_WORKERS turns the stage on for batch runs:
+    off (default) -> no cleaning stage (results carry only the raw enhancements)
+    auto          -> one process per spare CPU core, cleaning on the fetch threads on a single core
+    N             -> N worker processes
+    0             -> clean on the fetch threads, no pool
+
+Usage:
+    python scripts/scrapper/enhancement_cleaning.py "scraped_enhancements/*_enhancements.json" --workers 4
+    python scripts/scrapper/enhancement_cleaning.py --staging
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import enhancement_ranking
+import scraper_profiling
+import text_normalize
+
+CLEAN_WORKERS_ENV = 'PANTRYPAL_CLEAN_WORKERS'
+SIMILARITY_THRESHOLD = 0.8
+SENTENCE_CACHE_ENTRIES = 4096
+
+_sentence_caches = {}  # site type -> SentenceCache, per process
+_caches_lock = threading.Lock()
+
+
+def clean_workers(value=None):
+    """Worker processes for a setting (an int, 'auto', 'off') or, by default, the environment; None = no stage"""
+    if value is None:
+        value = os.getenv(CLEAN_WORKERS_ENV, 'off')
+    value = str(value).strip().lower()
+    if value in ('', 'off', 'false', 'no', 'none'):
+        return None
+    if value == 'auto':
+        return max(0, (os.cpu_count() or 1) - 1)
+    return max(0, int(value))
+
+
+def _jaccard(words1, words2):
+    if not words1 or not words2:
+        return 0.0
+    return len(words1 & words2) / len(words1 | words2)
+
+
+def sentence_cache(site):
+    """This process's sentence cache for a site type (created on first use)"""
+    with _caches_lock:
+        cache = _sentence_caches.get(site)
+        if cache is None:
+            cache = _sentence_caches[site] = text_normalize.SentenceCache(SENTENCE_CACHE_ENTRIES)
+        return cache
+
+
+def clean_points(enhancements, k=enhancement_ranking.TOP_K, site=None):
+    """Concise, de-duplicated tip sentences of one recipe's raw enhancements, most relevant first
+
+    With a site type, sentences that site has repeated before come from its cache.
+    """
+    # Split into sentences and keep the cleaned ones that mention a tip keyword or cooking term
+    cache = sentence_cache(site) if site else None
+    potential_points = text_normalize.tip_sentences(enhancements, cache=cache)
+
+    # Remove duplicates and near-duplicates
+    cleaned_points = []
+    seen_words = []
+    for point in potential_points:
+        words = set(text_normalize.dedup_key(point).split())
+        if any(_jaccard(words, seen) > SIMILARITY_THRESHOLD for seen in seen_words):
+            continue
+        cleaned_points.append(point)
+        seen_words.append(words)
+
+    # Keep the most relevant points (tf-idf weight within this recipe, cooking-term density, keyword hits)
+    return enhancement_ranking.top_points(cleaned_points, k)
+
+
+class CleaningStage:
+    """Cleans recipes' enhancements off the calling thread; submit() returns a Future of the cleaned list"""
+
+    def __init__(self, workers=0, k=enhancement_ranking.TOP_K, profile_dir=None):
+        self.workers = workers
+        self.k = k
+        self._executor = None
+        if workers:
+            # spawn, not fork: the GUI and the batch engine have threads running.
+            # With profiling on, each worker writes profile_clean_worker_<pid>_* into profile_dir when the pool closes.
+            initializer = scraper_profiling.profile_process if scraper_profiling.profile_mode() else None
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=initializer, initargs=('clean_worker', profile_dir))
+
+    def submit(self, enhancements, site=None):
+        if self._executor:
+            try:
+                return self._executor.submit(clean_points, enhancements, self.k, site)
+            except RuntimeError:
+                pass  # the pool broke (e.g. a worker was killed); clean here instead
+        future = Future()
+        future.set_result(clean_points(enhancements, self.k, site))
+        return future
+
+    def map(self, items, enhancements_of, chunk=500):
+        """Yield (item, cleaned points) in order, keeping at most `chunk` items in flight
+
+        enhancements_of(item) returns the item's raw enhancements and site type.
+        """
+        pending = []
+        for item in items:
+            pending.append((item, self.submit(*enhancements_of(item))))
+            if len(pending) >= chunk:
+                for item, future in pending:
+                    yield item, future.result()
+                pending = []
+        for item, future in pending:
+            yield item, future.result()
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _load_enhancements(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    return result.get('enhancements', []), result.get('site_type')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add cleaned_enhancements to scraped results")
+    parser.add_argument('paths', nargs='*', help="*_enhancements.json files or glob patterns, rewritten in place")
+    parser.add_argument('--staging', nargs='?', const=os.getenv('PANTRYPAL_STAGING_DB'), default=None,
+                        help="clean every result in the staging database (default path: $PANTRYPAL_STAGING_DB)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--k', type=int, default=enhancement_ranking.TOP_K, help="points to keep per recipe")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cleaned = 0
+    with CleaningStage(args.workers, args.k) as stage:
+        paths = [path for pattern in args.paths for path in sorted(glob.glob(pattern) or [pattern])]
+        paths = [path for path in paths if not os.path.basename(path).startswith('batch_scrape_')]
+        for path, points in stage.map(paths, _load_enhancements):
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            result['cleaned_enhancements'] = points
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            cleaned += 1
+
+        if args.staging:
+            import staging_store
+            with staging_store.StagingStore(args.staging) as store:
+                for result, points in stage.map(store.iter_results(),
+                                                  lambda result: (result['enhancements'], result.get('site_type'))):
+                    store.set_cleaned(result['recipe_id'], points)
+                    cleaned += 1
+    print(f"Cleaned {cleaned} recipes in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Batch relevance scoring for cleaned enhancement points
+
+Replaces "longest first" with a score built from three signals, computed for
+every candidate sentence of a run at once:
+
+    score = 0.5 * tf-idf weight   (rare, informative terms; normalized to 0..1 over the batch)
+          + 0.3 * cooking-term density   (share of tokens that are cooking terms)
+          + 0.2 * keyword hits   (tip words like "avoid", "always", "substitute"; capped at 3)
+
+With NumPy installed the whole batch is tokenized with one translate/split,
+the candidates become one sparse (sentence x term) count matrix in COO form
+and every signal is a bincount over it, so scoring a large run is a handful
+of array operations. Without NumPy the same scores are computed in pure
+Python, which is also what `auto` picks for small batches: below
+NUMPY_MIN_POINTS sentences building the arrays costs more than the loop.
+
+Batch scrapes rank each recipe as soon as it is cleaned, so its tf-idf is
+relative to its own sentences. Ranking many recipes together (the CLI
+below, or rank_groups) gives IDF over the whole set.
+
+Usage:
+    python scripts/scrapper/enhancement_ranking.py "scraped_enhancements/*_enhancements.json" --k 15 --output ranked.json
+"""
+import argparse
+import glob
+import json
+import math
+import re
+import sys
+from collections import Counter
+from itertools import chain
+
+import text_normalize
+
+WEIGHTS = {'tfidf': 0.5, 'density': 0.3, 'keywords': 0.2}
+MAX_KEYWORD_HITS = 3
+TOP_K = 15
+# Below this many points the pure-Python scorer is faster (about 250us either way for a 12-point recipe)
+NUMPY_MIN_POINTS = 32
+
+_SEPARATOR = '\x01'
+# Prefix matches, so "roasted" counts as "roast" but "turkey" is not "key"
+_COOKING_TERM = re.compile('(?:' + '|'.join(map(re.escape, text_normalize.COOKING_TERMS)) + ')')
+# Phrases are matched on their last word ("make sure" -> "sure")
+_KEYWORD = re.compile('(?:' + '|'.join(re.escape(keyword.split()[-1]) for keyword in text_normalize.TIP_KEYWORDS) + ')')
+
+_numpy = None
+
+
+class _TokenChars(dict):
+    """str.translate table: letters stay, apostrophes become ', everything else becomes a space"""
+
+    def __init__(self, keep=''):
+        super().__init__()
+        self.keep = keep
+
+    def __missing__(self, code):
+        char = chr(code)
+        value = char if char.isalpha() or char in self.keep else "'" if char in "'\u2019" else ' '
+        self[code] = value
+        return value
+
+
+class _TermIds(dict):
+    """Raw token -> term id, filled in on first sight (-1 = point separator, -2 = no letters)"""
+
+    def __init__(self):
+        super().__init__()
+        self.vocab = {}
+
+    def __missing__(self, raw):
+        token = raw.strip("'")
+        value = -1 if raw == _SEPARATOR else self.vocab.setdefault(token, len(self.vocab)) if token else -2
+        self[raw] = value
+        return value
+
+
+_TOKEN_CHARS = _TokenChars()
+_BATCH_CHARS = _TokenChars(keep=_SEPARATOR)
+
+
+def numpy_available():
+    """Import NumPy on first use (keeps GUI start-up fast); False when it is not installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy is not False
+
+
+def tokenize(text):
+    """Lowercase words (letters and inner apostrophes, so "don't" is one token)"""
+    return [token for token in (raw.strip("'") for raw in text.lower().translate(_TOKEN_CHARS).split()) if token]
+
+
+def _use_numpy(backend, count):
+    if backend == 'numpy' and not numpy_available():
+        raise RuntimeError("NumPy is not installed")
+    return backend == 'numpy' or (backend == 'auto' and count >= NUMPY_MIN_POINTS and numpy_available())
+
+
+def score_points(points, backend='auto'):
+    """Relevance score of each point, scored as one batch"""
+    if not points:
+        return []
+    if _use_numpy(backend, len(points)):
+        return _score_numpy(points).tolist()
+    return _score_python([tokenize(point) for point in points])
+
+
+def rank_groups(groups, k=TOP_K, backend='auto'):
+    """Top-k points of each group (e.g. one group per recipe), best first, from one scoring pass
+
+    Equal scores keep their original order.
+    """
+    points = list(chain.from_iterable(groups))
+    if not points:
+        return [[] for _ in groups]
+    if _use_numpy(backend, len(points)):
+        keep = _top_k_numpy(_score_numpy(points), [len(group) for group in groups], k)
+    else:
+        scores = _score_python([tokenize(point) for point in points])
+        keep = []
+        start = 0
+        for group in groups:
+            end = start + len(group)
+            keep.append(sorted(range(start, end), key=lambda i: -scores[i])[:k])
+            start = end
+    return [[points[i] for i in indices] for indices in keep]
+
+
+def top_points(points, k=TOP_K, backend='auto'):
+    """Top-k points of a single recipe, best first (pure Python unless it has NUMPY_MIN_POINTS or more)"""
+    return rank_groups([points], k, backend)[0]
+
+
+def _term_flags(terms):
+    cooking = [bool(_COOKING_TERM.match(term)) for term in terms]
+    keyword = [bool(_KEYWORD.match(term)) for term in terms]
+    return cooking, keyword
+
+
+def _combine(tfidf, density, hits):
+    return WEIGHTS['tfidf'] * tfidf + WEIGHTS['density'] * density + WEIGHTS['keywords'] * hits
+
+
+def _score_python(token_lists):
+    doc_count = len(token_lists)
+    counts = [Counter(tokens) for tokens in token_lists]
+    df = Counter(chain.from_iterable(counts))
+    idf = {term: math.log((1 + doc_count) / (1 + n)) + 1 for term, n in df.items()}
+    terms = list(df)
+    cooking, keyword = _term_flags(terms)
+    cooking = dict(zip(terms, cooking))
+    keyword = dict(zip(terms, keyword))
+
+    raw = []
+    for tokens, tf in zip(token_lists, counts):
+        length = max(len(tokens), 1)
+        tfidf = sum((1 + math.log(n)) * idf[term] for term, n in tf.items()) / math.sqrt(length)
+        density = sum(n for term, n in tf.items() if cooking[term]) / length
+        hits = min(sum(n for term, n in tf.items() if keyword[term]), MAX_KEYWORD_HITS) / MAX_KEYWORD_HITS
+        raw.append((tfidf, density, hits))
+    top = max((tfidf for tfidf, _, _ in raw), default=0.0) or 1.0
+    return [_combine(tfidf / top, density, hits) for tfidf, density, hits in raw]
+
+
+def _batch_tokens(points):
+    """Every point's raw tokens in one list, with _SEPARATOR between points"""
+    joined = f" {_SEPARATOR} ".join(points)
+    if joined.isascii() and _SEPARATOR not in joined:
+        # One pass over the whole batch (str.translate is fastest on pure ASCII)
+        return joined.lower().translate(_BATCH_CHARS).split()
+    return f" {_SEPARATOR} ".join([point.lower().translate(_TOKEN_CHARS) for point in points]).split()
+
+
+def _score_numpy(points):
+    np = _numpy
+    doc_count = len(points)
+    tokens = _batch_tokens(points)
+
+    raw_ids = _TermIds()
+    ids = np.fromiter(map(raw_ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    vocab = raw_ids.vocab
+    token_docs = np.cumsum(ids == -1)
+    kept = ids >= 0
+    term_ids, doc_ids = ids[kept], token_docs[kept]
+    lengths = np.bincount(doc_ids, minlength=doc_count)
+    vocab_size = max(len(vocab), 1)
+
+    # Sparse count matrix in COO form: one (doc, term, tf) triple per distinct pair
+    pairs, tf = np.unique(doc_ids * vocab_size + term_ids, return_counts=True)
+    pair_docs, pair_terms = pairs // vocab_size, pairs % vocab_size
+    df = np.bincount(pair_terms, minlength=vocab_size)
+    idf = np.log((1 + doc_count) / (1 + df)) + 1
+
+    safe_lengths = np.maximum(lengths, 1)
+    tfidf = np.bincount(pair_docs, weights=(1 + np.log(tf)) * idf[pair_terms], minlength=doc_count) / np.sqrt(safe_lengths)
+    cooking, keyword = (np.array(flags, dtype=np.float64) for flags in _term_flags(list(vocab)))
+    density = np.bincount(doc_ids, weights=cooking[term_ids], minlength=doc_count) / safe_lengths if vocab else np.zeros(doc_count)
+    hits = np.bincount(doc_ids, weights=keyword[term_ids], minlength=doc_count) if vocab else np.zeros(doc_count)
+    hits = np.minimum(hits, MAX_KEYWORD_HITS) / MAX_KEYWORD_HITS
+    top = tfidf.max() or 1.0
+    return _combine(tfidf / top, density, hits)
+
+
+def _top_k_numpy(scores, group_sizes, k):
+    """Indices of the k best scores per group, as one lexsort over the whole batch"""
+    np = _numpy
+    sizes = np.asarray(group_sizes, dtype=np.int64)
+    group_ids = np.repeat(np.arange(len(sizes)), sizes)
+    order = np.lexsort((np.arange(len(scores)), -scores, group_ids))
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank = np.arange(len(scores)) - starts[group_ids[order]]
+    kept = order[rank < k]
+    bounds = np.cumsum(np.minimum(sizes, k))[:-1]
+    return [indices.tolist() for indices in np.split(kept, bounds)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank the cleaned tip sentences of scraper result files")
+    parser.add_argument('paths', nargs='+', help="*_enhancements.json files or glob patterns")
+    parser.add_argument('--k', type=int, default=TOP_K, help="points to keep per recipe")
+    parser.add_argument('--backend', choices=('auto', 'numpy', 'python'), default='auto')
+    parser.add_argument('--output', help="write {recipe_id: [points]} here instead of printing")
+    args = parser.parse_args(argv)
+
+    recipe_ids, groups = [], []
+    for pattern in args.paths:
+        for path in glob.glob(pattern) or [pattern]:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if 'enhancements' in data:
+                recipe_ids.append(str(data.get('recipe_id')))
+                groups.append(text_normalize.tip_sentences(data['enhancements']))
+    ranked = dict(zip(recipe_ids, rank_groups(groups, args.k, args.backend)))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(ranked, f, indent=2, ensure_ascii=False)
+        print(f"Ranked {sum(map(len, groups))} points for {len(groups)} recipes into {args.output}")
+    else:
+        for recipe_id, points in ranked.items():
+            print(f"{recipe_id}:")
+            for point in points:
+                print(f"  - {point}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Local full-text search over scraped enhancements
+
+A SQLite FTS5 inverted index (porter stemming, so "rest" also finds
+"resting") of every enhancement, one row per tip, with the recipe id, site
+and title alongside for filtering. Recipes are re-indexed only when their
+tips change, so feeding it every batch and upload stays cheap.
+
+Queries are plain words and "quoted phrases", all of which must match.
+`word*` matches a prefix, `-word` excludes, and OR between two parts
+accepts either. Hits are ranked by BM25.
+
+Set PANTRYPAL_SEARCH_INDEX to an index path to index every batch scrape and
+upload as it happens, or backfill from result files or the staging database.
+
+Usage:
+    python scripts/scrapper/enhancement_search.py add "scraped_enhancements/*_enhancements.json"
+    python scripts/scrapper/enhancement_search.py add --staging
+    python scripts/scrapper/enhancement_search.py search buttermilk --site allrecipes
+    python scripts/scrapper/enhancement_search.py search '"rest the dough"' --recipes
+    python scripts/scrapper/enhancement_search.py stats
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import recipe_extraction
+
+INDEX_ENV = 'PANTRYPAL_SEARCH_INDEX'
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'enhancement_search.sqlite3')
+
+_QUERY_PART = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def open_from_env():
+    """The index named by PANTRYPAL_SEARCH_INDEX, or None when it is not set"""
+    path = os.getenv(INDEX_ENV)
+    return SearchIndex(path) if path else None
+
+
+def to_fts_query(text):
+    """Turn a search box query into FTS5 syntax, quoting every term so punctuation is never an operator"""
+    required, excluded = [], []
+    for negate, phrase, word in _QUERY_PART.findall(text):
+        if word == 'OR' and required:
+            required.append('OR')
+            continue
+        if word.startswith('-') and len(word) > 1:
+            negate, word = '-', word[1:]
+        prefix = word.endswith('*') and len(word) > 1
+        term = phrase if phrase else word.rstrip('*') if prefix else word
+        if not term.strip():
+            continue
+        quoted = '"' + term.replace('"', '""') + '"' + ('*' if prefix else '')
+        (excluded if negate else required).append(quoted)
+    while required and required[-1] == 'OR':
+        required.pop()
+    if not required:
+        raise ValueError("query needs at least one term that is not excluded")
+    query = ' '.join(required)
+    if excluded:
+        query = f"({query}) NOT ({' OR '.join(excluded)})"
+    return query
+
+
+class SearchIndex:
+    """FTS5 index of enhancements; open one per thread"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(INDEX_ENV) or DEFAULT_INDEX_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # tips holds the text; tips_fts is an external-content index over it kept in step by triggers
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                recipe_id TEXT PRIMARY KEY,
+                title TEXT,
+                site TEXT,
+                source TEXT,
+                content_hash TEXT NOT NULL,
+                indexed_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tips (
+                id INTEGER PRIMARY KEY,
+                recipe_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tips_recipe ON tips (recipe_id);
+            CREATE INDEX IF NOT EXISTS recipes_site ON recipes (site);
+            CREATE VIRTUAL TABLE IF NOT EXISTS tips_fts USING fts5(
+                text, content='tips', content_rowid='id', tokenize='porter unicode61 remove_diacritics 1'
+            );
+            CREATE TRIGGER IF NOT EXISTS tips_ai AFTER INSERT ON tips BEGIN
+                INSERT INTO tips_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tips_ad AFTER DELETE ON tips BEGIN
+                INSERT INTO tips_fts (tips_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+        """)
+        self.conn.commit()
+
+    def add(self, result):
+        """Index (or re-index) one recipe's enhancements; False if they were already indexed as-is"""
+        with self.conn:
+            return self._add(result)
+
+    def add_many(self, results):
+        """Index several results in one transaction; returns (indexed, unchanged) counts"""
+        indexed = unchanged = 0
+        with self.conn:
+            for result in results:
+                if self._add(result):
+                    indexed += 1
+                else:
+                    unchanged += 1
+        return indexed, unchanged
+
+    def _add(self, result):
+        recipe_id = str(result['recipe_id'])
+        enhancements = result['enhancements']
+        source = result.get('url') or result.get('source_url') or result.get('source')
+        content_hash = hashlib.sha1(json.dumps(enhancements, ensure_ascii=False).encode('utf-8')).hexdigest()
+        row = self.conn.execute("SELECT title, content_hash FROM recipes WHERE recipe_id = ?", (recipe_id,)).fetchone()
+        title = result.get('recipe_title') or (row['title'] if row else None)
+        site = result.get('site_type') or (recipe_extraction.detect_site_type(source) if source else None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO recipes (recipe_id, title, site, source, content_hash, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (recipe_id, title, site, source, content_hash, datetime.now().isoformat()))
+        if row and row['content_hash'] == content_hash:
+            return False
+        self.conn.execute("DELETE FROM tips WHERE recipe_id = ?", (recipe_id,))
+        self.conn.executemany("INSERT INTO tips (recipe_id, position, text) VALUES (?, ?, ?)",
+                              [(recipe_id, i, text) for i, text in enumerate(enhancements)])
+        return True
+
+    def remove(self, recipe_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM tips WHERE recipe_id = ?", (str(recipe_id),))
+            self.conn.execute("DELETE FROM recipes WHERE recipe_id = ?", (str(recipe_id),))
+
+    def search(self, query, site=None, recipe_id=None, limit=20, raw=False):
+        """Best-matching tips first: [{recipe_id, title, site, text, snippet, score}]"""
+        sql = ("SELECT t.recipe_id, r.title, r.site, t.text, "
+               "snippet(tips_fts, 0, '[', ']', '...', 16) AS snippet, bm25(tips_fts) AS score "
+               "FROM tips_fts JOIN tips t ON t.id = tips_fts.rowid JOIN recipes r ON r.recipe_id = t.recipe_id "
+               "WHERE tips_fts MATCH ?")
+        params = [query if raw else to_fts_query(query)]
+        if site:
+            sql += " AND r.site = ?"
+            params.append(site)
+        if recipe_id is not None:
+            sql += " AND t.recipe_id = ?"
+            params.append(str(recipe_id))
+        sql += " ORDER BY score LIMIT ?"
+        params.append(int(limit))
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def search_recipes(self, query, site=None, limit=20, raw=False):
+        """Recipes with matching tips, best first: [{recipe_id, title, site, hits, best_score}]"""
+        # bm25() is not allowed inside an aggregate, so score the tips in a subquery first
+        # (its LIMIT -1 stops SQLite flattening the subquery back into the GROUP BY)
+        sql = ("SELECT recipe_id, title, site, COUNT(*) AS hits, MIN(score) AS best_score FROM ("
+               "SELECT t.recipe_id, r.title, r.site, bm25(tips_fts) AS score "
+               "FROM tips_fts JOIN tips t ON t.id = tips_fts.rowid JOIN recipes r ON r.recipe_id = t.recipe_id "
+               "WHERE tips_fts MATCH ?")
+        params = [query if raw else to_fts_query(query)]
+        if site:
+            sql += " AND r.site = ?"
+            params.append(site)
+        sql += " LIMIT -1) GROUP BY recipe_id ORDER BY best_score LIMIT ?"
+        params.append(int(limit))
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def stats(self):
+        recipes, tips = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM recipes), (SELECT COUNT(*) FROM tips)").fetchone()
+        sites = dict(self.conn.execute(
+            "SELECT COALESCE(site, ''), COUNT(*) FROM recipes GROUP BY site ORDER BY COUNT(*) DESC").fetchall())
+        return {'recipes': recipes, 'tips': tips, 'sites': sites}
+
+    def optimize(self):
+        """Merge the FTS segments (worth running after a large backfill)"""
+        with self.conn:
+            self.conn.execute("INSERT INTO tips_fts (tips_fts) VALUES ('optimize')")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _results_from_files(patterns):
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern) or [pattern]):
+            if os.path.basename(path).startswith('batch_scrape_log'):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('recipe_id') is not None and 'enhancements' in data:
+                yield data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full-text search over scraped enhancements")
+    parser.add_argument('--index', help=f"index file (default: ${INDEX_ENV} or {DEFAULT_INDEX_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="index result files or the staging database")
+    add.add_argument('paths', nargs='*', help="*_enhancements.json files or glob patterns")
+    add.add_argument('--staging', nargs='?', const=os.getenv('PANTRYPAL_STAGING_DB'), default=None,
+                     help="index every result in the staging database (default path: $PANTRYPAL_STAGING_DB)")
+    search = commands.add_parser('search', help="ranked tips (or recipes) matching a query")
+    search.add_argument('query')
+    search.add_argument('--site', help="only this site type")
+    search.add_argument('--recipe', help="only this recipe id")
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--recipes', action='store_true', help="one line per recipe instead of per tip")
+    search.add_argument('--raw', action='store_true', help="pass the query to FTS5 unchanged")
+    commands.add_parser('stats', help="indexed recipes, tips and sites")
+    args = parser.parse_args(argv)
+
+    with SearchIndex(args.index) as index:
+        if args.command == 'add':
+            start = time.perf_counter()
+            if args.staging:
+                import staging_store
+                with staging_store.StagingStore(args.staging) as store:
+                    indexed, unchanged = index.add_many(store.iter_results())
+            elif args.paths:
+                indexed, unchanged = index.add_many(_results_from_files(args.paths))
+            else:
+                parser.error("pass result files or --staging")
+            if indexed:
+                index.optimize()
+            print(f"Indexed {indexed} recipes ({unchanged} unchanged) in {time.perf_counter() - start:.2f}s")
+        elif args.command == 'search':
+            start = time.perf_counter()
+            try:
+                if args.recipes:
+                    hits = index.search_recipes(args.query, args.site, args.limit, args.raw)
+                    lines = [f"{hit['best_score']:8.2f}  {hit['recipe_id']:<10} {hit['site'] or '':<14} "
+                             f"{hit['hits']:>3} tips  {hit['title'] or ''}" for hit in hits]
+                else:
+                    hits = index.search(args.query, args.site, args.recipe, args.limit, args.raw)
+                    lines = [f"{hit['score']:8.2f}  {hit['recipe_id']:<10} {' '.join(hit['snippet'].split())}" for hit in hits]
+            except (ValueError, sqlite3.OperationalError) as e:
+                parser.error(f"bad query: {e}")
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print("\n".join(lines) if lines else "No matches")
+            print(f"{len(hits)} results in {elapsed_ms:.1f} ms")
+        else:
+            print(json.dumps(index.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
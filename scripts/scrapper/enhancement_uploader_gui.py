@@ -1,25 +1,46 @@
+import time
+_process_start = time.perf_counter()  # reference point for time-to-interactive
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import json
 import os
 import re
-import time
 from datetime import datetime
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import threading
+from collections import Counter
+from scraper_metrics import MetricsRegistry
+from ui_tasks import TaskRunner
+from text_views import TextArray, VirtualListView
+import near_duplicates
+import staging_store
+import enhancement_bundles
+import enhancement_search
+import change_feed
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
+# Supabase settings; the client itself is created on first use
 supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
 supabase_key = os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
 
-if not supabase_url or not supabase_key:
-    raise ValueError("Supabase URL or key not found in environment variables")
+_supabase_client = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase():
+    """Return the shared Supabase client, importing and creating it on first use"""
+    global _supabase_client
+    with _supabase_lock:
+        if _supabase_client is None:
+            if not supabase_url or not supabase_key:
+                raise ValueError("Supabase URL or key not found in environment variables")
+            from supabase import create_client
+            _supabase_client = create_client(supabase_url, supabase_key)
+        return _supabase_client
 
-supabase: Client = create_client(supabase_url, supabase_key)
 
 class EnhancementUploaderGUI:
     def __init__(self, root):
@@ -28,6 +49,10 @@ class EnhancementUploaderGUI:
         self.root.geometry("900x700")
         self.root.resizable(True, True)
         
+        # Uploads and the Supabase warm-up run on a shared pool; results come back through the Tk loop
+        self.tasks = TaskRunner(root)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Set up the main frame
         main_frame = ttk.Frame(root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -43,6 +68,7 @@ class EnhancementUploaderGUI:
         ttk.Entry(file_frame, textvariable=self.file_path_var, width=70).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         ttk.Button(file_frame, text="Browse", command=self.browse_file).grid(row=0, column=2, padx=5, pady=5)
         ttk.Button(file_frame, text="Load", command=self.load_json).grid(row=0, column=3, padx=5, pady=5)
+        ttk.Button(file_frame, text="Load from Staging DB", command=self.load_from_staging).grid(row=0, column=4, padx=5, pady=5)
         
         # Recipe info frame
         recipe_frame = ttk.LabelFrame(main_frame, text="Recipe Information", padding="10")
@@ -65,21 +91,11 @@ class EnhancementUploaderGUI:
         enhancements_frame = ttk.LabelFrame(main_frame, text="Enhancements", padding="10")
         enhancements_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
-        # Create a frame for the enhancement list with scrollbars
-        list_frame = ttk.Frame(enhancements_frame)
-        list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        
-        # Scrollbars
-        y_scrollbar = ttk.Scrollbar(list_frame)
-        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # Treeview for enhancements
-        self.enhancement_tree = ttk.Treeview(list_frame, columns=("Enhancement"), show="headings", yscrollcommand=y_scrollbar.set)
-        self.enhancement_tree.heading("Enhancement", text="Enhancement")
-        self.enhancement_tree.column("Enhancement", width=800)
-        self.enhancement_tree.pack(fill=tk.BOTH, expand=True)
-        
-        y_scrollbar.config(command=self.enhancement_tree.yview)
+        # The enhancements live in a compact in-memory model; the list only
+        # creates Treeview rows for what is on screen
+        self.enhancements = TextArray()
+        self.enhancement_list = VirtualListView(enhancements_frame, self.enhancements, heading="Enhancement")
+        self.enhancement_list.pack(fill=tk.BOTH, expand=True, pady=5)
         
         # No enhancement type selection needed anymore
         
@@ -88,7 +104,9 @@ class EnhancementUploaderGUI:
         button_frame.pack(fill=tk.X, pady=10)
         
         ttk.Button(button_frame, text="Upload to Database", command=self.upload_to_database).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Upload Change Feed", command=self.upload_change_feed).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Clear All", command=self.clear_all).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel Upload", command=self.cancel_upload).pack(side=tk.LEFT, padx=5)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -96,9 +114,41 @@ class EnhancementUploaderGUI:
         status_bar = ttk.Label(root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Load the default file if it exists
+        # Session-wide upload timing and throughput metrics
+        self.metrics = MetricsRegistry(prefix='pantrypal_uploader')
+        
+        # Load the default file once the window is up
         if os.path.exists(self.file_path_var.get()):
-            self.load_json()
+            self.root.after_idle(self.load_json)
+        
+        # Warm up the Supabase client in the background and report startup time
+        self.tasks.submit('supabase_connect', self._connect_supabase)
+        self.root.after_idle(self._report_startup_time)
+    
+    def _report_startup_time(self):
+        """Record how long it took from process start until the window was interactive"""
+        elapsed = time.perf_counter() - _process_start
+        self.metrics.set_gauge('startup_seconds', round(elapsed, 4))
+        print(f"Ready in {elapsed * 1000:.0f} ms")
+    
+    def _connect_supabase(self, job):
+        """Create the Supabase client off the UI thread so the first upload starts immediately"""
+        try:
+            start = time.perf_counter()
+            get_supabase()
+            self.metrics.observe('stage_seconds', time.perf_counter() - start, stage='supabase_connect')
+        except Exception as e:
+            job.post(self.status_var.set, f"Supabase not available: {str(e)}")
+    
+    def on_close(self):
+        """Cancel a running upload and close the window"""
+        self.tasks.shutdown()
+        self.root.destroy()
+    
+    def cancel_upload(self):
+        """Stop a running upload after the enhancement currently in flight"""
+        if self.tasks.cancel_all():
+            self.status_var.set("Cancelling upload...")
     
     def browse_file(self):
         file_path = filedialog.askopenfilename(
@@ -123,18 +173,42 @@ class EnhancementUploaderGUI:
             self.recipe_title_var.set(data.get('recipe_title', ''))
             self.source_url_var.set(data.get('source_url', ''))
             
-            # Clear existing items
-            for item in self.enhancement_tree.get_children():
-                self.enhancement_tree.delete(item)
+            # Replace the model and redraw the visible rows (batch results carry upload-ready cleaned points)
+            self.enhancements.replace(data.get('cleaned_enhancements') or data.get('enhancements', []))
+            self.enhancement_list.refresh(reset=True)
             
-            # Add enhancements to the tree
-            for enhancement in data.get('enhancements', []):
-                self.enhancement_tree.insert('', 'end', values=(enhancement,))
-            
-            self.status_var.set(f"Loaded {len(data.get('enhancements', []))} enhancements from {os.path.basename(file_path)}")
+            self.status_var.set(f"Loaded {len(self.enhancements)} enhancements from {os.path.basename(file_path)}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load JSON: {str(e)}")
     
+    def load_from_staging(self):
+        """Load the recipe named in the Recipe ID field from the PANTRYPAL_STAGING_DB store"""
+        recipe_id = self.recipe_id_var.get().strip()
+        if not recipe_id:
+            messagebox.showerror("Error", "Enter a Recipe ID to load from the staging database")
+            return
+        
+        try:
+            store = staging_store.open_from_env()
+            if not store:
+                messagebox.showerror("Error", f"Set {staging_store.STAGING_DB_ENV} to the staging database path")
+                return
+            with store:
+                result = store.get(recipe_id)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read staging database: {str(e)}")
+            return
+        
+        if not result:
+            messagebox.showerror("Error", f"Recipe {recipe_id} not found in {store.path}")
+            return
+        
+        self.recipe_title_var.set(result.get('recipe_title') or '')
+        self.source_url_var.set(result.get('url') or '')
+        self.enhancements.replace(result.get('cleaned_enhancements') or result['enhancements'])
+        self.enhancement_list.refresh(reset=True)
+        self.status_var.set(f"Loaded {len(self.enhancements)} enhancements for recipe {recipe_id} from staging")
+    
     # Removed categorize_enhancement method as it's no longer needed
     
     # Removed apply_type method as it's no longer needed
@@ -144,8 +218,8 @@ class EnhancementUploaderGUI:
         self.recipe_title_var.set('')
         self.source_url_var.set('')
         
-        for item in self.enhancement_tree.get_children():
-            self.enhancement_tree.delete(item)
+        self.enhancements.clear()
+        self.enhancement_list.refresh(reset=True)
         
         self.status_var.set("Cleared all data")
     
@@ -157,15 +231,8 @@ class EnhancementUploaderGUI:
             messagebox.showerror("Error", "Recipe ID is required")
             return
         
-        enhancements = []
-        for item in self.enhancement_tree.get_children():
-            values = self.enhancement_tree.item(item, 'values')
-            enhancement_text = values[0]
-            # Use a default type for all enhancements
-            enhancements.append({
-                'text': enhancement_text,
-                'type': 'general'
-            })
+        # Read straight from the model; use a default type for all enhancements
+        enhancements = [{'text': text, 'type': 'general'} for text in self.enhancements]
         
         if not enhancements:
             messagebox.showerror("Error", "No enhancements to upload")
@@ -175,14 +242,34 @@ class EnhancementUploaderGUI:
         if not messagebox.askyesno("Confirm Upload", f"Upload {len(enhancements)} enhancements for recipe {recipe_id}?"):
             return
         
-        # Start upload in a separate thread to avoid freezing the UI
-        threading.Thread(target=self._upload_thread, args=(recipe_id, source_url, enhancements)).start()
-    
-    def _upload_thread(self, recipe_id, source_url, enhancements):
-        self.status_var.set("Uploading to database...")
-        self.root.update_idletasks()
+        if self.tasks.running_jobs('upload'):
+            messagebox.showinfo("Upload Running", "An upload is already in progress.")
+            return
         
+        # Upload on the task pool to avoid freezing the UI
+        self.status_var.set("Uploading to database...")
+        self.tasks.submit('upload', self._upload_thread, recipe_id, source_url, enhancements,
+                          on_done=self._on_upload_done, on_error=self._on_upload_error)
+    
+    def _dedup_mode(self, supabase):
+        """PANTRYPAL_DEDUP, or 'off' when 'tag' is asked for but the tag columns are not in the database yet"""
+        dedup_mode = near_duplicates.dedup_mode()
+        if dedup_mode == 'tag':
+            try:
+                supabase.table('unique_scraped_enhancements').select(','.join(near_duplicates.TAG_COLUMNS)).limit(1).execute()
+            except Exception as e:
+                print(f"Warning: near-duplicate tagging is off, run "
+                      f"sql/add-near-duplicate-tags-to-unique-scraped-enhancements.sql first ({str(e)})")
+                return 'off'
+        return dedup_mode
+
+    def _upload_thread(self, job, recipe_id, source_url, enhancements):
+        """Upload one recipe's enhancements (runs on the task pool, never touches widgets)"""
+        upload_start = time.perf_counter()
+        index = None
         try:
+            supabase = get_supabase()
+            
             # First, store in the scraped_enhancements table for backward compatibility
             enhancement_texts = [e['text'] for e in enhancements]
             scraped_data = {
@@ -192,33 +279,253 @@ class EnhancementUploaderGUI:
                 'scraped_at': datetime.now().isoformat()
             }
             
-            response = supabase.table('scraped_enhancements').upsert(scraped_data).execute()
+            with self.metrics.timer('supabase_upsert', table='scraped_enhancements'):
+                response = supabase.table('scraped_enhancements').upsert(scraped_data).execute()
+            self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='success')
+            
+            # Check each enhancement against everything uploaded before (PANTRYPAL_DEDUP)
+            dedup_mode = self._dedup_mode(supabase)
+            if dedup_mode != 'off':
+                try:
+                    index = near_duplicates.NearDuplicateIndex()
+                except Exception as e:
+                    print(f"Near-duplicate index unavailable: {str(e)}")
             
             # Then, store each enhancement individually in the unique_scraped_enhancements table
             success_count = 0
             error_count = 0
+            duplicate_count = 0
+            collapsed_count = 0
             
-            for enhancement in enhancements:
+            for i, enhancement in enumerate(enhancements, 1):
+                if job.cancelled:
+                    break
+                job.progress(self.status_var.set, f"Uploading enhancement {i}/{len(enhancements)}...")
+                unique_data = {
+                    'recipe_id': recipe_id,
+                    'enhancement': enhancement['text'],
+                    'enhancement_type': enhancement['type'],
+                    'source': source_url
+                }
+                if index:
+                    with self.metrics.timer('dedup_lookup'):
+                        match = index.add(enhancement['text'], recipe_id, source_url)
+                    if match.is_duplicate:
+                        duplicate_count += 1
+                        self.metrics.inc('near_duplicates_total', mode=dedup_mode)
+                        if dedup_mode == 'collapse':
+                            index.commit()
+                            collapsed_count += 1
+                            continue
+                    # Tag the row so downstream sees which earlier enhancement it repeats
+                    unique_data.update(match.upload_fields())
                 try:
-                    unique_data = {
-                        'recipe_id': recipe_id,
-                        'enhancement': enhancement['text'],
-                        'enhancement_type': enhancement['type'],
-                        'source': source_url
-                    }
-                    
-                    response = supabase.table('unique_scraped_enhancements').upsert(unique_data).execute()
+                    with self.metrics.timer('supabase_upsert', table='unique_scraped_enhancements'):
+                        response = supabase.table('unique_scraped_enhancements').upsert(unique_data).execute()
+                    self.metrics.inc('supabase_requests_total', table='unique_scraped_enhancements', status='success')
                     success_count += 1
+                    if index:
+                        index.commit()
                 except Exception as e:
+                    # Keep the index in step with the database, so a retry is not flagged as a duplicate of itself
+                    if index:
+                        index.rollback()
+                    self.metrics.inc('supabase_requests_total', table='unique_scraped_enhancements', status='error')
                     print(f"Error uploading enhancement: {str(e)}")
                     error_count += 1
             
-            self.status_var.set(f"Upload complete: {success_count} successful, {error_count} failed")
-            messagebox.showinfo("Upload Complete", f"Successfully uploaded {success_count} enhancements to the database.\n{error_count} enhancements failed to upload.")
+            upload_time = time.perf_counter() - upload_start
+            self.metrics.observe('stage_seconds', upload_time, stage='upload')
+            self.metrics.inc('enhancements_uploaded_total', success_count)
+            self.metrics.set_gauge('last_upload_enhancements_per_second', round(len(enhancements) / upload_time, 4) if upload_time else 0)
+            print(f"Upload timings: {self.metrics.summary()}")
+            skipped_count = len(enhancements) - success_count - error_count - collapsed_count
+            
+            # Record the upload in the staging store, the static bundles and the search index when configured
+            if not skipped_count and not error_count:
+                store = staging_store.open_from_env()
+                if store:
+                    with store:
+                        store.mark_uploaded(recipe_id)
+                bundles = enhancement_bundles.open_from_env()
+                uploaded = {'recipe_id': recipe_id, 'url': source_url, 'enhancements': enhancement_texts}
+                if bundles:
+                    bundles.update([uploaded])
+                search_index = enhancement_search.open_from_env()
+                if search_index:
+                    with search_index:
+                        search_index.add(uploaded)
+            return success_count, error_count, skipped_count, duplicate_count, collapsed_count
+        
+        except Exception:
+            self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='error')
+            raise
+        
+        finally:
+            if index:
+                index.close()
+            self.metrics.export_to_env_dir('uploader_metrics')
+    
+    def upload_change_feed(self):
+        """Upload only what a batch run's change feed (changes/*.jsonl) says was added, modified or removed"""
+        if self.tasks.running_jobs('upload'):
+            messagebox.showinfo("Upload Running", "An upload is already in progress.")
+            return
         
+        file_path = filedialog.askopenfilename(
+            title="Select Change Feed",
+            filetypes=[("Change feeds", "*.jsonl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            events = list(change_feed.read_feed([file_path]))
         except Exception as e:
-            self.status_var.set(f"Upload failed: {str(e)}")
-            messagebox.showerror("Upload Failed", f"Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to read change feed: {str(e)}")
+            return
+        
+        if not events:
+            messagebox.showinfo("Nothing to Upload", "The change feed is empty: nothing changed in that run.")
+            return
+        
+        ops = Counter(event['op'] for event in events)
+        if not messagebox.askyesno("Confirm Upload", f"Apply {len(events)} changes ({ops['added']} added, {ops['modified']} modified, "
+                                                     f"{ops['removed']} removed recipes) to the database?"):
+            return
+        
+        self.status_var.set("Uploading change feed...")
+        self.tasks.submit('upload', self._upload_feed_thread, events,
+                          on_done=self._on_feed_upload_done, on_error=self._on_upload_error)
+    
+    def _upload_feed_thread(self, job, events):
+        """Apply change events in order (runs on the task pool, never touches widgets)
+        
+        Recipe rows are rewritten whole; per-enhancement rows are only inserted for
+        added texts and deleted for removed ones. The cleaned points are used when
+        the run had a cleaning stage, the raw enhancements otherwise.
+        """
+        upload_start = time.perf_counter()
+        index = None
+        store = None
+        counts = Counter()
+        try:
+            supabase = get_supabase()
+            dedup_mode = self._dedup_mode(supabase)
+            if dedup_mode != 'off':
+                try:
+                    index = near_duplicates.NearDuplicateIndex()
+                except Exception as e:
+                    print(f"Near-duplicate index unavailable: {str(e)}")
+            store = staging_store.open_from_env()
+            
+            for i, event in enumerate(events, 1):
+                if job.cancelled:
+                    break
+                job.progress(self.status_var.set, f"Uploading change {i}/{len(events)}...")
+                recipe_id = str(event['recipe_id'])
+                diff = event['cleaned_enhancements'] if 'cleaned_enhancements' in event else event['enhancements']
+                try:
+                    with self.metrics.timer('feed_event', op=event['op']):
+                        if event['op'] == 'removed':
+                            supabase.table('unique_scraped_enhancements').delete().eq('recipe_id', recipe_id).execute()
+                            supabase.table('scraped_enhancements').delete().eq('recipe_id', recipe_id).execute()
+                        else:
+                            self._upload_feed_recipe(supabase, index, dedup_mode, recipe_id, event['recipe'], diff, counts)
+                    self.metrics.inc('feed_events_total', op=event['op'], status='success')
+                    counts[event['op']] += 1
+                    if store and event['op'] != 'removed':
+                        store.mark_uploaded(recipe_id)
+                except Exception as e:
+                    self.metrics.inc('feed_events_total', op=event['op'], status='error')
+                    print(f"Error applying change to recipe {recipe_id}: {str(e)}")
+                    counts['errors'] += 1
+            counts['skipped'] = len(events) - counts['added'] - counts['modified'] - counts['removed'] - counts['errors']
+            
+            self.metrics.observe('stage_seconds', time.perf_counter() - upload_start, stage='feed_upload')
+            print(f"Upload timings: {self.metrics.summary()}")
+            return counts
+        
+        finally:
+            if index:
+                index.close()
+            if store:
+                store.close()
+            self.metrics.export_to_env_dir('uploader_metrics')
+    
+    def _upload_feed_recipe(self, supabase, index, dedup_mode, recipe_id, recipe, diff, counts):
+        """Rewrite one changed recipe's row and sync its per-enhancement rows with the diff"""
+        source_url = recipe.get('url') or ''
+        texts = recipe['cleaned_enhancements'] if 'cleaned_enhancements' in recipe else recipe['enhancements']
+        supabase.table('scraped_enhancements').upsert({
+            'recipe_id': recipe_id,
+            'enhancements': texts,
+            'source': source_url,
+            'scraped_at': datetime.now().isoformat()
+        }).execute()
+        
+        for text in diff['removed']:
+            supabase.table('unique_scraped_enhancements').delete().eq('recipe_id', recipe_id).eq('enhancement', text).execute()
+            counts['enhancements_removed'] += 1
+        for text in diff['added']:
+            row = {
+                'recipe_id': recipe_id,
+                'enhancement': text,
+                'enhancement_type': 'general',
+                'source': source_url
+            }
+            if index:
+                with self.metrics.timer('dedup_lookup'):
+                    match = index.add(text, recipe_id, source_url)
+                if match.is_duplicate:
+                    counts['duplicates'] += 1
+                    self.metrics.inc('near_duplicates_total', mode=dedup_mode)
+                    if dedup_mode == 'collapse':
+                        index.commit()
+                        continue
+                row.update(match.upload_fields())
+            try:
+                supabase.table('unique_scraped_enhancements').upsert(row).execute()
+            except Exception:
+                if index:
+                    index.rollback()
+                raise
+            if index:
+                index.commit()
+            counts['enhancements_added'] += 1
+        self.metrics.inc('enhancements_uploaded_total', len(diff['added']))
+    
+    def _on_feed_upload_done(self, counts):
+        summary = (f"{counts['added']} added, {counts['modified']} modified and {counts['removed']} removed recipes applied "
+                   f"({counts['enhancements_added']} enhancements uploaded, {counts['enhancements_removed']} deleted).\n"
+                   f"{counts['errors']} changes failed.")
+        if counts['duplicates']:
+            summary += f"\n{counts['duplicates']} new enhancements are near-duplicates of earlier uploads."
+        if counts['skipped']:
+            self.status_var.set(f"Change feed upload cancelled: {counts['skipped']} changes not applied")
+            messagebox.showinfo("Upload Cancelled", summary + f"\n{counts['skipped']} changes were not applied.")
+            return
+        self.status_var.set(f"Change feed applied: {counts['added'] + counts['modified'] + counts['removed']} recipes, "
+                            f"{counts['errors']} failed")
+        messagebox.showinfo("Upload Complete", summary)
+    
+    def _on_upload_done(self, counts):
+        success_count, error_count, skipped_count, duplicate_count, collapsed_count = counts
+        duplicates_note = ""
+        if collapsed_count:
+            duplicates_note = f"\n{collapsed_count} near-duplicates of earlier uploads were not sent."
+        elif duplicate_count:
+            duplicates_note = f"\n{duplicate_count} are near-duplicates of earlier uploads (tagged in the local index)."
+        if skipped_count:
+            self.status_var.set(f"Upload cancelled: {success_count} successful, {error_count} failed, {skipped_count} not sent")
+            messagebox.showinfo("Upload Cancelled", f"Uploaded {success_count} enhancements before cancelling.\n{skipped_count} enhancements were not sent." + duplicates_note)
+            return
+        self.status_var.set(f"Upload complete: {success_count} successful, {error_count} failed, {duplicate_count} near-duplicates")
+        messagebox.showinfo("Upload Complete", f"Successfully uploaded {success_count} enhancements to the database.\n{error_count} enhancements failed to upload." + duplicates_note)
+    
+    def _on_upload_error(self, e):
+        self.status_var.set(f"Upload failed: {str(e)}")
+        messagebox.showerror("Upload Failed", f"Error: {str(e)}")
 
 if __name__ == "__main__":
     root = tk.Tk()
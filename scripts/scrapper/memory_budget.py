@@ -0,0 +1,71 @@
+"""Resident-memory budget for batch intake
+
+Every recipe in flight holds a page body and, on the DOM path, a parsed
+BeautifulSoup tree several times its size. A highly parallel batch over
+heavy pages can therefore grow well past what a small worker box has. With
+a budget, the batch engine checks the process RSS before it takes on another
+recipe. Over budget, it first collects garbage (parse trees are reference
+cycles that plain reference counting never frees), then holds new intake
+back until in-flight recipes finish. One recipe is always allowed, so a
+budget below the footprint of a single page slows a run down but never
+stalls it.
+
+PANTRYPAL_MEMORY_BUDGET_MB sets the budget for batch runs (unset or 0 = none).
+"""
+import gc
+import os
+
+MEMORY_BUDGET_ENV = 'PANTRYPAL_MEMORY_BUDGET_MB'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def budget_bytes(value=None):
+    """Budget in bytes for a size in MB or, by default, the environment; None for no budget"""
+    if value is None:
+        value = os.getenv(MEMORY_BUDGET_ENV, '').strip() or 0
+    megabytes = float(value)
+    return int(megabytes * 1024 * 1024) if megabytes > 0 else None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def rss_supported():
+    return current_rss() is not None
+
+
+class MemoryBudget:
+    """Decides whether the batch may take on another recipe; tracks peak RSS and throttled intake"""
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.peak_rss = 0
+        self.throttled = 0
+        self.collections = 0
+
+    def allows_intake(self, in_flight):
+        """True when under budget, or when nothing is in flight (so the run always makes progress)"""
+        rss = current_rss()
+        if rss is None:
+            return True
+        self.peak_rss = max(self.peak_rss, rss)
+        if rss <= self.limit_bytes or not in_flight:
+            return True
+        gc.collect()
+        self.collections += 1
+        if current_rss() <= self.limit_bytes:
+            return True
+        self.throttled += 1
+        return False
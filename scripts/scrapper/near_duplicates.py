@@ -0,0 +1,283 @@
+"""Persistent near-duplicate index for scraped enhancements
+
+MinHash signatures with LSH banding, stored in SQLite so the index can grow
+to millions of entries while memory stays within the SQLite page cache.
+Only the first entry of each near-duplicate cluster is banded; later
+near-duplicates are recorded against it (duplicate_of) and never become
+candidates themselves, so lookups stay sub-linear as the corpus grows.
+
+Usage:
+    python scripts/scrapper/near_duplicates.py stats
+    python scripts/scrapper/near_duplicates.py query "Let the meat rest before slicing."
+    python scripts/scrapper/near_duplicates.py add scraped_enhancements/*_enhancements.json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import zlib
+from array import array
+
+from text_normalize import dedup_key
+
+INDEX_ENV = 'PANTRYPAL_DEDUP_INDEX'
+MODE_ENV = 'PANTRYPAL_DEDUP'
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'enhancement_index.sqlite3')
+MODES = ('off', 'tag', 'collapse')
+# Columns 'tag' fills; added by sql/add-near-duplicate-tags-to-unique-scraped-enhancements.sql
+TAG_COLUMNS = ('duplicate_of_recipe_id', 'duplicate_of_enhancement', 'duplicate_similarity')
+
+NUM_PERM = 64
+BANDS = 16            # 16 bands x 4 rows: pairs above ~0.5 Jaccard usually collide
+THRESHOLD = 0.8       # estimated Jaccard needed to call a candidate a duplicate (as in clean_enhancements)
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+
+
+def dedup_mode():
+    """Upload-time behaviour from PANTRYPAL_DEDUP: off (default), tag or collapse"""
+    mode = os.getenv(MODE_ENV, 'off').strip().lower()
+    return mode if mode in MODES else 'off'
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return dedup_key(text)
+
+
+def shingles(normalized):
+    """Word set of a normalized text, the same features clean_enhancements compares"""
+    return set(normalized.split()) or {''}
+
+
+class MinHasher:
+    """Fixed family of hash permutations; the seed must match the stored index"""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, normalized):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles(normalized)]
+        return array('I', [
+            min(((a * h + b) % _PRIME) & _MASK for h in hashes)
+            for a, b in self.params
+        ])
+
+
+def similarity(sig1, sig2):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+class Match:
+    """Outcome of adding one enhancement to the index"""
+
+    def __init__(self, entry_id, duplicate_of=None, similarity=None, existing=False, canonical=(None, None)):
+        self.entry_id = entry_id
+        self.duplicate_of = duplicate_of  # canonical entry id when this is a near-duplicate
+        self.similarity = similarity
+        self.existing = existing          # this recipe already had this text indexed
+        self.canonical_recipe_id, self.canonical_text = canonical
+
+    @property
+    def is_duplicate(self):
+        return self.duplicate_of is not None
+
+    def upload_fields(self):
+        """The near-duplicate tag columns of a unique_scraped_enhancements row (none for a canonical text)"""
+        if not self.is_duplicate:
+            return {}
+        return dict(zip(TAG_COLUMNS, (self.canonical_recipe_id, self.canonical_text, self.similarity)))
+
+
+class NearDuplicateIndex:
+    """SQLite-backed MinHash/LSH index; not thread-safe, open one per thread"""
+
+    def __init__(self, path=None, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, cache_mb=64):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path or os.getenv(INDEX_ENV) or DEFAULT_INDEX_PATH
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{int(cache_mb * 1024)}")
+        self._create_schema(num_perm)
+
+    def _create_schema(self, num_perm):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                recipe_id TEXT,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                source TEXT,
+                signature BLOB NOT NULL,
+                duplicate_of INTEGER,
+                similarity REAL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS entries_recipe_text ON entries (recipe_id, text_hash);
+            CREATE INDEX IF NOT EXISTS entries_duplicate_of ON entries (duplicate_of);
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, entry_id)
+            ) WITHOUT ROWID;
+        """)
+        settings = {'num_perm': str(num_perm), 'bands': str(self.bands)}
+        stored = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if not stored:
+            self.conn.executemany("INSERT INTO meta VALUES (?, ?)", settings.items())
+            self.conn.commit()
+        elif any(stored.get(key) != value for key, value in settings.items()):
+            raise ValueError(f"Index {self.path} was built with {stored}, not {settings}")
+
+    def _band_keys(self, signature):
+        raw = signature.tobytes()
+        width = self.rows * signature.itemsize
+        for band in range(self.bands):
+            digest = hashlib.blake2b(raw[band * width:(band + 1) * width], digest_size=7).digest()
+            yield band, int.from_bytes(digest, 'big')
+
+    def _best_candidate(self, signature):
+        candidates = set()
+        for band, bucket in self._band_keys(signature):
+            candidates.update(row[0] for row in self.conn.execute(
+                "SELECT entry_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)))
+        best_id, best_score, best_text = None, 0.0, None
+        for entry_id in candidates:
+            blob, text = self.conn.execute("SELECT signature, text FROM entries WHERE id = ?", (entry_id,)).fetchone()
+            score = similarity(signature, array('I', blob))
+            if score > best_score:
+                best_id, best_score, best_text = entry_id, score, text
+        return best_id, best_score, best_text
+
+    def query(self, text):
+        """Return (entry_id, similarity, text) of the closest stored cluster, or None"""
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        entry_id, score, stored_text = self._best_candidate(self.hasher.signature(normalized))
+        if entry_id is None or score < self.threshold:
+            return None
+        return entry_id, score, stored_text
+
+    def _canonical(self, entry_id):
+        if entry_id is None:
+            return None, None
+        return self.conn.execute("SELECT recipe_id, text FROM entries WHERE id = ?", (entry_id,)).fetchone()
+
+    def add(self, text, recipe_id=None, source=None):
+        """Index one enhancement and report whether it near-duplicates an earlier one
+
+        Re-adding the same text for the same recipe returns the earlier result,
+        so re-uploading a recipe does not flag it against itself. The entry is
+        only durable after commit(); an uploader rolls it back when the upload
+        it stands for fails, so a retry is not flagged against itself either.
+        """
+        normalized = normalize(text)
+        text_hash = hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+        recipe_key = None if recipe_id is None else str(recipe_id)
+        row = self.conn.execute(
+            "SELECT id, duplicate_of, similarity FROM entries WHERE recipe_id IS ? AND text_hash = ?",
+            (recipe_key, text_hash)).fetchone()
+        if row:
+            return Match(row[0], row[1], row[2], existing=True, canonical=self._canonical(row[1]))
+
+        signature = self.hasher.signature(normalized)
+        best_id, score, _ = self._best_candidate(signature) if normalized else (None, 0.0, None)
+        duplicate_of = best_id if best_id is not None and score >= self.threshold else None
+        cursor = self.conn.execute(
+            "INSERT INTO entries (recipe_id, text_hash, text, source, signature, duplicate_of, similarity) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (recipe_key, text_hash, text, source, signature.tobytes(), duplicate_of,
+             round(score, 4) if duplicate_of else None))
+        entry_id = cursor.lastrowid
+        if duplicate_of is None:
+            self.conn.executemany("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)",
+                                  [(band, bucket, entry_id) for band, bucket in self._band_keys(signature)])
+        return Match(entry_id, duplicate_of, score if duplicate_of else None, canonical=self._canonical(duplicate_of))
+
+    def stats(self):
+        entries, duplicates = self.conn.execute(
+            "SELECT COUNT(*), COUNT(duplicate_of) FROM entries").fetchone()
+        top = self.conn.execute(
+            "SELECT e.text, COUNT(*) FROM entries d JOIN entries e ON e.id = d.duplicate_of "
+            "GROUP BY d.duplicate_of ORDER BY COUNT(*) DESC LIMIT 10").fetchall()
+        return {
+            'entries': entries,
+            'clusters': entries - duplicates,
+            'duplicates': duplicates,
+            'top_clusters': [{'text': text, 'duplicates': count} for text, count in top],
+        }
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        """Forget everything added since the last commit()"""
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate index for scraped enhancements")
+    parser.add_argument('--index', help=f"index file (default: ${INDEX_ENV} or {DEFAULT_INDEX_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="entry, cluster and duplicate counts")
+    query = commands.add_parser('query', help="find the closest stored enhancement")
+    query.add_argument('text')
+    add = commands.add_parser('add', help="index scraper result files (*_enhancements.json), cleaned points first "
+                                           "as the uploader does")
+    add.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    with NearDuplicateIndex(args.index) as index:
+        if args.command == 'stats':
+            print(json.dumps(index.stats(), indent=2, ensure_ascii=False))
+        elif args.command == 'query':
+            match = index.query(args.text)
+            print(f"{match[1]:.2f}  #{match[0]}  {match[2]}" if match else "No near-duplicate found")
+        else:
+            added = duplicates = 0
+            for pattern in args.paths:
+                for path in glob.glob(pattern) or [pattern]:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    source = data.get('url') or data.get('source_url')
+                    # The same texts the uploader indexes: the cleaned points when the result has them
+                    for text in data.get('cleaned_enhancements') or data.get('enhancements', []):
+                        match = index.add(text, data.get('recipe_id'), source)
+                        if not match.existing:
+                            added += 1
+                            duplicates += match.is_duplicate
+                    index.commit()
+            print(f"Indexed {added} enhancements, {duplicates} near-duplicates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import importlib.util
+import os
+import re
+
+import recipe_extraction
+
+# Hard cap on the bytes read per page; PANTRYPAL_MAX_PAGE_BYTES=0 disables it
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+MAX_PAGE_BYTES_ENV = 'PANTRYPAL_MAX_PAGE_BYTES'
+
+# Stop reading once the site's tip/note sections have been seen and this many
+# further bytes have arrived; PANTRYPAL_EARLY_STOP=0 always reads to the end
+DEFAULT_SECTION_TAIL_BYTES = 128 * 1024
+EARLY_STOP_ENV = 'PANTRYPAL_EARLY_STOP'
+
+CHUNK_SIZE = 64 * 1024
+
+# HTTP/2 is off unless PANTRYPAL_HTTP2 is set (needs httpx[http2]):
+#   PANTRYPAL_HTTP2=1 / h2  -> negotiate HTTP/2 on https (ALPN), HTTP/1.1 where a server lacks it
+#   PANTRYPAL_HTTP2=h2c     -> HTTP/2 without negotiation, also over plain http (local replay server)
+HTTP2_ENV = 'PANTRYPAL_HTTP2'
+_HTTP2_MODES = {'1': 'h2', 'true': 'h2', 'yes': 'h2', 'h2': 'h2', 'h2c': 'h2c'}
+
+_BODY_START = re.compile(rb'<body[\s>]', re.IGNORECASE)
+_DOCUMENT_END = re.compile(rb'</html\s*>', re.IGNORECASE)
+
+
+def max_page_bytes():
+    """Return the configured byte cap, or None for unlimited"""
+    value = int(os.getenv(MAX_PAGE_BYTES_ENV, DEFAULT_MAX_BYTES))
+    return value if value > 0 else None
+
+
+def early_stop_enabled():
+    return os.getenv(EARLY_STOP_ENV, '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def http2_mode(value=None):
+    """Return 'h2', 'h2c' or None for a setting (True, 'h2c', ...) or, by default, the environment"""
+    if value is None:
+        value = os.getenv(HTTP2_ENV, '')
+    if value is True or value is False:
+        return 'h2' if value else None
+    return _HTTP2_MODES.get(str(value).strip().lower())
+
+
+def http2_available():
+    """True when httpx and the h2 package are installed"""
+    return importlib.util.find_spec('httpx') is not None and importlib.util.find_spec('h2') is not None
+
+
+class FetchedPage:
+    """A page body read with a byte budget, plus how and why reading stopped"""
+
+    __slots__ = ('response', 'url', 'status_code', 'headers', 'encoding', 'http_version', 'content', 'bytes_read',
+                 'stop_reason')
+
+    def __init__(self, response, content, bytes_read, stop_reason):
+        self.response = response
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.encoding = response.encoding
+        self.http_version = getattr(response, 'http_version', 'HTTP/1.1')
+        self.content = content
+        self.bytes_read = bytes_read
+        # 'complete', 'document_end', 'sections' (early stop) or 'max_bytes' (cut at the cap)
+        self.stop_reason = stop_reason
+
+    @property
+    def truncated(self):
+        """True when the page was cut at the byte cap before its content ended"""
+        return self.stop_reason == 'max_bytes'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        self.response.raise_for_status()
+
+    def release(self):
+        """Drop the body and the response once the page has been extracted (the metadata stays)"""
+        self.content = b""
+        self.response = None
+
+
+def _marker_pattern(site_type):
+    markers = recipe_extraction.SECTION_MARKERS.get(site_type)
+    if not markers:
+        return None
+    alternatives = b'|'.join(re.escape(m.encode()) for m in markers)
+    return re.compile(rb'class="[^"]*(?<![\w-])(?:' + alternatives + rb')(?![\w-])')
+
+
+def fetch_page(session, url, site_type="other", timeout=15, max_bytes=None, early_stop=None,
+               section_tail_bytes=DEFAULT_SECTION_TAIL_BYTES):
+    """Stream a page, stopping at the byte cap, the document end or after the tip sections
+
+    max_bytes=None uses PANTRYPAL_MAX_PAGE_BYTES and 0 means unlimited.
+    Error responses are returned without reading their body so callers can
+    inspect status_code / headers (e.g. 429 Retry-After) or raise_for_status().
+    """
+    if max_bytes is None:
+        max_bytes = max_page_bytes()
+    if early_stop is None:
+        early_stop = early_stop_enabled()
+
+    response = session.get(url, timeout=timeout, stream=True)
+    if response.status_code >= 400:
+        response.close()
+        return FetchedPage(response, b"", 0, 'complete')
+
+    markers = _marker_pattern(site_type) if early_stop else None
+    buffer = bytearray()
+    body_start = None
+    scan_from = 0
+    last_marker_end = None
+    stop_reason = 'complete'
+
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buffer += chunk
+            if max_bytes and len(buffer) > max_bytes:
+                del buffer[max_bytes:]
+                stop_reason = 'max_bytes'
+                break
+
+            # Re-scan a small overlap so markers split across chunks are found
+            window_start = max(0, scan_from - 256)
+            scan_from = len(buffer)
+            if not early_stop:
+                continue
+
+            if _DOCUMENT_END.search(buffer, window_start):
+                stop_reason = 'document_end'
+                break
+
+            if markers is None:
+                continue
+            if body_start is None:
+                match = _BODY_START.search(buffer, window_start)
+                if not match:
+                    continue
+                body_start = match.start()
+                window_start = body_start
+            for match in markers.finditer(buffer, max(window_start, body_start)):
+                last_marker_end = match.end()
+            if last_marker_end is not None and len(buffer) - last_marker_end >= section_tail_bytes:
+                stop_reason = 'sections'
+                break
+    finally:
+        response.close()
+
+    return FetchedPage(response, bytes(buffer), len(buffer), stop_reason)
+
+
+def fetch_with_requests(url, site_type="other", timeout=15, headers=None, **kwargs):
+    """One-off streaming fetch without a shared session"""
+    import requests
+    with requests.Session() as session:
+        session.headers.update(headers or recipe_extraction.REQUEST_HEADERS)
+        return fetch_page(session, url, site_type, timeout, **kwargs)
+
+
+class Http2Session:
+    """A requests.Session stand-in for fetch_page backed by an httpx HTTP/2 client
+
+    Requests to one host share a single connection and run as concurrent
+    streams on it, instead of taking one pooled HTTP/1.1 connection each.
+    Headers and per-request timeouts behave as with requests, and redirects
+    are followed the same way.
+    """
+
+    def __init__(self, headers=None, max_connections=10, mode='h2'):
+        import httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # h2c drops HTTP/1.1 so plain-http origins are spoken to in HTTP/2 straight away
+        self.client = httpx.Client(http1=mode != 'h2c', http2=True, follow_redirects=True, limits=limits)
+        self.headers = self.client.headers
+        self.headers.update(headers or recipe_extraction.REQUEST_HEADERS)
+
+    def get(self, url, timeout=None, stream=False):
+        response = self.client.send(self.client.build_request('GET', url, timeout=timeout), stream=True)
+        if not stream:
+            response.read()
+        return _Http2Response(response)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Http2Response:
+    """The parts of requests.Response that fetch_page and FetchedPage use"""
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = None
+        self._complete = response.is_closed  # a non-streamed response is read in full already
+        self.url = str(response.url)
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.encoding = response.charset_encoding
+        self.http_version = response.http_version
+
+    def iter_content(self, chunk_size):
+        # Held here so dropping the caller's iterator part-way does not close the stream before close() resets it
+        self._chunks = self._response.iter_bytes(chunk_size)
+        return self._track_completion(self._chunks)
+
+    def _track_completion(self, chunks):
+        for chunk in chunks:
+            yield chunk
+        self._complete = True
+
+    def close(self):
+        if not self._complete:
+            self._reset_stream()
+        self._response.close()
+
+    def _reset_stream(self):
+        """Cancel an HTTP/2 stream closed part-way, so the server stops sending the rest of its body
+
+        httpcore just forgets such a stream: the rest of the body would still
+        arrive, unacknowledged, and use up the connection's flow-control window
+        until every stream on it stalls. A reset stops the transfer, and h2
+        acknowledges anything already in flight when it lands on the closed
+        stream. Body data other streams' reads queued for this one is
+        acknowledged here. HTTP/1.1 responses close their connection instead.
+        """
+        import h2.errors
+        import h2.events
+        import h2.exceptions
+        stream = getattr(getattr(self._response.stream, '_stream', None), '_httpcore_stream', None)
+        stream = getattr(stream, '_stream', None)
+        connection = getattr(stream, '_connection', None)
+        if connection is None or not hasattr(connection, '_h2_state'):
+            return
+        stream_id = stream._stream_id
+        try:
+            # The read lock keeps other streams' reads from queueing more of this body meanwhile
+            with connection._read_lock:
+                try:
+                    connection._h2_state.reset_stream(stream_id, error_code=h2.errors.ErrorCodes.CANCEL)
+                except h2.exceptions.StreamClosedError:
+                    pass  # the whole body has arrived already
+                queued = connection._events.get(stream_id, [])
+                for event in queued:
+                    if isinstance(event, h2.events.DataReceived):
+                        connection._h2_state.acknowledge_received_data(event.flow_controlled_length, stream_id)
+                del queued[:]
+            connection._write_outgoing_data(stream._request)
+        except Exception:
+            pass  # a broken connection is dropped by the pool
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
@@ -0,0 +1,234 @@
+import html
+import json
+import re
+
+import text_normalize
+
+# Website types with dedicated extractors ("other" uses the generic fallback only)
+SITE_TYPES = ["allrecipes", "foodnetwork", "epicurious", "bbcgoodfood", "simplyrecipes", "seriouseats", "other"]
+
+# Browser-like headers to avoid being blocked
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
+}
+
+# CSS classes of the sections each site extractor reads (keep in sync with the
+# selectors in extract_enhancements); used by the streaming fetch to stop early
+SECTION_MARKERS = {
+    "allrecipes": ["recipe-tips", "tips-section", "recipeNote", "recipe__tips", "recipe-note",
+                   "recipe-review-body", "feedback__content", "review-content"],
+    "foodnetwork": ["o-RecipeTips", "o-Notes", "recipe-tips-list", "recipe-footnotes"],
+    "epicurious": ["recipe-note", "cook-notes", "tip-content", "community-tips"],
+    "bbcgoodfood": ["recipe__tips", "recipe-tips", "recipe-method__item", "tip-content"],
+    "simplyrecipes": ["recipe-note", "section--tips", "section--notes", "recipe-method__tip"],
+    "seriouseats": ["recipe-note", "recipe-notes", "recipe-tips", "note-block", "note-text"],
+}
+
+
+def detect_site_type(url):
+    """Detect the website type from a recipe URL"""
+    url = url.lower()
+    for site in SITE_TYPES:
+        if site in url:
+            return site
+    return "other"
+
+
+# Extraction paths reported per page: structured data, site selectors, generic fallback
+EXTRACTION_PATHS = ("jsonld", "site", "generic")
+
+# schema.org Recipe fields (standard and common plugin extensions) that hold tips or notes
+JSONLD_TIP_KEYS = ("recipeNotes", "notes", "recipeTips", "tips", "cookingTips", "chefNotes")
+
+_JSONLD_BLOCK = re.compile(
+    rb'<script[^>]*type\s*=\s*["\']application/ld\+json["\'][^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+_HTML_BLOCK_TAG = re.compile(r'<\s*/?\s*(?:p|li|br|div|ul|ol|h[1-6])\b[^>]*>', re.IGNORECASE)
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+
+def extract_from_html(content, site_type, parser="html.parser"):
+    """Parse a page and extract enhancements, falling back to generic extraction"""
+    return extract_page(content, site_type, parser)[0]
+
+
+def extract_page(content, site_type, parser="html.parser"):
+    """Extract enhancements from a raw page, trying JSON-LD before parsing the DOM
+
+    Returns (enhancements, path) where path is one of EXTRACTION_PATHS.
+    """
+    enhancements = extract_jsonld_enhancements(content)
+    if enhancements:
+        return enhancements, "jsonld"
+
+    from bs4 import BeautifulSoup  # deferred: bs4 is slow to import and not needed for JSON-LD pages
+    soup = BeautifulSoup(content, parser)
+    enhancements = extract_enhancements(soup, site_type)
+    if enhancements:
+        return enhancements, "site"
+    return extract_generic_enhancements(soup), "generic"
+
+
+def extract_jsonld_enhancements(content):
+    """Pull tips and notes from schema.org Recipe JSON-LD blocks without parsing the DOM"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    enhancements = []
+    for match in _JSONLD_BLOCK.finditer(content):
+        try:
+            data = json.loads(match.group(1).decode('utf-8', errors='replace'))
+        except ValueError:
+            continue
+        for recipe in _jsonld_recipes(data):
+            for key in JSONLD_TIP_KEYS:
+                enhancements.extend(_jsonld_texts(recipe.get(key)))
+            enhancements.extend(_jsonld_howto_tips(recipe.get('recipeInstructions')))
+
+    return process_enhancements(enhancements)
+
+
+def _jsonld_recipes(data):
+    """Yield every Recipe object in a JSON-LD document (top level, lists or @graph)"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _jsonld_recipes(item)
+    elif isinstance(data, dict):
+        types = data.get('@type')
+        if types == 'Recipe' or (isinstance(types, list) and 'Recipe' in types):
+            yield data
+        if '@graph' in data:
+            yield from _jsonld_recipes(data['@graph'])
+
+
+def _jsonld_howto_tips(instructions):
+    """Yield the text of HowToTip entries, including those nested in HowToSections"""
+    if isinstance(instructions, list):
+        for item in instructions:
+            yield from _jsonld_howto_tips(item)
+    elif isinstance(instructions, dict):
+        if instructions.get('@type') == 'HowToTip':
+            yield from _jsonld_texts(instructions.get('text'))
+        yield from _jsonld_howto_tips(instructions.get('itemListElement'))
+
+
+def _jsonld_texts(value):
+    """Flatten a JSON-LD text field (string, list or objects with text) into plain strings"""
+    if isinstance(value, str):
+        text = html.unescape(_HTML_TAG.sub('', _HTML_BLOCK_TAG.sub('\n', value)))
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                yield line
+    elif isinstance(value, list):
+        for item in value:
+            yield from _jsonld_texts(item)
+    elif isinstance(value, dict):
+        yield from _jsonld_texts(value.get('text') or value.get('description'))
+
+
+def extract_enhancements(soup, site_type):
+    """Extract enhancements based on the website type"""
+    enhancements = []
+    
+    if site_type == "allrecipes":
+        # Look for tips, notes, and chef notes sections
+        tip_sections = soup.select(".recipe-tips, .tips-section, .recipeNote, .recipe__tips, .recipe-note")
+        for section in tip_sections:
+            tips = section.find_all(['p', 'li'])
+            for tip in tips:
+                text = tip.get_text(strip=True)
+                if text and len(text) > 15:  # Minimum length to be considered a tip
+                    enhancements.append(text)
+        
+        # Look for comments with tips
+        comments = soup.select(".recipe-review-body, .feedback__content, .review-content")
+        for comment in comments:
+            text = comment.get_text(strip=True)
+            if any(keyword in text.lower() for keyword in ['tip', 'suggest', 'recommend', 'better', 'improve', 'enhance', 'try', 'substitute']):
+                if text and len(text) > 20:  # Longer minimum for comments
+                    enhancements.append(text)
+    
+    elif site_type == "foodnetwork":
+        # Food Network typically has tips in specific sections
+        tip_sections = soup.select(".o-RecipeTips, .o-Notes, .recipe-tips-list, .recipe-footnotes")
+        for section in tip_sections:
+            tips = section.find_all(['p', 'li'])
+            for tip in tips:
+                text = tip.get_text(strip=True)
+                if text and len(text) > 15:
+                    enhancements.append(text)
+    
+    elif site_type == "epicurious":
+        # Epicurious has cook's notes and community tips
+        notes = soup.select(".recipe-note, .cook-notes, .tip-content, .community-tips")
+        for note in notes:
+            text = note.get_text(strip=True)
+            if text and len(text) > 15:
+                enhancements.append(text)
+    
+    elif site_type == "bbcgoodfood":
+        # BBC Good Food has tips and methods
+        tips = soup.select(".recipe__tips, .recipe-tips, .recipe-method__item, .tip-content")
+        for tip in tips:
+            text = tip.get_text(strip=True)
+            if text and len(text) > 15:
+                enhancements.append(text)
+    
+    elif site_type == "simplyrecipes":
+        # Simply Recipes has tips and notes
+        tips = soup.select(".recipe-note, .section--tips, .section--notes, .recipe-method__tip")
+        for tip in tips:
+            text = tip.get_text(strip=True)
+            if text and len(text) > 15:
+                enhancements.append(text)
+    
+    elif site_type == "seriouseats":
+        # Serious Eats has notes and tips
+        tips = soup.select(".recipe-note, .recipe-notes, .recipe-tips, .note-block, .note-text")
+        for tip in tips:
+            text = tip.get_text(strip=True)
+            if text and len(text) > 15:
+                enhancements.append(text)
+    
+    # Process and clean up the enhancements
+    return process_enhancements(enhancements)
+
+
+def extract_generic_enhancements(soup):
+    """Generic extraction for any website"""
+    enhancements = []
+    
+    # Look for common tip keywords in paragraphs
+    tip_keywords = ['tip', 'hint', 'note', 'suggestion', 'recommend', 'try', 'substitute', 'alternative', 'variation', 'improve']
+    
+    # Search in paragraphs
+    paragraphs = soup.find_all('p')
+    for p in paragraphs:
+        text = p.get_text(strip=True)
+        if any(keyword in text.lower() for keyword in tip_keywords) and len(text) > 20:
+            enhancements.append(text)
+    
+    # Search in list items
+    list_items = soup.find_all('li')
+    for li in list_items:
+        text = li.get_text(strip=True)
+        if any(keyword in text.lower() for keyword in tip_keywords) and len(text) > 15:
+            enhancements.append(text)
+    
+    # Look for sections that might contain tips
+    potential_tip_sections = soup.select('div[class*=tip], div[class*=note], div[class*=hint], section[class*=tip], section[class*=note]')
+    for section in potential_tip_sections:
+        text = section.get_text(strip=True)
+        if text and len(text) > 20:
+            enhancements.append(text)
+    
+    # Process and clean up the enhancements
+    return process_enhancements(enhancements)
+
+
+def process_enhancements(enhancements):
+    """Process and clean up the enhancement texts (whitespace, short texts, duplicates)"""
+    return text_normalize.unique_texts(enhancements)
@@ -1,17 +1,29 @@
+import time
+_process_start = time.perf_counter()  # reference point for time-to-interactive
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-import requests
-from bs4 import BeautifulSoup
+import contextlib
 import json
 import os
-import re
-import time
-import random
+import sys
 from datetime import datetime
-import supabase
 from dotenv import load_dotenv
-import asyncio
 import threading
+from scraper_metrics import MetricsRegistry
+from scraper_profiling import configure_from_argv, profile_run
+import recipe_extraction
+import page_fetch
+from batch_engine import BatchScraper, load_recipes
+import staging_store
+import recrawl_scheduler
+import enhancement_cleaning
+import change_feed
+import enhancement_bundles
+import enhancement_search
+import text_normalize
+from ui_tasks import TaskRunner
+from text_views import BoundedLogView, PagedTextView, row_offsets
 
 # Load environment variables
 load_dotenv()
@@ -29,14 +41,13 @@ class RecipeScraperApp:
         self.root.geometry("900x700")
         self.root.configure(bg='#f5f5f5')
         
-        # Initialize Supabase client if environment variables are available
+        # Long operations run on a shared pool; results come back through the Tk loop
+        self.tasks = TaskRunner(root)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Supabase client is created by a background check after the window is up
         self.supabase_client = None
-        if supabase_url and supabase_key:
-            try:
-                self.supabase_client = supabase.create_client(supabase_url, supabase_key)
-                print("Supabase client initialized successfully")
-            except Exception as e:
-                print(f"Error initializing Supabase client: {e}")
+        self._supabase_job = None
         
         # Recipe ID input
         self.recipe_id_frame = ttk.Frame(root)
@@ -72,7 +83,7 @@ class RecipeScraperApp:
         self.site_label.pack(side='left', padx=5)
         
         self.site_var = tk.StringVar(value="allrecipes")
-        self.sites = ["allrecipes", "foodnetwork", "epicurious", "bbcgoodfood", "simplyrecipes", "seriouseats", "other"]
+        self.sites = list(recipe_extraction.SITE_TYPES)
         
         for site in self.sites:
             site_radio = ttk.Radiobutton(
@@ -98,6 +109,11 @@ class RecipeScraperApp:
         
         self.batch_button = ttk.Button(self.button_frame, text="Batch Scrape from File", command=self.batch_scrape)
         self.batch_button.pack(side='left', padx=5)
+
+        # Batch cleaning is opt-in; PANTRYPAL_CLEAN_WORKERS sets the starting state and the pool size
+        self.batch_clean_var = tk.BooleanVar(value=enhancement_cleaning.clean_workers() is not None)
+        self.batch_clean_check = ttk.Checkbutton(self.button_frame, text="Clean batch results", variable=self.batch_clean_var)
+        self.batch_clean_check.pack(side='left', padx=5)
         
         self.save_db_button = ttk.Button(self.button_frame, text="Save to Database", command=self.save_to_database)
         self.save_db_button.pack(side='left', padx=5)
@@ -111,6 +127,9 @@ class RecipeScraperApp:
         self.clear_button = ttk.Button(self.button_frame, text="Clear", command=self.clear_results)
         self.clear_button.pack(side='left', padx=5)
         
+        self.cancel_button = ttk.Button(self.button_frame, text="Cancel", command=self.cancel_tasks)
+        self.cancel_button.pack(side='left', padx=5)
+        
         # Tabs for different sections
         self.tabs = ttk.Notebook(root)
         self.tabs.pack(fill='both', expand=True, padx=20, pady=10)
@@ -138,8 +157,9 @@ class RecipeScraperApp:
         self.html_label = ttk.Label(self.html_frame, text="Raw HTML:")
         self.html_label.pack(anchor='w', pady=5)
         
-        self.html_text = scrolledtext.ScrolledText(self.html_frame, width=80, height=15)
-        self.html_text.pack(fill='both', expand=True)
+        # Only the rows on screen are rendered, however large the page is
+        self.html_view = PagedTextView(self.html_frame, width=80, height=15)
+        self.html_view.pack(fill='both', expand=True)
         
         # Tab for log
         self.log_tab = ttk.Frame(self.tabs)
@@ -154,6 +174,9 @@ class RecipeScraperApp:
         self.log_text = scrolledtext.ScrolledText(self.log_frame, width=80, height=15)
         self.log_text.pack(fill='both', expand=True)
         
+        # Keep the last PANTRYPAL_LOG_LINES lines on screen; everything goes to the log file
+        self.log_view = BoundedLogView(self.log_text, 'recipe_scraper')
+        
         # Status bar
         self.status_bar = ttk.Label(root, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
@@ -163,42 +186,101 @@ class RecipeScraperApp:
         self.current_recipe_id = ""
         self.current_recipe_title = ""
         self.scraped_enhancements = []
-        self.html_content = ""
+        
+        # Session-wide timing and throughput metrics
+        self.metrics = MetricsRegistry()
+        
+        # Where profile artefacts go when profiling is enabled
+        self.last_results_dir = None
         
         # Log startup
         self.log("Application started")
-        self.check_supabase_connection()
+        self.start_supabase_check()
+        self.root.after_idle(self._report_startup_time)
+
+    def _report_startup_time(self):
+        """Log how long it took from process start until the window was interactive"""
+        elapsed = time.perf_counter() - _process_start
+        self.metrics.set_gauge('startup_seconds', round(elapsed, 4))
+        self.log(f"Ready in {elapsed * 1000:.0f} ms")
+
+    def start_supabase_check(self):
+        """Create the Supabase client and check the connection without blocking the UI"""
+        self.status_bar.config(text="Connecting to Supabase...")
+        self._supabase_job = self.tasks.submit('supabase_check', lambda job: self.check_supabase_connection())
+
+    def get_supabase_client(self, timeout=15):
+        """Return the Supabase client, waiting for the startup check if it is still running
+
+        Only call this from a task: waiting on the UI thread would freeze the window.
+        """
+        if self._supabase_job and self._supabase_job.running:
+            self.update_status("Waiting for Supabase connection...")
+            try:
+                self._supabase_job.future.result(timeout)
+            except Exception:
+                pass
+        return self.supabase_client
 
     def check_supabase_connection(self):
-        """Check if Supabase connection is available"""
-        if self.supabase_client:
-            try:
-                # Try a simple query to check connection
-                self.supabase_client.table('scraped_enhancements').select('id').limit(1).execute()
-                self.log("Supabase connection successful")
-                self.status_bar.config(text="Connected to Supabase")
-                return True
-            except Exception as e:
-                self.log(f"Supabase connection error: {str(e)}")
-                self.status_bar.config(text="Not connected to Supabase")
-                return False
-        else:
-            self.log("Supabase client not initialized")
-            self.status_bar.config(text="Supabase not configured")
+        """Check if Supabase connection is available (runs on the task pool)"""
+        def report(message, status):
+            self.log(message)
+            self.update_status(status)
+
+        if not (supabase_url and supabase_key):
+            report("Supabase client not initialized", "Supabase not configured")
+            return False
+
+        try:
+            # Imported on first use: the supabase package takes a while to load
+            import supabase
+            start = time.perf_counter()
+            client = supabase.create_client(supabase_url, supabase_key)
+            
+            # Try a simple query to check connection
+            client.table('scraped_enhancements').select('id').limit(1).execute()
+            self.metrics.observe('stage_seconds', time.perf_counter() - start, stage='supabase_connect')
+            self.supabase_client = client
+            report("Supabase connection successful", "Connected to Supabase")
+            return True
+        except Exception as e:
+            report(f"Supabase connection error: {str(e)}", "Not connected to Supabase")
             return False
     
+    def on_close(self):
+        """Cancel background jobs and close the window"""
+        self.tasks.shutdown()
+        self.root.destroy()
+    
+    def cancel_tasks(self):
+        """Ask every running background job to stop"""
+        running = self.tasks.cancel_all()
+        if running:
+            self.log(f"Cancelling {running} running job(s)...")
+            self.update_status("Cancelling...")
+        else:
+            self.update_status("Nothing to cancel")
+    
+    def _on_ui_thread(self):
+        return threading.current_thread() is threading.main_thread()
+    
     def log(self, message):
-        """Add a message to the log with timestamp"""
+        """Add a message to the log with timestamp (safe to call from any thread)"""
+        if not self._on_ui_thread():
+            self.tasks.post(self.log, message)
+            return
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
-        self.log_text.insert(tk.END, log_entry + "\n")
-        self.log_text.see(tk.END)  # Scroll to the end
+        self.log_view.append(log_entry)
         print(log_entry)  # Also print to console
     
     def update_status(self, message):
-        """Update the status bar"""
+        """Update the status bar (safe to call from any thread)"""
+        if not self._on_ui_thread():
+            self.tasks.post(self.update_status, message)
+            return
         self.status_bar.config(text=message)
-        self.root.update_idletasks()
     
     def scrape_enhancements(self):
         """Scrape recipe enhancements from the given URL"""
@@ -227,168 +309,67 @@ class RecipeScraperApp:
         self.log(f"Scraping enhancements from {url} for recipe {recipe_id}: {recipe_title}")
         self.update_status(f"Scraping {site_type}...")
         
-        try:
-            # Add random user agent to avoid being blocked
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            self.html_content = response.text
-            self.html_text.delete(1.0, tk.END)
-            self.html_text.insert(tk.END, self.html_content)
-            
-            soup = BeautifulSoup(response.content, "html.parser")
-            
-            # Extract enhancements based on the site type
-            enhancements = self.extract_enhancements(soup, site_type)
-            
-            if not enhancements:
-                self.log("No enhancements found. Trying generic extraction methods.")
-                enhancements = self.extract_generic_enhancements(soup)
-            
-            if enhancements:
-                self.scraped_enhancements = enhancements
-                self.display_enhancements(enhancements)
-                self.log(f"Successfully scraped {len(enhancements)} enhancements")
-                self.update_status(f"Found {len(enhancements)} enhancements")
-            else:
-                self.log("No enhancements found")
-                self.update_status("No enhancements found")
-                messagebox.showinfo("Info", "No recipe enhancements found. Try a different URL or website type.")
+        self.tasks.submit('scrape', self._scrape_page, url, site_type,
+                          on_done=self._on_scrape_done, on_error=self._on_scrape_error)
+    
+    def _scrape_page(self, job, url, site_type):
+        """Fetch and extract one page (runs on the task pool)"""
+        # Stream the page with browser-like headers, within the page size budget
+        page = page_fetch.fetch_with_requests(url, site_type, timeout=10)
+        page.raise_for_status()
+        job.raise_if_cancelled()
+        
+        # Try structured data first, then the site selectors, then generic extraction
+        enhancements, path = recipe_extraction.extract_page(page.content, site_type)
+        html = page.text
+        page.release()  # the HTML view keeps the decoded text; drop the raw body
+        return page, html, row_offsets(html), enhancements, path
+    
+    def _on_scrape_done(self, outcome):
+        """Show the result of a single-page scrape"""
+        page, html, html_rows, enhancements, path = outcome
+        if page.truncated:
+            self.log(f"Page cut at {page.bytes_read} bytes (max page size); extraction may be incomplete")
+        
+        self.html_view.set_text(html, html_rows)
+        
+        if path == "generic":
+            self.log("No enhancements found. Trying generic extraction methods.")
+        self.log(f"Extraction path: {path}")
         
-        except requests.RequestException as e:
+        if enhancements:
+            self.scraped_enhancements = enhancements
+            self.display_enhancements(enhancements)
+            self.log(f"Successfully scraped {len(enhancements)} enhancements")
+            self.update_status(f"Found {len(enhancements)} enhancements")
+        else:
+            self.log("No enhancements found")
+            self.update_status("No enhancements found")
+            messagebox.showinfo("Info", "No recipe enhancements found. Try a different URL or website type.")
+    
+    def _on_scrape_error(self, e):
+        """Report a failed single-page scrape"""
+        import requests  # already loaded by the fetch
+        if isinstance(e, requests.RequestException):
             error_msg = f"Network Error: {str(e)}"
-            self.log(error_msg)
             self.update_status("Error: Network issue")
-            messagebox.showerror("Error", error_msg)
-        
-        except Exception as e:
+        else:
             error_msg = f"Scraping Error: {str(e)}"
-            self.log(error_msg)
             self.update_status("Error: Scraping failed")
-            messagebox.showerror("Error", error_msg)
+        self.log(error_msg)
+        messagebox.showerror("Error", error_msg)
     
     def extract_enhancements(self, soup, site_type):
         """Extract enhancements based on the website type"""
-        enhancements = []
-        
-        if site_type == "allrecipes":
-            # Look for tips, notes, and chef notes sections
-            tip_sections = soup.select(".recipe-tips, .tips-section, .recipeNote, .recipe__tips, .recipe-note")
-            for section in tip_sections:
-                tips = section.find_all(['p', 'li'])
-                for tip in tips:
-                    text = tip.get_text(strip=True)
-                    if text and len(text) > 15:  # Minimum length to be considered a tip
-                        enhancements.append(text)
-            
-            # Look for comments with tips
-            comments = soup.select(".recipe-review-body, .feedback__content, .review-content")
-            for comment in comments:
-                text = comment.get_text(strip=True)
-                if any(keyword in text.lower() for keyword in ['tip', 'suggest', 'recommend', 'better', 'improve', 'enhance', 'try', 'substitute']):
-                    if text and len(text) > 20:  # Longer minimum for comments
-                        enhancements.append(text)
-        
-        elif site_type == "foodnetwork":
-            # Food Network typically has tips in specific sections
-            tip_sections = soup.select(".o-RecipeTips, .o-Notes, .recipe-tips-list, .recipe-footnotes")
-            for section in tip_sections:
-                tips = section.find_all(['p', 'li'])
-                for tip in tips:
-                    text = tip.get_text(strip=True)
-                    if text and len(text) > 15:
-                        enhancements.append(text)
-        
-        elif site_type == "epicurious":
-            # Epicurious has cook's notes and community tips
-            notes = soup.select(".recipe-note, .cook-notes, .tip-content, .community-tips")
-            for note in notes:
-                text = note.get_text(strip=True)
-                if text and len(text) > 15:
-                    enhancements.append(text)
-        
-        elif site_type == "bbcgoodfood":
-            # BBC Good Food has tips and methods
-            tips = soup.select(".recipe__tips, .recipe-tips, .recipe-method__item, .tip-content")
-            for tip in tips:
-                text = tip.get_text(strip=True)
-                if text and len(text) > 15:
-                    enhancements.append(text)
-        
-        elif site_type == "simplyrecipes":
-            # Simply Recipes has tips and notes
-            tips = soup.select(".recipe-note, .section--tips, .section--notes, .recipe-method__tip")
-            for tip in tips:
-                text = tip.get_text(strip=True)
-                if text and len(text) > 15:
-                    enhancements.append(text)
-        
-        elif site_type == "seriouseats":
-            # Serious Eats has notes and tips
-            tips = soup.select(".recipe-note, .recipe-notes, .recipe-tips, .note-block, .note-text")
-            for tip in tips:
-                text = tip.get_text(strip=True)
-                if text and len(text) > 15:
-                    enhancements.append(text)
-        
-        # Process and clean up the enhancements
-        return self.process_enhancements(enhancements)
+        return recipe_extraction.extract_enhancements(soup, site_type)
     
     def extract_generic_enhancements(self, soup):
         """Generic extraction for any website"""
-        enhancements = []
-        
-        # Look for common tip keywords in paragraphs
-        tip_keywords = ['tip', 'hint', 'note', 'suggestion', 'recommend', 'try', 'substitute', 'alternative', 'variation', 'improve']
-        
-        # Search in paragraphs
-        paragraphs = soup.find_all('p')
-        for p in paragraphs:
-            text = p.get_text(strip=True)
-            if any(keyword in text.lower() for keyword in tip_keywords) and len(text) > 20:
-                enhancements.append(text)
-        
-        # Search in list items
-        list_items = soup.find_all('li')
-        for li in list_items:
-            text = li.get_text(strip=True)
-            if any(keyword in text.lower() for keyword in tip_keywords) and len(text) > 15:
-                enhancements.append(text)
-        
-        # Look for sections that might contain tips
-        potential_tip_sections = soup.select('div[class*=tip], div[class*=note], div[class*=hint], section[class*=tip], section[class*=note]')
-        for section in potential_tip_sections:
-            text = section.get_text(strip=True)
-            if text and len(text) > 20:
-                enhancements.append(text)
-        
-        # Process and clean up the enhancements
-        return self.process_enhancements(enhancements)
+        return recipe_extraction.extract_generic_enhancements(soup)
     
     def process_enhancements(self, enhancements):
         """Process and clean up the enhancement texts"""
-        processed = []
-        seen = set()  # To avoid duplicates
-        
-        for text in enhancements:
-            # Clean up the text
-            text = re.sub(r'\s+', ' ', text)  # Replace multiple spaces with a single space
-            text = text.strip()
-            
-            # Skip if too short or already seen
-            if len(text) < 15 or text.lower() in seen:
-                continue
-            
-            # Add to processed list and mark as seen
-            processed.append(text)
-            seen.add(text.lower())
-        
-        return processed
+        return recipe_extraction.process_enhancements(enhancements)
     
     def display_enhancements(self, enhancements):
         """Display the enhancements in the text area"""
@@ -407,38 +388,56 @@ class RecipeScraperApp:
             messagebox.showerror("Error", "No enhancements to save.")
             return
         
-        if not self.supabase_client:
-            messagebox.showerror("Error", "Supabase client not initialized. Check your environment variables.")
-            return
-        
         try:
             recipe_id = int(self.current_recipe_id)
-            
-            # Prepare the data
-            data = {
-                'recipe_id': str(recipe_id),
-                'enhancements': self.scraped_enhancements,
-                'source': self.current_url
-            }
-            
-            # Insert or update the record
-            self.log(f"Saving enhancements to database for recipe ID: {recipe_id}")
-            result = self.supabase_client.table('scraped_enhancements').upsert(data).execute()
-            
-            if result.data:
-                self.log(f"Successfully saved to database: {len(self.scraped_enhancements)} enhancements")
-                messagebox.showinfo("Success", f"Saved {len(self.scraped_enhancements)} enhancements to database.")
-            else:
-                self.log("Database operation completed but no data returned")
-                messagebox.showinfo("Info", "Database operation completed.")
-        
         except ValueError:
             messagebox.showerror("Error", "Recipe ID must be a number.")
+            return
         
-        except Exception as e:
-            error_msg = f"Database Error: {str(e)}"
-            self.log(error_msg)
-            messagebox.showerror("Error", error_msg)
+        # Prepare the data
+        data = {
+            'recipe_id': str(recipe_id),
+            'enhancements': self.scraped_enhancements,
+            'source': self.current_url
+        }
+        
+        self.log(f"Saving enhancements to database for recipe ID: {recipe_id}")
+        self.update_status("Saving to database...")
+        self.tasks.submit('save_db', self._save_record, data,
+                          on_done=self._on_save_done, on_error=self._on_save_error)
+    
+    def _save_record(self, job, data):
+        """Upsert one scraped_enhancements row (runs on the task pool)"""
+        if not self.get_supabase_client():
+            raise RuntimeError("Supabase client not initialized. Check your environment variables.")
+        
+        try:
+            # Insert or update the record
+            with self.metrics.timer('supabase_upsert', table='scraped_enhancements'):
+                result = self.supabase_client.table('scraped_enhancements').upsert(data).execute()
+            self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='success')
+        except Exception:
+            self.metrics.inc('supabase_requests_total', table='scraped_enhancements', status='error')
+            raise
+        finally:
+            self.metrics.export_to_env_dir('scraper_metrics')
+        return len(data['enhancements']), bool(result.data)
+    
+    def _on_save_done(self, outcome):
+        count, returned = outcome
+        self.update_status("Saved to database")
+        if returned:
+            self.log(f"Successfully saved to database: {count} enhancements")
+            messagebox.showinfo("Success", f"Saved {count} enhancements to database.")
+        else:
+            self.log("Database operation completed but no data returned")
+            messagebox.showinfo("Info", "Database operation completed.")
+    
+    def _on_save_error(self, e):
+        error_msg = f"Database Error: {str(e)}"
+        self.log(error_msg)
+        self.update_status("Error: Database save failed")
+        messagebox.showerror("Error", error_msg)
     
     def save_to_file(self):
         """Save the scraped enhancements to a JSON file"""
@@ -479,171 +478,171 @@ class RecipeScraperApp:
             messagebox.showerror("Error", error_msg)
 
     def batch_scrape(self):
-        """Batch scrape enhancements from a list of URLs in a JSON file"""
+        """Batch scrape enhancements from a list of URLs in a JSON or JSONL file"""
+        if self.tasks.running_jobs('batch'):
+            messagebox.showinfo("Info", "A batch scrape is already running. Cancel it first to start another.")
+            return
+        
         try:
             # Ask for the input file
             file_path = filedialog.askopenfilename(
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-                title="Select a JSON file with recipe URLs"
+                filetypes=[("Recipe lists", "*.json *.jsonl"), ("JSON files", "*.json"), ("JSON Lines files", "*.jsonl"),
+                           ("All files", "*.*")],
+                title="Select a JSON or JSONL file with recipe URLs"
             )
             
             if not file_path:
                 return  # User cancelled
             
-            # Load the file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                recipes = json.load(f)
-            
-            if not isinstance(recipes, list):
-                messagebox.showerror("Error", "The JSON file must contain a list of recipe objects.")
-                return
+            # Load the file (a JSON list, or JSONL as written by sitemap discovery)
+            recipes = load_recipes(file_path)
             
             # Check if the file has the expected format
             if not all(isinstance(r, dict) and 'id' in r and 'title' in r and 'url' in r for r in recipes):
                 messagebox.showerror("Error", "Each recipe must have 'id', 'title', and 'url' fields.")
                 return
             
+            # With a recrawl budget, only the recipes most likely to have changed are scraped
+            scheduler = recrawl_scheduler.open_from_env()
+            selected = scheduler.select(recipes, recrawl_scheduler.recrawl_budget()) if scheduler else recipes
+            
             # Ask for confirmation
-            if not messagebox.askyesno("Confirm", f"Ready to scrape {len(recipes)} recipes. This may take a while. Continue?"):
+            if len(selected) < len(recipes):
+                prompt = f"Ready to recrawl {len(selected)} of {len(recipes)} recipes (most likely changed first). Continue?"
+            else:
+                prompt = f"Ready to scrape {len(recipes)} recipes. This may take a while. Continue?"
+            if not messagebox.askyesno("Confirm", prompt):
+                if scheduler:
+                    scheduler.close()
                 return
             
             # Create a results directory if it doesn't exist
             results_dir = os.path.join(os.path.dirname(file_path), "scraped_enhancements")
             os.makedirs(results_dir, exist_ok=True)
+            self.last_results_dir = results_dir
             
-            # Prepare results log
-            results_log = {
-                'total': len(recipes),
-                'successful': 0,
-                'failed': 0,
-                'recipes': []
-            }
-            
-            # Process each recipe
-            for i, recipe in enumerate(recipes, 1):
-                self.log(f"Processing recipe {i}/{len(recipes)}: {recipe['title']}")
-                self.update_status(f"Scraping {i}/{len(recipes)}")
-                
-                try:
-                    # Update the UI
-                    self.recipe_id_entry.delete(0, tk.END)
-                    self.recipe_id_entry.insert(0, recipe['id'])
-                    
-                    self.recipe_title_entry.delete(0, tk.END)
-                    self.recipe_title_entry.insert(0, recipe['title'])
-                    
-                    self.url_entry.delete(0, tk.END)
-                    self.url_entry.insert(0, recipe['url'])
-                    
-                    # Detect the site type from the URL
-                    url = recipe['url'].lower()
-                    site_type = "other"
-                    for s in self.sites:
-                        if s in url:
-                            site_type = s
-                            break
-                    
-                    self.site_var.set(site_type)
-                    self.root.update_idletasks()
-                    
-                    # Scrape the enhancements
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
-                    }
-                    
-                    response = requests.get(recipe['url'], headers=headers, timeout=15)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, "html.parser")
-                    
-                    # Extract enhancements
-                    enhancements = self.extract_enhancements(soup, site_type)
-                    if not enhancements:
-                        enhancements = self.extract_generic_enhancements(soup)
-                    
-                    # Save the results
-                    result = {
-                        'recipe_id': recipe['id'],
-                        'recipe_title': recipe['title'],
-                        'url': recipe['url'],
-                        'site_type': site_type,
-                        'enhancements': enhancements,
-                        'enhancement_count': len(enhancements),
-                        'scraped_at': datetime.now().isoformat()
-                    }
-                    
-                    # Save to file
-                    result_file = os.path.join(results_dir, f"{recipe['id']}_enhancements.json")
-                    with open(result_file, 'w', encoding='utf-8') as f:
-                        json.dump(result, f, indent=2, ensure_ascii=False)
-                    
-                    # Save to database if connected
-                    if self.supabase_client:
-                        db_data = {
-                            'recipe_id': str(recipe['id']),
-                            'enhancements': enhancements,
-                            'source': recipe['url']
-                        }
-                        self.supabase_client.table('scraped_enhancements').upsert(db_data).execute()
-                    
-                    # Update the log
-                    results_log['successful'] += 1
-                    results_log['recipes'].append({
-                        'id': recipe['id'],
-                        'title': recipe['title'],
-                        'status': 'success',
-                        'enhancement_count': len(enhancements)
-                    })
-                    
-                    # Display the current enhancements
-                    self.scraped_enhancements = enhancements
-                    self.display_enhancements(enhancements)
-                    
-                    # Add a small delay to avoid being blocked
-                    time.sleep(random.uniform(1.5, 3.0))
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    self.log(f"Error processing recipe {recipe['id']}: {error_msg}")
-                    
-                    # Update the log
-                    results_log['failed'] += 1
-                    results_log['recipes'].append({
-                        'id': recipe['id'],
-                        'title': recipe['title'],
-                        'status': 'failed',
-                        'error': error_msg
-                    })
-                    
-                    # Continue with the next recipe
-                    continue
-            
-            # Save the results log
-            log_file = os.path.join(results_dir, "batch_scrape_log.json")
-            with open(log_file, 'w', encoding='utf-8') as f:
-                json.dump(results_log, f, indent=2, ensure_ascii=False)
-            
-            # Show completion message
-            self.log(f"Batch scraping completed: {results_log['successful']} successful, {results_log['failed']} failed")
-            self.update_status("Batch scraping completed")
-            messagebox.showinfo("Batch Scraping Complete", 
-                               f"Processed {len(recipes)} recipes\n" +
-                               f"Successful: {results_log['successful']}\n" +
-                               f"Failed: {results_log['failed']}\n\n" +
-                               f"Results saved to {results_dir}")
+            # Run the batch through the shared engine on the task pool
+            self.update_status(f"Batch scraping {len(selected)} recipes...")
+            clean_workers = self._batch_clean_workers()
+            self.tasks.submit('batch', self._run_batch, selected, results_dir, scheduler, clean_workers,
+                              on_done=self._on_batch_done, on_error=self._on_batch_error)
             
         except Exception as e:
             error_msg = f"Batch Scraping Error: {str(e)}"
             self.log(error_msg)
             messagebox.showerror("Error", error_msg)
     
+    def _batch_clean_workers(self):
+        """The cleaning stage for a batch: off unless the checkbox is ticked, then PANTRYPAL_CLEAN_WORKERS or auto"""
+        if not self.batch_clean_var.get():
+            return 'off'
+        workers = enhancement_cleaning.clean_workers()
+        return 'auto' if workers is None else workers
+
+    def _run_batch(self, job, recipes, results_dir, scheduler=None, clean_workers='off'):
+        """Run a batch on the task pool, mirroring progress in the UI through coalesced updates"""
+        # With PANTRYPAL_STAGING_DB set, results go to the staging database instead of per-recipe files
+        store = staging_store.open_from_env()
+        # With PANTRYPAL_CHANGE_STATE set, the run also writes a feed of what changed since the last one
+        feed = change_feed.open_from_env()
+        engine = BatchScraper(
+            results_dir,
+            supabase_client=self.get_supabase_client(),
+            staging_store=store,
+            scheduler=scheduler,
+            change_feed=feed,
+            clean_workers=clean_workers,
+            on_log=self.log,
+            on_recipe_start=lambda *args: job.progress(self._on_batch_recipe_start, *args),
+            on_recipe_done=lambda *args: job.progress(self._on_batch_recipe_done, *args),
+            should_stop=lambda: job.cancelled
+        )
+        try:
+            results_log = engine.run(recipes)
+            # With PANTRYPAL_BUNDLE_DIR / PANTRYPAL_SEARCH_INDEX set, refresh the web app's static bundles
+            # and the local search index for the recipes just scraped (only the changed ones with a change feed)
+            bundles = enhancement_bundles.open_from_env()
+            index = enhancement_search.open_from_env()
+            if (bundles or index) and feed:
+                try:
+                    with index or contextlib.nullcontext():
+                        summary = change_feed.apply(change_feed.read_feed([results_log['change_feed']]), bundles, index)
+                except Exception:
+                    # The state has moved on, but the feed still holds every change: replay it once fixed
+                    self.log(f"Applying the change feed failed; replay it with: "
+                             f"python scripts/scrapper/change_feed.py apply {results_log['change_feed']}")
+                    raise
+                self.log(f"Bundles and search index: {summary['updated']} changed recipes applied, {summary['removed']} removed")
+            elif (bundles or index) and results_log['successful']:
+                results = list(enhancement_bundles.batch_results(results_log, results_dir, store))
+                if bundles:
+                    summary = bundles.update(results)
+                    self.log(f"Bundles: {summary['written']} shards rewritten, {summary['unchanged']} unchanged ({bundles.out_dir})")
+                if index:
+                    with index:
+                        indexed, unchanged = index.add_many(results)
+                    self.log(f"Search index: {indexed} recipes indexed, {unchanged} unchanged ({index.path})")
+            elif index:
+                index.close()
+        finally:
+            if store:
+                store.close()
+            if scheduler:
+                scheduler.close()
+            if feed:
+                feed.close()
+        return engine, results_log, store.path if store else results_dir
+    
+    def _on_batch_done(self, outcome):
+        engine, results_log, results_dir = outcome
+        
+        # Fold the run metrics into the session totals
+        self.metrics.merge(engine.metrics)
+        self.metrics.export_to_env_dir('scraper_metrics')
+        
+        # Show completion message
+        cancelled = results_log['cancelled']
+        self.log(f"Batch scraping {'cancelled' if cancelled else 'completed'}: "
+                 f"{results_log['successful']} successful, {results_log['failed']} failed, {cancelled} cancelled")
+        self.update_status("Batch scraping cancelled" if cancelled else "Batch scraping completed")
+        messagebox.showinfo("Batch Scraping Complete", 
+                           f"Processed {results_log['total'] - cancelled} of {results_log['total']} recipes\n" +
+                           f"Successful: {results_log['successful']}\n" +
+                           f"Failed: {results_log['failed']}\n\n" +
+                           f"Results saved to {results_dir}")
+    
+    def _on_batch_error(self, e):
+        error_msg = f"Batch Scraping Error: {str(e)}"
+        self.log(error_msg)
+        self.update_status("Batch scraping failed")
+        messagebox.showerror("Error", error_msg)
+    
+    def _on_batch_recipe_start(self, index, total, recipe, site_type):
+        """Show the recipe being scraped in the input fields"""
+        self.update_status(f"Scraping {index}/{total}")
+        
+        self.recipe_id_entry.delete(0, tk.END)
+        self.recipe_id_entry.insert(0, recipe['id'])
+        
+        self.recipe_title_entry.delete(0, tk.END)
+        self.recipe_title_entry.insert(0, recipe['title'])
+        
+        self.url_entry.delete(0, tk.END)
+        self.url_entry.insert(0, recipe['url'])
+        
+        self.site_var.set(site_type)
+    
+    def _on_batch_recipe_done(self, index, total, recipe, enhancements):
+        """Display the enhancements of the recipe that just finished"""
+        if enhancements is not None:
+            self.scraped_enhancements = enhancements
+            self.display_enhancements(enhancements)
+    
     def clear_results(self):
         """Clear all result fields"""
         self.enhancements_text.delete(1.0, tk.END)
-        self.html_text.delete(1.0, tk.END)
+        self.html_view.clear()
         self.scraped_enhancements = []
-        self.html_content = ""
         self.update_status("Ready")
         self.log("Results cleared")
     
@@ -656,88 +655,16 @@ class RecipeScraperApp:
         self.log("Cleaning and formatting enhancements...")
         self.update_status("Cleaning enhancements...")
         
-        # Keywords to identify important tips and enhancements
-        important_keywords = [
-            'tip', 'recommend', 'suggest', 'better', 'best', 'improve', 'enhance', 
-            'important', 'key', 'essential', 'critical', 'crucial', 'vital', 
-            'don\'t', 'avoid', 'never', 'always', 'ensure', 'make sure', 
-            'temperature', 'heat', 'cook', 'bake', 'fry', 'roast', 'grill', 'simmer', 'boil',
-            'substitute', 'replace', 'alternative', 'instead', 
-            'secret', 'trick', 'technique', 'method'
-        ]
-        
-        cooking_terms = [
-            'cook', 'bake', 'fry', 'roast', 'grill', 'simmer', 'boil', 'steam', 'sauté', 
-            'broil', 'poach', 'blanch', 'braise', 'stew', 'toast', 'whip', 'beat', 'fold', 
-            'mix', 'stir', 'blend', 'chop', 'dice', 'mince', 'slice', 'julienne', 'grate', 
-            'peel', 'core', 'seed', 'marinate', 'season', 'spice', 'flavor', 'taste', 
-            'texture', 'consistency', 'temperature', 'heat', 'cool', 'chill', 'freeze', 
-            'thaw', 'rest', 'rise', 'proof', 'ferment', 'cure', 'smoke', 'dry', 'dehydrate'
-        ]
-        
-        # Extract potential enhancement points from the raw scraped text
-        potential_points = []
-        for text in self.scraped_enhancements:
-            # Skip very short texts or those that are clearly not tips
-            if len(text) < 15 or text.startswith('Your Private Notes') or text.startswith('Click here'):
-                continue
-                
-            # Split text into sentences
-            sentences = re.split(r'(?<=[.!?])\s+', text)
+        with profile_run('clean_enhancements', self.last_results_dir) as profile_artefacts:
+            # Tip sentences, minus near-duplicates, 15 most relevant first (the same as the batch cleaning stage)
+            cleaned_points = enhancement_cleaning.clean_points(self.scraped_enhancements, 15, self.site_var.get())
             
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if len(sentence) < 15:
-                    continue
-                    
-                # Check if the sentence contains important keywords or cooking terms
-                if any(keyword in sentence.lower() for keyword in important_keywords) or \
-                   any(term in sentence.lower() for term in cooking_terms):
-                    # Clean the sentence
-                    clean_sentence = re.sub(r'\s+', ' ', sentence)  # Replace multiple spaces
-                    clean_sentence = re.sub(r'[\(\[].*?[\)\]]', '', clean_sentence)  # Remove parentheses content
-                    clean_sentence = re.sub(r'\b(?:I|we|you)\s+(?:can|should|could|might|may)\b', '', clean_sentence, flags=re.IGNORECASE)  # Remove weak modals
-                    
-                    # Format as a tip if it's not already
-                    if not clean_sentence.endswith(('.', '!', '?')):
-                        clean_sentence += '.'
-                        
-                    # Add to potential points if not too short after cleaning
-                    if len(clean_sentence) >= 15:
-                        potential_points.append(clean_sentence)
-        
-        # Remove duplicates and near-duplicates
-        cleaned_points = []
-        seen_content = set()
-        
-        for point in potential_points:
-            # Create a simplified version for duplicate checking
-            simple_point = re.sub(r'[^\w\s]', '', point.lower())
-            simple_point = re.sub(r'\s+', ' ', simple_point).strip()
-            
-            # Check if we've seen this or a very similar point
-            is_duplicate = False
-            for seen in seen_content:
-                # If 80% of words match, consider it a duplicate
-                if self.similarity_score(simple_point, seen) > 0.8:
-                    is_duplicate = True
-                    break
-                    
-            if not is_duplicate:
-                cleaned_points.append(point)
-                seen_content.add(simple_point)
-        
-        # Sort points by relevance (length can be a simple proxy for information content)
-        cleaned_points.sort(key=len, reverse=True)
-        
-        # Limit to the most relevant points (max 15)
-        if len(cleaned_points) > 15:
-            cleaned_points = cleaned_points[:15]
-        
         # Update the enhancements
         self.scraped_enhancements = cleaned_points
         self.display_enhancements(cleaned_points)
         
+        if profile_artefacts:
+            self.log(f"Profile written: {', '.join(profile_artefacts)}")
         self.log(f"Successfully cleaned and formatted {len(cleaned_points)} enhancement points")
         self.update_status("Enhancements cleaned")
         messagebox.showinfo("Success", f"Cleaned {len(cleaned_points)} enhancement points")
@@ -755,14 +682,17 @@ class RecipeScraperApp:
         self.log("Cleaning enhancements with DeepSeek AI...")
         self.update_status("Processing with DeepSeek AI...")
         
-        # Start a thread to handle the API call without freezing the UI
-        threading.Thread(target=self._process_with_deepseek, daemon=True).start()
+        # Run the API call on the task pool so the UI stays responsive
+        self.tasks.submit('deepseek', self._process_with_deepseek, list(self.scraped_enhancements), self.current_recipe_title,
+                          on_done=self._update_ui_with_deepseek_results, on_error=self._on_deepseek_error)
     
-    def _process_with_deepseek(self):
-        """Process enhancements with DeepSeek API in a background thread"""
+    def _process_with_deepseek(self, job, enhancements, recipe_title):
+        """Process enhancements with DeepSeek API (runs on the task pool)"""
         try:
+            import requests
+            
             # Prepare the raw text of all enhancements
-            raw_text = "\n\n".join(self.scraped_enhancements)
+            raw_text = "\n\n".join(enhancements)
             
             # Create the messages for DeepSeek API
             messages = [
@@ -772,11 +702,12 @@ class RecipeScraperApp:
                 },
                 {
                     "role": "user",
-                    "content": f"Here are scraped recipe enhancements for {self.current_recipe_title}. Please ONLY clean and format the EXISTING content into clear, concise points. DO NOT add any new tips or information that isn't explicitly stated in the original text. Just organize what's already there:\n\n{raw_text}"
+                    "content": f"Here are scraped recipe enhancements for {recipe_title}. Please ONLY clean and format the EXISTING content into clear, concise points. DO NOT add any new tips or information that isn't explicitly stated in the original text. Just organize what's already there:\n\n{raw_text}"
                 }
             ]
             
             # Make the API call
+            deepseek_start = time.perf_counter()
             response = requests.post(
                 deepseek_api_url,
                 headers={
@@ -791,45 +722,40 @@ class RecipeScraperApp:
                 },
                 timeout=30
             )
+            self.metrics.observe('stage_seconds', time.perf_counter() - deepseek_start, stage='deepseek')
+            self.metrics.inc('deepseek_requests_total', code=response.status_code)
+            self.metrics.inc('deepseek_input_chars_total', len(raw_text))
+            job.raise_if_cancelled()
             
             # Process the response
             if response.status_code != 200:
-                error_message = f"DeepSeek API error: {response.status_code} - {response.text}"
-                self.log(error_message)
-                messagebox.showerror("API Error", error_message)
-                return
+                raise RuntimeError(f"DeepSeek API error: {response.status_code} - {response.text}")
             
             data = response.json()
             cleaned_text = data["choices"][0]["message"]["content"]
             
-            # Extract the points from the AI response
-            cleaned_points = []
-            for line in cleaned_text.split("\n"):
-                line = line.strip()
-                # Skip empty lines and headers
-                if not line or line.startswith("#") or line.startswith("Here"):
-                    continue
-                    
-                # Clean up numbering and bullet points
-                clean_line = re.sub(r'^[\d\-\.\*•]+\s*', '', line).strip()
-                
-                if clean_line and len(clean_line) > 10:
-                    # Make sure each point ends with a period
-                    if not clean_line.endswith(('.', '!', '?')):
-                        clean_line += '.'
-                    cleaned_points.append(clean_line)
+            # Extract the points from the AI response (numbering, bullets and headers removed)
+            cleaned_points = text_normalize.ai_points(cleaned_text)
+            self.metrics.inc('deepseek_points_total', len(cleaned_points))
+            return cleaned_points
             
-            # Update the UI in the main thread
-            self.root.after(0, self._update_ui_with_deepseek_results, cleaned_points)
-            
-        except Exception as e:
-            error_message = f"Error processing with DeepSeek: {str(e)}"
-            self.log(error_message)
-            self.root.after(0, lambda: messagebox.showerror("Error", error_message))
+        except Exception:
+            self.metrics.inc('deepseek_requests_total', code='error')
+            raise
+        
+        finally:
+            self.metrics.export_to_env_dir('scraper_metrics')
+    
+    def _on_deepseek_error(self, e):
+        error_message = f"Error processing with DeepSeek: {str(e)}"
+        self.log(error_message)
+        self.update_status("DeepSeek AI processing failed")
+        messagebox.showerror("Error", error_message)
     
     def _update_ui_with_deepseek_results(self, cleaned_points):
         """Update the UI with the results from DeepSeek"""
         if not cleaned_points:
+            self.update_status("DeepSeek AI processing complete")
             messagebox.showinfo("Info", "DeepSeek AI couldn't extract any clear enhancement points. Try the regular clean function instead.")
             return
             
@@ -841,19 +767,6 @@ class RecipeScraperApp:
         self.update_status("DeepSeek AI processing complete")
         messagebox.showinfo("Success", f"DeepSeek AI extracted {len(cleaned_points)} enhancement points")
     
-    def similarity_score(self, text1, text2):
-        """Calculate similarity between two text strings based on word overlap"""
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 or not words2:
-            return 0.0
-            
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
-    
     def open_manual_entry(self):
         """Open a window for manual enhancement entry"""
         manual_window = tk.Toplevel(self.root)
@@ -931,20 +844,8 @@ class RecipeScraperApp:
                 messagebox.showerror("Error", "Please enter at least one enhancement.")
                 return
 
-            # Process the enhancements
-            enhancements = []
-            for line in content.split('\n'):
-                line = line.strip()
-                if line and len(line) > 5:  # Skip empty lines and very short entries
-                    # Remove numbering if present
-                    line = re.sub(r'^\d+\.\s*', '', line)
-                    line = re.sub(r'^[\-\*•]\s*', '', line)
-
-                    # Ensure proper punctuation
-                    if not line.endswith(('.', '!', '?')):
-                        line += '.'
-
-                    enhancements.append(line)
+            # Process the enhancements (skip very short lines, remove numbering, end with a period)
+            enhancements = text_normalize.manual_points(content)
 
             if not enhancements:
                 messagebox.showerror("Error", "No valid enhancements found. Please check your entries.")
@@ -1013,6 +914,7 @@ class RecipeScraperApp:
         self.scrape_enhancements()
 
 if __name__ == "__main__":
+    configure_from_argv(sys.argv)
     root = tk.Tk()
     app = RecipeScraperApp(root)
     root.mainloop()
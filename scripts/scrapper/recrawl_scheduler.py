@@ -0,0 +1,274 @@
+"""Budgeted recrawl scheduling from staleness and observed change rate
+
+Each successful scrape records a hash of the extracted enhancements. Over
+time that gives every recipe an estimated change rate (changes per day,
+assuming a Poisson process), and a refresh run only fetches the `budget`
+recipes most likely to have changed since their last scrape:
+
+    priority = 1 - exp(-rate * days_since_last_scrape)
+
+Never-scraped recipes come first and anything older than max_age_days is
+due regardless of its rate, so nothing goes stale forever.
+
+Failed scrapes (timeouts, 5xx, parse errors) are recorded too. A failing
+recipe is left out of the plan for an exponentially growing backoff (6 hours
+doubling up to max_age_days), and a recipe that has never been scraped
+successfully stops jumping the queue after NEW_ATTEMPTS failures, so a few
+dead URLs cannot take the budget from the real refresh work.
+
+Usage:
+    python scripts/scrapper/recrawl_scheduler.py plan recipes.json --budget 200
+    python scripts/scrapper/recrawl_scheduler.py run recipes.json --budget 200 --results-dir scraped_enhancements
+    python scripts/scrapper/recrawl_scheduler.py stats
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+STATE_ENV = 'PANTRYPAL_CRAWL_STATE'
+BUDGET_ENV = 'PANTRYPAL_RECRAWL_BUDGET'
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'crawl_state.sqlite3')
+
+DAY = 86400.0
+# Prior for recipes with little history: half a change over the first ten days
+PRIOR_CHANGES = 0.5
+PRIOR_DAYS = 10.0
+MAX_AGE_DAYS = 30.0
+# Failure backoff: 6h, 12h, 24h, ... capped at max_age_days
+FAILURE_BACKOFF_HOURS = 6.0
+NEW_ATTEMPTS = 3
+
+
+def recrawl_budget():
+    """Per-run budget from PANTRYPAL_RECRAWL_BUDGET, or None to scrape the whole list"""
+    value = os.getenv(BUDGET_ENV, '').strip()
+    return int(value) if value and int(value) > 0 else None
+
+
+def open_from_env():
+    """Open the scheduler when PANTRYPAL_RECRAWL_BUDGET or PANTRYPAL_CRAWL_STATE is set, else None"""
+    if recrawl_budget() or os.getenv(STATE_ENV):
+        return RecrawlScheduler()
+    return None
+
+
+def content_hash(enhancements):
+    return hashlib.sha1(json.dumps(enhancements, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class RecrawlScheduler:
+    """Crawl history per recipe in SQLite; safe to share between batch worker threads"""
+
+    def __init__(self, path=None, max_age_days=MAX_AGE_DAYS):
+        self.path = path or os.getenv(STATE_ENV) or DEFAULT_STATE_PATH
+        self.max_age_days = max_age_days
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                recipe_id TEXT PRIMARY KEY,
+                url TEXT,
+                content_hash TEXT NOT NULL,
+                last_scraped REAL NOT NULL,
+                checks INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                observed_days REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS crawl_failures (
+                recipe_id TEXT PRIMARY KEY,
+                url TEXT,
+                failures INTEGER NOT NULL,
+                last_failed REAL NOT NULL,
+                next_due REAL NOT NULL,
+                error TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def record(self, result, scraped_at=None):
+        """Update a recipe's history from a scrape result; returns True if its content changed"""
+        if scraped_at is None:
+            scraped_at = _epoch(result.get('scraped_at'))
+        recipe_id = str(result['recipe_id'])
+        new_hash = content_hash(result['enhancements'])
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM crawl_failures WHERE recipe_id = ?", (recipe_id,))
+            row = self.conn.execute(
+                "SELECT content_hash, last_scraped FROM crawl_state WHERE recipe_id = ?", (recipe_id,)).fetchone()
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO crawl_state (recipe_id, url, content_hash, last_scraped) VALUES (?, ?, ?, ?)",
+                    (recipe_id, result.get('url'), new_hash, scraped_at))
+                return True
+            changed = row[0] != new_hash
+            interval_days = max(0.0, scraped_at - row[1]) / DAY
+            self.conn.execute(
+                "UPDATE crawl_state SET url = ?, content_hash = ?, last_scraped = ?, checks = checks + 1, "
+                "changes = changes + ?, observed_days = observed_days + ? WHERE recipe_id = ?",
+                (result.get('url'), new_hash, scraped_at, int(changed), interval_days, recipe_id))
+            return changed
+
+    def record_failure(self, recipe_id, url=None, failed_at=None, error=None):
+        """Count a failed scrape and back the recipe off; returns when it is next due (epoch seconds)"""
+        failed_at = time.time() if failed_at is None else failed_at
+        recipe_id = str(recipe_id)
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT failures FROM crawl_failures WHERE recipe_id = ?", (recipe_id,)).fetchone()
+            failures = (row[0] if row else 0) + 1
+            backoff = min(FAILURE_BACKOFF_HOURS * 3600 * 2 ** (failures - 1), self.max_age_days * DAY)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crawl_failures (recipe_id, url, failures, last_failed, next_due, error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (recipe_id, url, failures, failed_at, failed_at + backoff, error))
+        return failed_at + backoff
+
+    def _priority(self, state, failure, now):
+        """Probability the page changed since its last scrape (> 1 when overdue or never scraped)
+
+        None while a failing recipe is backing off.
+        """
+        if failure:
+            failures, last_failed, next_due = failure
+            if now < next_due:
+                return None
+            if state is None and failures >= NEW_ATTEMPTS:
+                # Never worked: no longer infinitely stale, just a page with no history since its last attempt
+                age_days = max(0.0, now - last_failed) / DAY
+                return 1.0 - math.exp(-PRIOR_CHANGES / PRIOR_DAYS * age_days)
+        if state is None:
+            return math.inf
+        _, last_scraped, _, changes, observed_days = state
+        age_days = max(0.0, now - last_scraped) / DAY
+        if age_days >= self.max_age_days:
+            return 1.0 + age_days / self.max_age_days
+        rate = (changes + PRIOR_CHANGES) / (observed_days + PRIOR_DAYS)
+        return 1.0 - math.exp(-rate * age_days)
+
+    def plan(self, recipes, budget=None, now=None):
+        """Return [(priority, recipe)] for the `budget` recipes most likely to have changed
+
+        Recipes backing off after a failed scrape are left out.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            states = {
+                row[0]: row[1:]
+                for row in self.conn.execute(
+                    "SELECT recipe_id, content_hash, last_scraped, checks, changes, observed_days FROM crawl_state")
+            }
+            failures = {
+                row[0]: row[1:]
+                for row in self.conn.execute("SELECT recipe_id, failures, last_failed, next_due FROM crawl_failures")
+            }
+        scored = []
+        for i, recipe in enumerate(recipes):
+            recipe_id = str(recipe['id'])
+            priority = self._priority(states.get(recipe_id), failures.get(recipe_id), now)
+            if priority is not None:
+                scored.append((priority, i, recipe))
+        if budget is None or budget >= len(recipes):
+            queue = sorted(scored, key=lambda item: (-item[0], item[1]))
+        else:
+            # Ties keep input order
+            queue = heapq.nsmallest(budget, scored, key=lambda item: (-item[0], item[1]))
+        return [(priority, recipe) for priority, _, recipe in queue]
+
+    def select(self, recipes, budget=None, now=None):
+        """The recipes to scrape this run, highest priority first"""
+        return [recipe for _, recipe in self.plan(recipes, budget, now)]
+
+    def stats(self):
+        with self._lock:
+            tracked, checks, changes, days = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(checks), 0), COALESCE(SUM(changes), 0), COALESCE(SUM(observed_days), 0) "
+                "FROM crawl_state").fetchone()
+            failing, backing_off = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(next_due > ?), 0) FROM crawl_failures", (time.time(),)).fetchone()
+        return {
+            'tracked': tracked,
+            'rechecks': checks,
+            'changes': changes,
+            'changes_per_recheck': round(changes / checks, 4) if checks else None,
+            'changes_per_day': round(changes / days, 4) if days else None,
+            'failing': failing,
+            'backing_off': backing_off,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _epoch(iso_timestamp):
+    if not iso_timestamp:
+        return time.time()
+    return datetime.fromisoformat(iso_timestamp).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan or run a budgeted recrawl of a recipe list")
+    parser.add_argument('--state', help=f"crawl state database (default: ${STATE_ENV} or {DEFAULT_STATE_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('plan', "print the recrawl queue"), ('run', "scrape the queue headlessly")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('recipes', help="JSON or JSONL list of {id, title, url}")
+        command.add_argument('--budget', type=int, default=recrawl_budget(), help=f"recipes per run (default: ${BUDGET_ENV})")
+        if name == 'run':
+            command.add_argument('--results-dir', default='scraped_enhancements')
+            command.add_argument('--concurrency', type=int, default=1)
+    commands.add_parser('stats', help="tracked recipes and observed change rates")
+    args = parser.parse_args(argv)
+
+    with RecrawlScheduler(args.state) as scheduler:
+        if args.command == 'stats':
+            print(json.dumps(scheduler.stats(), indent=2))
+            return 0
+
+        from batch_engine import load_recipes
+        recipes = load_recipes(args.recipes)
+        if args.command == 'plan':
+            for priority, recipe in scheduler.plan(recipes, args.budget):
+                label = 'new' if priority == math.inf else f"{priority:.3f}"
+                print(f"{label:>6}  {recipe['id']:<10} {recipe['url']}")
+            return 0
+
+        from batch_engine import BatchScraper
+        import change_feed
+        import staging_store
+        selected = scheduler.select(recipes, args.budget)
+        print(f"Recrawling {len(selected)} of {len(recipes)} recipes")
+        store = staging_store.open_from_env()
+        feed = change_feed.open_from_env()
+        try:
+            engine = BatchScraper(args.results_dir, concurrency=args.concurrency, staging_store=store, scheduler=scheduler,
+                                  change_feed=feed)
+            results_log = engine.run(selected)
+        finally:
+            if store:
+                store.close()
+            if feed:
+                feed.close()
+        print(f"{results_log['successful']} successful, {results_log['failed']} failed, {results_log['changed']} changed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default latency buckets in seconds, covering fast parses up to slow API calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Optional directory where interactive operations export their metrics
+METRICS_DIR_ENV = 'PANTRYPAL_METRICS_DIR'
+
+
+def _label_key(labels):
+    """Turn a labels dict into a hashable, stably ordered key"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=None):
+    """Format a label key in Prometheus exposition syntax"""
+    pairs = list(key)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed bucket bounds"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Estimate a quantile from the bucket counts (upper bound of the bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, c in zip(self.buckets, self.counts):
+            running += c
+            if running >= target:
+                return bound
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(b): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of counters, gauges and latency histograms
+
+    Metrics are keyed by name plus a set of labels (e.g. stage, site), and can
+    be exported as JSON or as a Prometheus textfile for node_exporter.
+    """
+
+    def __init__(self, prefix='pantrypal_scraper'):
+        self.prefix = prefix
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        """Record a latency observation in seconds"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time a block and record it under stage_seconds{stage=...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def merge(self, other):
+        """Fold another registry's values into this one"""
+        with other._lock:
+            counters = dict(other._counters)
+            gauges = dict(other._gauges)
+            histograms = list(other._histograms.items())
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            self._gauges.update(gauges)
+            for key, histogram in histograms:
+                mine = self._histograms.get(key)
+                if mine is None:
+                    mine = self._histograms[key] = Histogram(histogram.buckets)
+                mine.merge(histogram)
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serialisable dict"""
+        def entries(items, convert):
+            return [
+                {'name': name, 'labels': dict(key), 'value': convert(value)}
+                for (name, key), value in sorted(items, key=lambda kv: kv[0])
+            ]
+
+        with self._lock:
+            return {
+                'generated_at': time.time(),
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'counters': entries(self._counters.items(), lambda v: v),
+                'gauges': entries(self._gauges.items(), lambda v: v),
+                'histograms': entries(self._histograms.items(), lambda h: h.to_dict()),
+            }
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+
+        def typed(items, kind):
+            seen = set()
+            for (name, key), value in items:
+                metric = f"{self.prefix}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    seen.add(metric)
+                yield metric, key, value
+
+        for metric, key, value in typed(counters, 'counter'):
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+        for metric, key, value in typed(gauges, 'gauge'):
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+        for metric, key, histogram in typed(histograms, 'histogram'):
+            running = 0
+            for bound, c in zip(histogram.buckets, histogram.counts):
+                running += c
+                lines.append(f"{metric}_bucket{_format_labels(key, ('le', str(bound)))} {running}")
+            lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.snapshot(), indent=2))
+
+    def write_prometheus(self, path):
+        _atomic_write(path, self.to_prometheus())
+
+    def export(self, directory, basename):
+        """Write <basename>.json and <basename>.prom into directory"""
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"{basename}.json")
+        prom_path = os.path.join(directory, f"{basename}.prom")
+        self.write_json(json_path)
+        self.write_prometheus(prom_path)
+        return json_path, prom_path
+
+    def export_to_env_dir(self, basename):
+        """Export to $PANTRYPAL_METRICS_DIR if it is set, otherwise do nothing"""
+        directory = os.getenv(METRICS_DIR_ENV)
+        if not directory:
+            return None
+        return self.export(directory, basename)
+
+    def summary(self, stage_names=None):
+        """One-line human summary of stage latencies for the log"""
+        parts = []
+        with self._lock:
+            merged = {}
+            for (name, key), histogram in self._histograms.items():
+                if name != 'stage_seconds':
+                    continue
+                stage = dict(key).get('stage')
+                if stage_names and stage not in stage_names:
+                    continue
+                merged.setdefault(stage, Histogram(histogram.buckets)).merge(histogram)
+        for stage, histogram in sorted(merged.items()):
+            avg_ms = histogram.sum / histogram.count * 1000 if histogram.count else 0
+            parts.append(f"{stage} avg {avg_ms:.0f}ms (n={histogram.count})")
+        return ", ".join(parts)
+
+
+def _atomic_write(path, text):
+    """Write via a temp file and rename so textfile collectors never see partial files"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
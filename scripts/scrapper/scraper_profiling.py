@@ -0,0 +1,181 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+# Profiling is off unless PANTRYPAL_PROFILE is set (or --profile is passed):
+#   PANTRYPAL_PROFILE=1 / cprofile  -> deterministic cProfile, writes .pstats + .txt
+#   PANTRYPAL_PROFILE=sample        -> sampling profiler, writes flamegraph-ready .collapsed
+PROFILE_ENV = 'PANTRYPAL_PROFILE'
+PROFILE_DIR_ENV = 'PANTRYPAL_PROFILE_DIR'
+PROFILE_INTERVAL_ENV = 'PANTRYPAL_PROFILE_INTERVAL'
+
+_MODES = {'1': 'cprofile', 'true': 'cprofile', 'yes': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+
+_active = threading.local()
+_POOL_SUFFIX = re.compile(r'_\d+$')
+
+
+def profile_mode():
+    """Return 'cprofile', 'sample' or None depending on the environment"""
+    value = os.getenv(PROFILE_ENV, '').strip().lower()
+    return _MODES.get(value)
+
+
+def configure_from_argv(argv):
+    """Honour --profile / --profile=sample on the command line by setting the env var"""
+    for arg in argv[1:]:
+        if arg == '--profile':
+            os.environ[PROFILE_ENV] = 'cprofile'
+        elif arg.startswith('--profile='):
+            os.environ[PROFILE_ENV] = arg.split('=', 1)[1]
+    return profile_mode()
+
+
+def _artefact_base(name, output_dir):
+    output_dir = output_dir or os.getenv(PROFILE_DIR_ENV) or os.path.join(os.getcwd(), 'profiles')
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(output_dir, f"profile_{name}_{stamp}")
+
+
+class StackSampler:
+    """Periodically samples Python stacks into collapsed-stack counts
+
+    With thread_id=None every thread is sampled and each stack is rooted at
+    its thread's name (pool threads such as batch_0, batch_1 share one root).
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self.samples[_collapse(frame)] += 1
+                continue
+            names = {thread.ident: _POOL_SUFFIX.sub('', thread.name) for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    self.samples[f"{names.get(thread_id, thread_id)};{_collapse(frame)}"] += 1
+
+    def write_collapsed(self, path):
+        """Write samples in Brendan Gregg's collapsed format (flamegraph.pl / speedscope)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+@contextmanager
+def _profile_threads(profilers):
+    """Give every thread started inside the block its own cProfile (before 3.12 cProfile sees one thread only)"""
+    if sys.version_info >= (3, 12):
+        # cProfile is built on sys.monitoring there, so the calling thread's profiler already sees them all
+        yield
+        return
+
+    def start_profiler(frame, event, arg):
+        # Runs on the new thread's first call; from then on its own profiler takes over
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        profiler.enable()
+
+    threading.setprofile(start_profiler)
+    try:
+        yield
+    finally:
+        threading.setprofile(None)
+
+
+@contextmanager
+def profile_run(name, output_dir=None):
+    """Profile the enclosed block when profiling is enabled
+
+    Yields the list of artefact paths written (filled in on exit), or None when
+    profiling is disabled, in which case the only cost is an env lookup.
+    Nested calls on the same thread are no-ops so a batch profile is not split.
+    Both modes cover the worker threads the block starts (e.g. a batch's
+    thread pool) as well as the calling thread.
+    """
+    mode = profile_mode()
+    if mode is None or getattr(_active, 'depth', 0):
+        yield None
+        return
+
+    artefacts = []
+    base = _artefact_base(name, output_dir)
+    _active.depth = 1
+    try:
+        if mode == 'sample':
+            interval = float(os.getenv(PROFILE_INTERVAL_ENV, '0.005'))
+            sampler = StackSampler(interval=interval)
+            sampler.start()
+            try:
+                yield artefacts
+            finally:
+                sampler.stop()
+                sampler.write_collapsed(base + '.collapsed')
+                artefacts.append(base + '.collapsed')
+        else:
+            profiler = cProfile.Profile()
+            thread_profilers = []
+            profiler.enable()
+            try:
+                with _profile_threads(thread_profilers):
+                    yield artefacts
+            finally:
+                profiler.disable()
+                # The worker threads have finished by now (their pools shut down inside the block)
+                stats = pstats.Stats(profiler, *thread_profilers, stream=io.StringIO())
+                stats.dump_stats(base + '.pstats')
+                report = io.StringIO()
+                stats.stream = report
+                stats.sort_stats('cumulative').print_stats(40)
+                with open(base + '.txt', 'w', encoding='utf-8') as f:
+                    f.write(report.getvalue())
+                artefacts.extend([base + '.pstats', base + '.txt'])
+    finally:
+        _active.depth = 0
+
+
+def profile_process(name, output_dir=None):
+    """Profile the rest of this process (e.g. a pool worker) when profiling is enabled
+
+    The artefacts are written when the process exits normally, which for a
+    multiprocessing worker is when its pool shuts down.
+    """
+    stack = ExitStack()
+    if stack.enter_context(profile_run(f"{name}_{os.getpid()}", output_dir)) is None:
+        return
+    from multiprocessing import util
+    util.Finalize(None, stack.close, exitpriority=10)
@@ -0,0 +1,397 @@
+"""Sitemap-driven recipe discovery
+
+Streams a site's sitemap (or sitemap index, following the nested sitemaps;
+plain or gzipped) with iterparse, keeps the <loc> URLs that match the site's
+recipe page pattern, skips every URL that was already queued or scraped and
+appends the rest as {id, title, url} lines to a JSONL recipe list. Batch
+scraping, the work queue and the recrawl scheduler all read JSONL lists.
+
+"Already seen" is a persistent Bloom filter over canonical URLs: a fixed-size
+bit array in a memory-mapped file, so memory stays flat however many URLs a
+sitemap lists or the filter holds. Seed it once from existing recipe lists,
+result files, the staging database and the work queue; every URL discovery
+emits is added to it. A Bloom filter can wrongly report a new URL as seen (at
+the configured error rate, 0.1% by default) but never misses one it was given.
+Run one discovery at a time per filter file.
+
+Discovered recipes get numeric ids from a sequence starting at
+DISCOVERED_ID_BASE (1,000,000,000, far above hand-curated recipe ids), so
+bundles, the Supabase tables and save_to_database take them like any other
+recipe. The next free id is kept in <filter>.ids next to the filter and
+reserved in blocks, so a crashed run skips a few ids but never reuses one.
+Keep that file along with the filter. The title comes from the URL slug.
+
+Usage:
+    python scripts/scrapper/sitemap_discovery.py seed recipes.json scraped_enhancements --staging --queue
+    python scripts/scrapper/sitemap_discovery.py discover https://www.allrecipes.com/sitemap.xml --output new_recipes.jsonl --limit 5000
+    python scripts/scrapper/sitemap_discovery.py discover sitemap_recipes.xml.gz --site seriouseats --pattern "-recipe-\\d+$" --output new_recipes.jsonl
+    python scripts/scrapper/sitemap_discovery.py stats
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import io
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from urllib.parse import urlsplit
+
+import recipe_extraction
+
+BLOOM_ENV = 'PANTRYPAL_DISCOVERY_BLOOM'
+DEFAULT_BLOOM_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'discovery_seen.bloom')
+DEFAULT_CAPACITY = 10000000
+DEFAULT_ERROR_RATE = 0.001
+DISCOVERED_ID_BASE = 1000000000
+ID_BLOCK = 1000
+
+# Recipe page URLs per site, searched in the URL path; listing, category and author pages do not match
+RECIPE_PATTERNS = {
+    'allrecipes': r'^/recipe/\d+(?:/|$)|-recipe-\d+/?$',
+    'foodnetwork': r'^/recipes/[^/]+/[^/]+-\d+/?$',
+    'epicurious': r'^/recipes/food/views/[^/]+/?$',
+    'bbcgoodfood': r'^/recipes/(?!collection/|category/)[^/]+/?$',
+    'simplyrecipes': r'^/recipes/[^/]+/?$|-recipe-\d+/?$',
+    'seriouseats': r'-recipe(?:-\d+)?/?$|^/recipes/\d{4}/\d{2}/[^/]+\.html$',
+    'other': r'/recipes?/[^/]+|-recipe(?:-\d+)?/?$',
+}
+
+_TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+_SLUG_SUFFIX = re.compile(r'(?:-recipe)?(?:-\d+)?$')
+
+
+def canonical_url(url):
+    """Scheme-, www-, case- and tracking-insensitive form of a URL, used as the "seen" key"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    query = '&'.join(param for param in parts.query.split('&')
+                     if param and not param.lower().startswith(_TRACKING_PARAMS))
+    return host + (parts.path.rstrip('/') or '/') + (f"?{query}" if query else '')
+
+
+def title_from_url(url):
+    """Best-effort title from the URL slug ("/recipe/10813/best-chocolate-chip-cookies/" -> "Best Chocolate Chip Cookies")"""
+    segments = [segment for segment in urlsplit(url).path.split('/') if segment and not segment.isdigit()]
+    if not segments:
+        return url
+    slug = _SLUG_SUFFIX.sub('', segments[-1].rsplit('.', 1)[0]) or segments[-1]
+    return slug.replace('-', ' ').replace('_', ' ').strip().title()
+
+
+def recipe_entry(url, site, recipe_id, lastmod=None):
+    """A batch list entry for a discovered URL"""
+    entry = {
+        'id': recipe_id,
+        'title': title_from_url(url),
+        'url': url,
+        'site': site,
+    }
+    if lastmod:
+        entry['lastmod'] = lastmod
+    return entry
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings in a memory-mapped file
+
+    Sized on creation for `capacity` keys at `error_rate` false positives;
+    an existing file keeps its own size. Bit positions come from one
+    blake2b digest split into two 64-bit hashes (double hashing).
+    """
+
+    _HEADER = struct.Struct('<8sQQQ')  # magic, bits, hashes, keys added
+    _MAGIC = b'PPBLOOM1'
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.path = path or os.getenv(BLOOM_ENV) or DEFAULT_BLOOM_PATH
+        if not os.path.exists(self.path):
+            self._create(capacity, error_rate)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.bits, self.hashes, self.count = self._HEADER.unpack_from(self._map)
+        if magic != self._MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a discovery Bloom filter")
+
+    def _create(self, capacity, error_rate):
+        bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(self._HEADER.pack(self._MAGIC, bits, hashes, 0))
+            f.truncate(self._HEADER.size + (bits + 7) // 8)  # sparse where the filesystem allows
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        data, offset = self._map, self._HEADER.size
+        return all(data[offset + (position >> 3)] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key):
+        """Add a key; returns False if it (probably) was already there"""
+        data, offset = self._map, self._HEADER.size
+        added = False
+        for position in self._positions(key):
+            index, mask = offset + (position >> 3), 1 << (position & 7)
+            if not data[index] & mask:
+                data[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def error_rate(self):
+        """Expected false-positive rate at the current number of keys"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'keys': self.count,
+            'bits': self.bits,
+            'hashes': self.hashes,
+            'file_bytes': self._HEADER.size + (self.bits + 7) // 8,
+            'capacity_at_0.1%': int(-self.bits * math.log(2) ** 2 / math.log(0.001)),
+            'expected_error_rate': round(self.error_rate(), 6),
+        }
+
+    def flush(self):
+        self._HEADER.pack_into(self._map, 0, self._MAGIC, self.bits, self.hashes, self.count)
+        self._map.flush()
+
+    def close(self):
+        if not self._map.closed:
+            self.flush()
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class IdSequence:
+    """Numeric ids for discovered recipes, persisted in a small text file
+
+    The file holds the first id not yet handed out to any run. Ids are taken
+    from it ID_BLOCK at a time and the unused rest is given back on close().
+    """
+
+    def __init__(self, path, start=DISCOVERED_ID_BASE):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._next = int(f.read().strip())
+        except FileNotFoundError:
+            self._next = start
+        self._reserved = self._next
+
+    def _save(self, value):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{value}\n")
+        os.replace(tmp_path, self.path)
+
+    def next(self):
+        if self._next >= self._reserved:
+            self._reserved = self._next + ID_BLOCK
+            self._save(self._reserved)
+        value = self._next
+        self._next += 1
+        return value
+
+    def close(self):
+        self._save(self._next)
+        self._reserved = self._next
+
+
+def _open_sitemap(source, session, timeout):
+    """A binary stream of the sitemap XML at a URL or path, un-gzipped when needed"""
+    if source.startswith(('http://', 'https://')):
+        response = session.get(source, timeout=timeout, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True  # undo Content-Encoding: gzip
+        response.raw.auto_close = False  # stay open while buffered bytes remain to be parsed
+        stream = io.BufferedReader(response.raw, 64 * 1024)
+    else:
+        stream = open(source, 'rb')
+    if stream.peek(2)[:2] == b'\x1f\x8b':  # .xml.gz files
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _sitemap_entries(stream):
+    """Yield ('url' | 'sitemap', loc, lastmod) from a urlset or sitemapindex, in constant memory"""
+    root = None
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = element
+            continue
+        if event != 'end':
+            continue
+        kind = element.tag.rsplit('}', 1)[-1]
+        if kind not in ('url', 'sitemap'):
+            continue
+        fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '').strip() for child in element}
+        if fields.get('loc'):
+            yield kind, fields['loc'], fields.get('lastmod') or None
+        root.clear()  # drop the entries parsed so far
+
+
+def iter_sitemap(source, session=None, timeout=30, on_log=None):
+    """Yield (url, lastmod) for every page in a sitemap, following sitemap indexes depth-first"""
+    if session is None and source.startswith(('http://', 'https://')):
+        import requests
+        session = requests.Session()
+        session.headers.update(recipe_extraction.REQUEST_HEADERS)
+    pending, visited = [source], set()
+    while pending:
+        current = pending.pop()
+        if current in visited:
+            continue
+        visited.add(current)
+        children = []
+        try:
+            stream = _open_sitemap(current, session, timeout)
+        except Exception as e:
+            if current == source:
+                raise
+            if on_log:
+                on_log(f"Skipping sitemap {current}: {e}")
+            continue
+        with stream:
+            for kind, loc, lastmod in _sitemap_entries(stream):
+                if kind == 'sitemap':
+                    children.append(loc)
+                else:
+                    yield loc, lastmod
+        pending.extend(reversed(children))
+
+
+def discover(source, seen, ids, output, site=None, pattern=None, limit=None, session=None, on_log=None):
+    """Write every unseen recipe URL of a sitemap to `output` as JSONL and add it to `seen`
+
+    Each new recipe takes the next id from `ids` (an IdSequence).
+
+    Returns counts: urls, not_recipe, seen, new.
+    """
+    site = site or recipe_extraction.detect_site_type(source)
+    matcher = re.compile(pattern or RECIPE_PATTERNS.get(site, RECIPE_PATTERNS['other']))
+    counts = Counter(urls=0, not_recipe=0, seen=0, new=0)
+    for url, lastmod in iter_sitemap(source, session, on_log=on_log):
+        counts['urls'] += 1
+        if not matcher.search(urlsplit(url).path):
+            counts['not_recipe'] += 1
+            continue
+        key = canonical_url(url)
+        if key in seen:
+            counts['seen'] += 1
+            continue
+        output.write(json.dumps(recipe_entry(url, site, ids.next(), lastmod), ensure_ascii=False) + '\n')
+        seen.add(key)
+        counts['new'] += 1
+        if limit and counts['new'] >= limit:
+            break
+    return dict(counts)
+
+
+def seed(seen, records):
+    """Add the URL of every recipe or result dict to `seen`; returns how many were new"""
+    added = 0
+    for record in records:
+        url = record.get('url') or record.get('source_url') or record.get('source')
+        if url and seen.add(canonical_url(url)):
+            added += 1
+    return added
+
+
+def _records_from_paths(patterns):
+    """Recipes and results from JSON/JSONL lists, result files and result directories"""
+    from batch_engine import load_recipes
+    for pattern in patterns:
+        paths = [pattern] if os.path.isdir(pattern) else sorted(glob.glob(pattern) or [pattern])
+        for path in paths:
+            if os.path.isdir(path):
+                yield from _records_from_paths([os.path.join(path, '*_enhancements.json')])
+                continue
+            yield from load_recipes(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discover new recipe URLs from sitemaps")
+    parser.add_argument('--bloom', help=f"seen-URL filter file (default: ${BLOOM_ENV} or {DEFAULT_BLOOM_PATH})")
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help="URLs a new filter is sized for")
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_ERROR_RATE, help="false 'seen' rate a new filter is sized for")
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed_parser = commands.add_parser('seed', help="mark URLs that are already queued or scraped as seen")
+    seed_parser.add_argument('paths', nargs='*', help="recipe lists (.json/.jsonl), result files or result directories")
+    seed_parser.add_argument('--staging', nargs='?', const=os.getenv('PANTRYPAL_STAGING_DB'), default=None,
+                             help="every result in the staging database (default path: $PANTRYPAL_STAGING_DB)")
+    seed_parser.add_argument('--queue', nargs='?', const=os.getenv('PANTRYPAL_WORK_QUEUE') or '', default=None,
+                             help="every recipe in the work queue (default path: $PANTRYPAL_WORK_QUEUE)")
+    discover_parser = commands.add_parser('discover', help="append unseen recipe URLs from sitemaps to a JSONL list")
+    discover_parser.add_argument('sitemaps', nargs='+', help="sitemap or sitemap index URLs or files (.xml or .xml.gz)")
+    discover_parser.add_argument('--output', required=True, help="JSONL recipe list to append to")
+    discover_parser.add_argument('--site', choices=recipe_extraction.SITE_TYPES, help="site type (default: from the sitemap URL)")
+    discover_parser.add_argument('--pattern', help="recipe URL path regex instead of the site's default")
+    discover_parser.add_argument('--limit', type=int, help="stop after this many new recipes")
+    commands.add_parser('stats', help="filter size, keys and expected error rate")
+    args = parser.parse_args(argv)
+
+    with BloomFilter(args.bloom, args.capacity, args.error_rate) as seen:
+        if args.command == 'seed':
+            added = seed(seen, _records_from_paths(args.paths))
+            if args.staging:
+                import staging_store
+                with staging_store.StagingStore(args.staging) as store:
+                    added += seed(seen, store.iter_results())
+            if args.queue is not None:
+                import work_queue
+                with work_queue.WorkQueue(args.queue or None) as queue:
+                    added += seed(seen, queue.iter_recipes())
+            print(f"Marked {added} new URLs as seen ({seen.count} in {seen.path})")
+        elif args.command == 'discover':
+            start = time.perf_counter()
+            remaining = args.limit
+            failed = 0
+            ids = IdSequence(seen.path + '.ids')
+            with open(args.output, 'a', encoding='utf-8') as output:
+                for sitemap in args.sitemaps:
+                    try:
+                        counts = discover(sitemap, seen, ids, output, args.site, args.pattern, remaining, on_log=print)
+                    except Exception as e:
+                        print(f"{sitemap}: failed: {e}")
+                        failed += 1
+                        continue
+                    print(f"{sitemap}: {counts['urls']} URLs, {counts['not_recipe']} not recipes, "
+                          f"{counts['seen']} already seen, {counts['new']} new")
+                    if remaining:
+                        remaining -= counts['new']
+                        if remaining <= 0:
+                            break
+            ids.close()
+            print(f"Done in {time.perf_counter() - start:.1f}s; appended to {args.output}")
+            if failed:
+                return 1
+        else:
+            print(json.dumps(seen.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
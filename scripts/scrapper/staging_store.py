@@ -0,0 +1,250 @@
+"""Local SQLite staging store for scrape results
+
+One WAL-mode database instead of one pretty-printed JSON file per recipe.
+Results are indexed by recipe_id, site and scraped_at, batch runs keep
+their results log, and everything can be exported back to the usual
+<recipe_id>_enhancements.json + batch_scrape_log.json layout.
+
+Set PANTRYPAL_STAGING_DB to a database path to make batch runs write here
+and to let the uploader load recipes from it.
+
+Usage:
+    python scripts/scrapper/staging_store.py stats
+    python scripts/scrapper/staging_store.py list --site allrecipes --since 2025-01-01 --limit 20
+    python scripts/scrapper/staging_store.py export out_dir/ [--site allrecipes]
+    python scripts/scrapper/staging_store.py import "scraped_enhancements/*_enhancements.json"
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+STAGING_DB_ENV = 'PANTRYPAL_STAGING_DB'
+
+# Result fields in the order the JSON files have always used
+RESULT_FIELDS = ('recipe_id', 'recipe_title', 'url', 'site_type', 'enhancements', 'enhancement_count',
+                 'extraction_path', 'bytes_read', 'truncated', 'scraped_at')
+
+
+def open_from_env():
+    """Open the store named by PANTRYPAL_STAGING_DB, or return None when it is not set"""
+    path = os.getenv(STAGING_DB_ENV)
+    return StagingStore(path) if path else None
+
+
+class StagingStore:
+    """Thread-safe wrapper around one SQLite connection; every write is its own transaction"""
+
+    def __init__(self, path):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                recipe_id TEXT PRIMARY KEY,
+                recipe_id_json TEXT NOT NULL,
+                recipe_title TEXT,
+                url TEXT,
+                site_type TEXT,
+                enhancements TEXT NOT NULL,
+                enhancement_count INTEGER NOT NULL,
+                extraction_path TEXT,
+                bytes_read INTEGER,
+                truncated INTEGER NOT NULL DEFAULT 0,
+                scraped_at TEXT NOT NULL,
+                run_id INTEGER,
+                uploaded_at TEXT,
+                cleaned_enhancements TEXT
+            );
+            CREATE INDEX IF NOT EXISTS results_site ON results (site_type, scraped_at);
+            CREATE INDEX IF NOT EXISTS results_scraped_at ON results (scraped_at);
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                results_log TEXT
+            );
+        """)
+        # Databases created before the batch cleaning stage lack its column
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+        if 'cleaned_enhancements' not in columns:
+            self.conn.execute("ALTER TABLE results ADD COLUMN cleaned_enhancements TEXT")
+        self.conn.commit()
+
+    def _write(self, sql, params=()):
+        with self._lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    def start_run(self):
+        return self._write("INSERT INTO runs (started_at) VALUES (?)", (datetime.now().isoformat(),)).lastrowid
+
+    def finish_run(self, run_id, results_log):
+        self._write("UPDATE runs SET finished_at = ?, results_log = ? WHERE id = ?",
+                    (datetime.now().isoformat(), json.dumps(results_log, ensure_ascii=False), run_id))
+
+    def save_result(self, result, run_id=None):
+        """Insert or replace one recipe's result (same dict as the per-recipe JSON file)"""
+        self._write(
+            "INSERT OR REPLACE INTO results (recipe_id, recipe_id_json, recipe_title, url, site_type, enhancements, "
+            "enhancement_count, extraction_path, bytes_read, truncated, scraped_at, run_id, cleaned_enhancements) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(result['recipe_id']), json.dumps(result['recipe_id']), result.get('recipe_title'),
+             result.get('url'), result.get('site_type'),
+             json.dumps(result['enhancements'], ensure_ascii=False), len(result['enhancements']),
+             result.get('extraction_path'), result.get('bytes_read'), int(bool(result.get('truncated'))),
+             result.get('scraped_at') or datetime.now().isoformat(), run_id, _json_or_none(result.get('cleaned_enhancements'))))
+
+    def set_cleaned(self, recipe_id, cleaned_enhancements):
+        """Store the cleaned points of an existing result"""
+        self._write("UPDATE results SET cleaned_enhancements = ? WHERE recipe_id = ?",
+                    (_json_or_none(cleaned_enhancements), str(recipe_id)))
+
+    def mark_uploaded(self, recipe_id):
+        self._write("UPDATE results SET uploaded_at = ? WHERE recipe_id = ?",
+                    (datetime.now().isoformat(), str(recipe_id)))
+
+    def _to_result(self, row):
+        result = {field: row[field] for field in RESULT_FIELDS}
+        # Keep the id's original JSON type (batch files use ints, save_to_file uses strings)
+        result['recipe_id'] = json.loads(row['recipe_id_json'])
+        result['enhancements'] = json.loads(result['enhancements'])
+        result['truncated'] = bool(result['truncated'])
+        if row['cleaned_enhancements'] is not None:
+            result['cleaned_enhancements'] = json.loads(row['cleaned_enhancements'])
+        return result
+
+    def get(self, recipe_id):
+        """Return one result dict, or None"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM results WHERE recipe_id = ?", (str(recipe_id),)).fetchone()
+        return self._to_result(row) if row else None
+
+    def iter_results(self, site=None, since=None, limit=None):
+        """Yield result dicts, newest first, optionally filtered by site and scraped_at >= since"""
+        sql = "SELECT * FROM results WHERE 1 = 1"
+        params = []
+        if site:
+            sql += " AND site_type = ?"
+            params.append(site)
+        if since:
+            sql += " AND scraped_at >= ?"
+            params.append(since)
+        sql += " ORDER BY scraped_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        # Fetch in pages so exporting a large run never holds every row in memory
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield self._to_result(row)
+
+    def last_run_log(self):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT results_log FROM runs WHERE results_log IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stats(self):
+        with self._lock:
+            total, uploaded, truncated = self.conn.execute(
+                "SELECT COUNT(*), COUNT(uploaded_at), COALESCE(SUM(truncated), 0) FROM results").fetchone()
+            sites = dict(self.conn.execute(
+                "SELECT site_type, COUNT(*) FROM results GROUP BY site_type ORDER BY COUNT(*) DESC").fetchall())
+            runs = self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return {'results': total, 'uploaded': uploaded, 'truncated': truncated, 'runs': runs, 'sites': sites}
+
+    def export_json(self, directory, site=None, since=None):
+        """Write results back out as <recipe_id>_enhancements.json files plus the last batch log"""
+        os.makedirs(directory, exist_ok=True)
+        count = 0
+        for result in self.iter_results(site, since):
+            with open(os.path.join(directory, f"{result['recipe_id']}_enhancements.json"), 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            count += 1
+        results_log = self.last_run_log()
+        if results_log:
+            with open(os.path.join(directory, "batch_scrape_log.json"), 'w', encoding='utf-8') as f:
+                json.dump(results_log, f, indent=2, ensure_ascii=False)
+        return count
+
+    def import_json(self, paths):
+        """Load existing result files (batch output or save_to_file output) into the store"""
+        count = 0
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if 'recipe_id' not in data or 'enhancements' not in data:
+                continue
+            data.setdefault('url', data.get('source_url'))
+            self.save_result(data)
+            count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _json_or_none(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, export and import the scrape staging store")
+    parser.add_argument('--db', default=os.getenv(STAGING_DB_ENV), help=f"database path (default: ${STAGING_DB_ENV})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="result, upload and per-site counts")
+    for name, help_text in (('list', "print recent results"), ('export', "write JSON files in the batch layout")):
+        command = commands.add_parser(name, help=help_text)
+        if name == 'export':
+            command.add_argument('directory')
+        command.add_argument('--site', help="only this site type")
+        command.add_argument('--since', help="only results scraped at or after this ISO date")
+        if name == 'list':
+            command.add_argument('--limit', type=int, default=50)
+    load = commands.add_parser('import', help="load *_enhancements.json files")
+    load.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    if not args.db:
+        parser.error(f"pass --db or set {STAGING_DB_ENV}")
+
+    with StagingStore(args.db) as store:
+        if args.command == 'stats':
+            print(json.dumps(store.stats(), indent=2))
+        elif args.command == 'list':
+            for result in store.iter_results(args.site, args.since, args.limit):
+                print(f"{result['recipe_id']:<10} {result['site_type'] or '':<14} {result['enhancement_count']:>3}  "
+                      f"{result['scraped_at'][:19]}  {result['recipe_title']}")
+        elif args.command == 'export':
+            count = store.export_json(args.directory, args.site, args.since)
+            print(f"Exported {count} results to {args.directory}")
+        else:
+            paths = [path for pattern in args.paths for path in (glob.glob(pattern) or [pattern])]
+            paths = [path for path in paths if os.path.basename(path) != 'batch_scrape_log.json']
+            print(f"Imported {store.import_json(paths)} results")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Shared text normalization for every enhancement text path
+
+Scraped text (process_enhancements), rule-based cleaning (clean_enhancements),
+manual entry and the DeepSeek response parser all used to run their own
+re.sub chains per item. The patterns here are compiled once, whitespace is
+collapsed with str.split() instead of a regex pass, each text is lowercased
+at most once, and the keyword check is a single alternation instead of ~80
+substring scans. Every function takes a whole batch of strings.
+
+Pages of one site repeat the same footers, notices and sign-up blurbs, so
+tip_sentences() can take a SentenceCache that remembers each sentence's
+keep/drop decision and cleaned form, and learns whole texts that keep coming
+back so they are not even split again.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+# Words that mark a sentence as a tip worth keeping in rule-based cleaning
+TIP_KEYWORDS = (
+    'tip', 'recommend', 'suggest', 'better', 'best', 'improve', 'enhance',
+    'important', 'key', 'essential', 'critical', 'crucial', 'vital',
+    'don\'t', 'avoid', 'never', 'always', 'ensure', 'make sure',
+    'temperature', 'heat', 'cook', 'bake', 'fry', 'roast', 'grill', 'simmer', 'boil',
+    'substitute', 'replace', 'alternative', 'instead',
+    'secret', 'trick', 'technique', 'method'
+)
+COOKING_TERMS = (
+    'cook', 'bake', 'fry', 'roast', 'grill', 'simmer', 'boil', 'steam', 'sauté',
+    'broil', 'poach', 'blanch', 'braise', 'stew', 'toast', 'whip', 'beat', 'fold',
+    'mix', 'stir', 'blend', 'chop', 'dice', 'mince', 'slice', 'julienne', 'grate',
+    'peel', 'core', 'seed', 'marinate', 'season', 'spice', 'flavor', 'taste',
+    'texture', 'consistency', 'temperature', 'heat', 'cool', 'chill', 'freeze',
+    'thaw', 'rest', 'rise', 'proof', 'ferment', 'cure', 'smoke', 'dry', 'dehydrate'
+)
+
+# Plain substring matches, like the `keyword in sentence.lower()` checks they replace
+_TIP_WORDS = re.compile('|'.join(re.escape(word) for word in sorted(set(TIP_KEYWORDS + COOKING_TERMS), key=len, reverse=True)))
+# Keywords odd spacing can hide ("make\nsure"), which collapsed text would match
+_SPACED_TIP_WORDS = tuple(word for word in TIP_KEYWORDS + COOKING_TERMS if ' ' in word)
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_BRACKETED = re.compile(r'[\(\[].*?[\)\]]')
+_WEAK_MODAL = re.compile(r'\b(?:I|we|you)\s+(?:can|should|could|might|may)\b', re.IGNORECASE)
+_NON_WORD = re.compile(r'[^\w\s]')
+_AI_LIST_MARKER = re.compile(r'^[\d\-\.\*•]+\s*')
+_MANUAL_LIST_MARKER = re.compile(r'^(?:\d+\.\s*)?(?:[\-\*•]\s*)?')
+
+SENTENCE_ENDINGS = ('.', '!', '?')
+SKIPPED_PREFIXES = ('Your Private Notes', 'Click here')
+
+
+def collapse_whitespace(text):
+    """Same result as re.sub(r'\\s+', ' ', text).strip() (str.split() uses the same whitespace set)"""
+    return ' '.join(text.split())
+
+
+def _collapsed(text):
+    """collapse_whitespace(text), skipping the work for text that is already collapsed
+
+    Every whitespace character but the ASCII space is unprintable, so a
+    printable text without double or outer spaces has nothing to collapse.
+    """
+    if text.isprintable() and '  ' not in text and not text.startswith(' ') and not text.endswith(' '):
+        return text
+    return collapse_whitespace(text)
+
+
+def with_period(text):
+    return text if text.endswith(SENTENCE_ENDINGS) else text + '.'
+
+
+def dedup_key(text):
+    """Lowercase, drop punctuation and collapse whitespace, for duplicate checks"""
+    return ' '.join(_NON_WORD.sub('', text.lower()).split())
+
+
+def unique_texts(texts, min_length=15):
+    """Collapse whitespace and drop short and case-insensitive duplicate texts (process_enhancements)"""
+    processed = []
+    seen = set()
+    for text in texts:
+        text = collapse_whitespace(text)
+        if len(text) < min_length:
+            continue
+        key = text.lower()
+        if key not in seen:
+            seen.add(key)
+            processed.append(text)
+    return processed
+
+
+def tip_sentences(texts, min_length=15, cache=None):
+    """Split texts into sentences and return the cleaned ones that mention a tip keyword or cooking term
+
+    Bracketed asides and weak modals ("you can", "we should") are removed and
+    each sentence gets a final period (clean_enhancements). A SentenceCache
+    gives the same points with less work on texts seen before.
+    """
+    points = []
+    for text in texts:
+        if len(text) < min_length or text.startswith(SKIPPED_PREFIXES):
+            continue
+        points.extend(cache.text_points(text, min_length) if cache else _text_points(text, min_length))
+    return points
+
+
+def _text_points(text, min_length):
+    points = []
+    for sentence in _SENTENCE_BREAK.split(text):
+        point = _clean_sentence(sentence.strip(), min_length)
+        if point:
+            points.append(point)
+    return points
+
+
+def _clean_sentence(sentence, min_length):
+    """Cleaned form of one stripped sentence, or None when it is not a tip"""
+    if len(sentence) < min_length or not _TIP_WORDS.search(sentence.lower()):
+        return None
+    sentence = with_period(_WEAK_MODAL.sub('', _BRACKETED.sub('', collapse_whitespace(sentence))))
+    return sentence if len(sentence) >= min_length else None
+
+
+class SentenceCache:
+    """Bounded LRU of tip_sentences() work for one site
+
+    Sentences are keyed by their whitespace-collapsed, lowercased form, so
+    spacing and case variants of one sentence share a slot. Cleaning
+    collapses whitespace first, so spacing variants share a cleaned form;
+    the cleaned form keeps the page's own casing, so each case variant keeps
+    its own within the slot. A whole text seen learn_after times (footers,
+    notices, "Never miss a recipe!") is learned too, keyed by the text
+    itself since the length checks see its spacing; from then on its points
+    come straight from the cache without splitting it. Either way the
+    points are exactly those tip_sentences() returns without a cache. Safe
+    to share between threads: sentences and texts have separate locks.
+    """
+
+    def __init__(self, max_entries=4096, learn_after=3):
+        self.max_entries = max_entries
+        self.learn_after = learn_after
+        self._sentences = OrderedDict()  # (normalized, min_length) -> {collapsed: (sentence, cleaned sentence or None)}
+        self._texts = OrderedDict()      # (text, min_length) -> tuple of points, for learned texts
+        self._sightings = OrderedDict()  # (text, min_length) -> times seen, for texts not learned yet
+        self._sentences_lock = threading.Lock()
+        self._texts_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.text_hits = 0
+        self.learned = 0
+
+    def text_points(self, text, min_length):
+        key = (text, min_length)
+        with self._texts_lock:
+            points = self._texts.get(key)
+            if points is not None:
+                self._texts.move_to_end(key)
+                self.text_hits += 1
+                return points
+        points = []
+        for sentence in _SENTENCE_BREAK.split(text):
+            point = self._sentence_point(sentence.strip(), min_length)
+            if point:
+                points.append(point)
+        with self._texts_lock:
+            seen = self._sightings.pop(key, 0) + 1
+            if seen >= self.learn_after:
+                self._put(self._texts, key, tuple(points))
+                self.learned += 1
+            else:
+                self._put(self._sightings, key, seen)
+        return points
+
+    def _sentence_point(self, sentence, min_length):
+        if len(sentence) < min_length:
+            return None  # cheaper than a lookup, and the one check that sees the uncollapsed length
+        collapsed = _collapsed(sentence)
+        key = (collapsed.lower(), min_length)
+        with self._sentences_lock:
+            variants = self._sentences.get(key)
+            entry = variants.get(collapsed) if variants else None
+            if entry is not None and (entry[0] == sentence or not any(word in key[0] for word in _SPACED_TIP_WORDS)):
+                self.hits += 1
+                self._sentences.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+        point = _clean_sentence(sentence, min_length)
+        with self._sentences_lock:
+            variants = self._sentences.get(key)
+            if variants is None:
+                variants = {}
+                self._put(self._sentences, key, variants)
+            variants[collapsed] = (sentence, point)
+        return point
+
+    def _put(self, entries, key, value):
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        with self._sentences_lock, self._texts_lock:
+            return {'sentences': len(self._sentences), 'learned_texts': len(self._texts), 'hits': self.hits,
+                    'misses': self.misses, 'text_hits': self.text_hits, 'learned': self.learned}
+
+
+def ai_points(response_text, min_length=11):
+    """Parse a model's numbered or bulleted list into sentences, skipping headers and preambles"""
+    points = []
+    for line in response_text.split('\n'):
+        line = line.strip()
+        if not line or line.startswith(('#', 'Here')):
+            continue
+        line = _AI_LIST_MARKER.sub('', line).strip()
+        if len(line) >= min_length:
+            points.append(with_period(line))
+    return points
+
+
+def manual_points(content, min_length=6):
+    """Turn one-tip-per-line manual entry into sentences, dropping "1." / "-" / "•" prefixes"""
+    points = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if len(line) >= min_length:
+            points.append(with_period(_MANUAL_LIST_MARKER.sub('', line, count=1)))
+    return points
@@ -0,0 +1,282 @@
+import logging
+import os
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+from array import array
+from logging.handlers import RotatingFileHandler
+
+# Lines kept in a log view before the oldest are dropped (they stay in the log file)
+DEFAULT_LOG_LINES = 2000
+LOG_LINES_ENV = 'PANTRYPAL_LOG_LINES'
+LOG_DIR_ENV = 'PANTRYPAL_LOG_DIR'
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser('~'), '.pantrypal', 'logs')
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# Long lines (minified HTML) are split into display rows of at most this many characters
+DEFAULT_ROW_WIDTH = 200
+
+
+def log_file_path(name):
+    """Return the rotating log file for an app, honouring PANTRYPAL_LOG_DIR"""
+    return os.path.join(os.getenv(LOG_DIR_ENV) or DEFAULT_LOG_DIR, f"{name}.log")
+
+
+class BoundedLogView:
+    """Append-only log pane that keeps at most max_lines in the Text widget
+
+    Every line is also written to a rotating log file, so trimming the view
+    never loses history. Trimming happens in blocks of ~10% of the cap to
+    keep the per-line cost constant.
+    """
+
+    def __init__(self, text_widget, name, max_lines=None, log_file=None):
+        self.text = text_widget
+        self.max_lines = max_lines or int(os.getenv(LOG_LINES_ENV, DEFAULT_LOG_LINES))
+        self.trim_block = max(1, self.max_lines // 10)
+        self.lines = 0
+        self.log_file = log_file or log_file_path(name)
+        self.logger = self._file_logger(name, self.log_file)
+
+    @staticmethod
+    def _file_logger(name, path):
+        logger = logging.getLogger(f"pantrypal.{name}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if not logger.handlers:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES,
+                                              backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+            except OSError as e:
+                print(f"Log file disabled ({path}): {e}")
+                handler = logging.NullHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        return logger
+
+    def append(self, line):
+        self.logger.info(line)
+        self.text.insert(tk.END, line + "\n")
+        self.lines += 1
+        excess = self.lines - self.max_lines
+        if excess >= self.trim_block:
+            self.text.delete('1.0', f'{excess + 1}.0')
+            self.lines -= excess
+        self.text.see(tk.END)
+
+    def clear(self):
+        self.text.delete('1.0', tk.END)
+        self.lines = 0
+
+
+def row_offsets(text, width=DEFAULT_ROW_WIDTH):
+    """Start offset of every display row: one per line, long lines split every width chars"""
+    offsets = array('Q')
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        line_end = len(text) if end == -1 else end
+        offsets.extend(range(start, max(line_end, start + 1), width))
+        if end == -1:
+            return offsets
+        start = end + 1
+
+
+class TextArray:
+    """Compact list of strings stored as one UTF-8 buffer plus an offset array
+
+    Uses a fraction of the memory of a list of str for large collections and
+    serves as the model behind VirtualListView.
+    """
+
+    def __init__(self, texts=()):
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self.extend(texts)
+
+    def append(self, text):
+        self._data += text.encode('utf-8')
+        self._offsets.append(len(self._data))
+
+    def extend(self, texts):
+        for text in texts:
+            self.append(text)
+
+    def replace(self, texts):
+        self.clear()
+        self.extend(texts)
+
+    def clear(self):
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._data[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class VirtualListView:
+    """Single-column Treeview that only materializes the rows on screen
+
+    The rows come from a model supporting len() and indexing (e.g. TextArray);
+    call refresh() after changing it. A fixed set of Treeview items is reused
+    and relabelled as the view scrolls.
+    """
+
+    def __init__(self, parent, model, heading, column_width=800):
+        self.model = model
+        self.frame = ttk.Frame(parent)
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(self.frame, columns=("value",), show="headings", selectmode='none')
+        self.tree.heading("value", text=heading)
+        self.tree.column("value", width=column_width)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        self.top = 0
+        self.items = []
+
+        self.tree.bind('<Configure>', lambda event: self.refresh())
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Prior>', lambda event: self.scroll(-self.visible_rows()))
+        self.tree.bind('<Next>', lambda event: self.scroll(self.visible_rows()))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree.cget('height'))
+        # One row's worth of height goes to the heading
+        return max(1, height // self.rowheight - 1)
+
+    def scroll(self, rows):
+        self.top += rows
+        self.refresh()
+        return 'break'
+
+    def refresh(self, reset=False):
+        if reset:
+            self.top = 0
+        total = len(self.model)
+        visible = self.visible_rows()
+        self.top = max(0, min(self.top, total - visible))
+        count = min(visible, total - self.top)
+
+        # Reuse the existing items, adding or removing only the difference
+        while len(self.items) < count:
+            self.items.append(self.tree.insert('', 'end', values=("",)))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        for offset, item in enumerate(self.items):
+            self.tree.item(item, values=(self.model[self.top + offset],))
+
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.top = int(float(amount) * len(self.model))
+            self.refresh()
+            return
+        step = self.visible_rows() if unit == 'pages' else 1
+        self.scroll(int(amount) * step)
+
+
+class PagedTextView:
+    """Read-only viewer for large documents that only renders the rows on screen
+
+    The document stays a single Python string; the Text widget holds just the
+    visible window, re-rendered as the scrollbar, mouse wheel or page keys
+    move it, so memory and redraw time do not grow with the document.
+    """
+
+    def __init__(self, parent, width=80, height=15, row_width=DEFAULT_ROW_WIDTH):
+        self.frame = ttk.Frame(parent)
+        self.row_width = row_width
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(self.frame, width=width, height=height, wrap=tk.NONE, state=tk.DISABLED)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+
+        self.document = ""
+        self.offsets = array('Q', [0])
+        self.top = 0
+
+        self.text.bind('<Configure>', lambda event: self._render())
+        self.text.bind('<MouseWheel>', self._on_wheel)
+        self.text.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda event: self.scroll(3))
+        self.text.bind('<Prior>', lambda event: self.scroll(-self.visible_rows()))
+        self.text.bind('<Next>', lambda event: self.scroll(self.visible_rows()))
+        self.text.bind('<Control-Home>', lambda event: self.scroll_to(0))
+        self.text.bind('<Control-End>', lambda event: self.scroll_to(len(self.offsets)))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_text(self, document, offsets=None):
+        """Show a new document; pass offsets from row_offsets() if already computed"""
+        self.document = document
+        self.offsets = offsets if offsets is not None else row_offsets(document, self.row_width)
+        self.top = 0
+        self._render()
+
+    def clear(self):
+        self.set_text("")
+
+    def visible_rows(self):
+        height = self.text.winfo_height()
+        if height <= 1:
+            return int(self.text.cget('height'))
+        return max(1, height // self.linespace)
+
+    def scroll(self, rows):
+        self.scroll_to(self.top + rows)
+        return 'break'
+
+    def scroll_to(self, row):
+        self.top = max(0, min(row, len(self.offsets) - self.visible_rows()))
+        self._render()
+        return 'break'
+
+    def _row(self, index):
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) else len(self.document)
+        return self.document[self.offsets[index]:end].rstrip('\r\n')
+
+    def _render(self):
+        total = len(self.offsets)
+        bottom = min(total, self.top + self.visible_rows())
+        rows = [self._row(i) for i in range(self.top, bottom)]
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', "\n".join(rows))
+        self.text.config(state=tk.DISABLED)
+        self.scrollbar.set(self.top / total, bottom / total)
+
+    def _on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            return self.scroll_to(int(float(amount) * len(self.offsets)))
+        step = self.visible_rows() if unit == 'pages' else 1
+        return self.scroll(int(amount) * step)
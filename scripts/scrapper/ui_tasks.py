@@ -0,0 +1,136 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancel token has been set"""
+
+
+class Job:
+    """Handle for a background job: cancellation, progress and the underlying future"""
+
+    def __init__(self, runner, name):
+        self.runner = runner
+        self.name = name
+        self.future = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled(f"{self.name} cancelled")
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    def progress(self, callback, *args):
+        """Post a progress update; only the latest one per job and callback reaches the UI"""
+        self.runner.post_coalesced((id(self), callback), callback, *args)
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the UI thread"""
+        self.runner.post(callback, *args)
+
+
+class TaskRunner:
+    """Shared background executor for a Tk app
+
+    Long operations run on a small thread pool. Anything that touches widgets
+    is posted back through a queue that the Tk main loop drains every
+    poll_ms with root.after, so worker threads never call Tk directly.
+    Progress updates are coalesced so a fast job cannot flood the UI.
+    """
+
+    def __init__(self, root, max_workers=4, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ui-task')
+        self.jobs = []
+        self._queue = queue.SimpleQueue()
+        self._coalesced = {}
+        self._coalesced_lock = threading.Lock()
+        self._closed = False
+        self.root.after(self.poll_ms, self._drain)
+
+    def submit(self, name, fn, *args, on_done=None, on_error=None, on_cancel=None):
+        """Run fn(job, *args) in the pool; callbacks run on the UI thread"""
+        job = Job(self, name)
+
+        def run():
+            try:
+                result = fn(job, *args)
+            except JobCancelled:
+                if on_cancel:
+                    self.post(on_cancel)
+            except Exception as e:
+                if on_error:
+                    self.post(on_error, e)
+                else:
+                    raise
+            else:
+                if job.cancelled and on_cancel:
+                    self.post(on_cancel)
+                elif on_done:
+                    self.post(on_done, result)
+
+        self.jobs = [j for j in self.jobs if j.running]
+        self.jobs.append(job)
+        job.future = self.executor.submit(run)
+        return job
+
+    def post(self, callback, *args):
+        """Queue callback(*args) to run on the UI thread (safe from any thread)"""
+        with self._coalesced_lock:
+            # Pending progress goes first so a stale update never lands after a result
+            for item in self._coalesced.values():
+                self._queue.put(item)
+            self._coalesced = {}
+            self._queue.put((callback, args))
+
+    def post_coalesced(self, key, callback, *args):
+        """Like post, but only the most recent call per key is kept until the next drain"""
+        with self._coalesced_lock:
+            self._coalesced[key] = (callback, args)
+
+    def running_jobs(self, name=None):
+        return [job for job in self.jobs if job.running and (name is None or job.name == name)]
+
+    def cancel_all(self):
+        for job in self.running_jobs():
+            job.cancel()
+        return len(self.running_jobs())
+
+    def shutdown(self):
+        """Cancel running jobs and stop draining; call before destroying the root window"""
+        self._closed = True
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
+
+    def _drain(self):
+        if self._closed:
+            return
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._run(callback, args)
+        with self._coalesced_lock:
+            pending, self._coalesced = self._coalesced, {}
+        for callback, args in pending.values():
+            self._run(callback, args)
+        self.root.after(self.poll_ms, self._drain)
+
+    def _run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"UI callback error: {e}")
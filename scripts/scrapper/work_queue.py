@@ -0,0 +1,388 @@
+"""Shared recipe work queue for running batch scrapes on many workers
+
+The recipe list is loaded once into a SQLite queue. Headless workers lease
+a few recipes at a time, scrape them with BatchScraper and acknowledge each
+one. Leases expire (default 5 minutes, renewed while a worker is alive), so
+recipes held by a crashed worker go back to the queue; after max_attempts
+expired leases a recipe is marked failed instead of looping forever.
+
+Workers on the same machine can share the database file directly. Workers
+on other machines talk to a small HTTP broker (`serve`) that fronts the
+same database. Result files and staging rows are keyed by recipe_id, so a
+recipe re-run after an expired lease overwrites its own output, and only
+the ack from the current lease holder is accepted.
+
+The broker has no users or TLS. It listens on 127.0.0.1 by default; to
+serve other machines, set a shared token (--token or
+PANTRYPAL_BROKER_TOKEN, on the broker and on every worker), which every
+request must carry. Keep it on a trusted network.
+
+Usage:
+    python scripts/scrapper/work_queue.py load recipes.json
+    python scripts/scrapper/work_queue.py worker --results-dir scraped_enhancements --concurrency 4
+    PANTRYPAL_BROKER_TOKEN=... python scripts/scrapper/work_queue.py serve --host 0.0.0.0 --port 8770
+    python scripts/scrapper/work_queue.py worker --broker http://queue-host:8770 --results-dir scraped_enhancements
+    python scripts/scrapper/work_queue.py stats
+"""
+import argparse
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUEUE_ENV = 'PANTRYPAL_WORK_QUEUE'
+BROKER_ENV = 'PANTRYPAL_BROKER_URL'
+TOKEN_ENV = 'PANTRYPAL_BROKER_TOKEN'
+TOKEN_HEADER = 'X-Broker-Token'
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser('~'), '.pantrypal', 'work_queue.sqlite3')
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+STATES = ('pending', 'leased', 'success', 'failed')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def open_queue(path=None, broker_url=None):
+    """A BrokerClient when a broker URL is given (or PANTRYPAL_BROKER_URL is set), else a local WorkQueue"""
+    broker_url = broker_url or os.getenv(BROKER_ENV)
+    return BrokerClient(broker_url) if broker_url else WorkQueue(path)
+
+
+class WorkQueue:
+    """Lease-based queue in one SQLite file; safe across threads and processes on one machine"""
+
+    def __init__(self, path=None, max_attempts=MAX_ATTEMPTS):
+        self.path = path or os.getenv(QUEUE_ENV) or DEFAULT_QUEUE_PATH
+        self.max_attempts = max_attempts
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Autocommit mode so lease() can take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY,
+                recipe_id TEXT NOT NULL UNIQUE,
+                recipe TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires);
+        """)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return value
+
+    def enqueue(self, recipes, reset=False):
+        """Add {id, title, url} recipes; ones already queued are kept unless reset is True"""
+        verb = "INSERT OR REPLACE" if reset else "INSERT OR IGNORE"
+        rows = [(str(recipe['id']), json.dumps(recipe, ensure_ascii=False)) for recipe in recipes]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(f"{verb} INTO tasks (recipe_id, recipe) VALUES (?, ?)", rows)
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def lease(self, worker, count=1, lease_seconds=LEASE_SECONDS):
+        """Claim up to `count` pending or expired recipes for `worker`; returns the recipe dicts"""
+        now = time.time()
+
+        def claim(conn):
+            # Expired leases that already used every attempt are given up on
+            conn.execute(
+                "UPDATE tasks SET state = 'failed', error = 'lease expired', worker = NULL, finished_at = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            rows = conn.execute(
+                "SELECT seq, recipe FROM tasks WHERE state = 'pending' "
+                "OR (state = 'leased' AND lease_expires < ?) ORDER BY seq LIMIT ?",
+                (now, int(count))).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE seq = ?",
+                [(worker, now + lease_seconds, seq) for seq, _ in rows])
+            return [json.loads(recipe) for _, recipe in rows]
+        return self._transaction(claim)
+
+    def renew(self, worker, lease_seconds=LEASE_SECONDS):
+        """Extend every lease `worker` still holds; returns how many were extended"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE state = 'leased' AND worker = ?",
+            (time.time() + lease_seconds, worker)).rowcount)
+
+    def ack(self, worker, recipe_id, status, error=None):
+        """Record a finished recipe; False if the lease had already passed to another worker"""
+        return bool(self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = ?, error = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE recipe_id = ? AND worker = ? AND state = 'leased'",
+            (status, error, time.time(), str(recipe_id), worker)).rowcount))
+
+    def release(self, worker, recipe_ids=None):
+        """Hand leased recipes back untouched (all of the worker's leases when recipe_ids is None)"""
+        sql = ("UPDATE tasks SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+               "WHERE state = 'leased' AND worker = ?")
+        if recipe_ids is None:
+            return self._transaction(lambda conn: conn.execute(sql, (worker,)).rowcount)
+        return self._transaction(lambda conn: sum(
+            conn.execute(sql + " AND recipe_id = ?", (worker, str(recipe_id))).rowcount for recipe_id in recipe_ids))
+
+    def requeue_failed(self):
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = 'pending', worker = NULL, attempts = 0, error = NULL, finished_at = NULL "
+            "WHERE state = 'failed'").rowcount)
+
+    def iter_recipes(self):
+        """Yield every queued recipe whatever its state (e.g. so discovery can skip them)"""
+        with self._lock:
+            cursor = self.conn.execute("SELECT recipe FROM tasks ORDER BY seq")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for (recipe,) in rows:
+                yield json.loads(recipe)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+            workers = dict(self.conn.execute(
+                "SELECT worker, COUNT(*) FROM tasks WHERE state = 'leased' GROUP BY worker").fetchall())
+            retried = self.conn.execute("SELECT COUNT(*) FROM tasks WHERE attempts > 1").fetchone()[0]
+        stats = {state: counts.get(state, 0) for state in STATES}
+        stats['total'] = sum(counts.values())
+        stats['retried'] = retried
+        stats['leases_by_worker'] = workers
+        return stats
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BrokerClient:
+    """WorkQueue interface over HTTP for workers on other machines (see `serve`)"""
+
+    def __init__(self, url, timeout=30, token=None, retries=3):
+        import requests
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        token = token or os.getenv(TOKEN_ENV)
+        if token:
+            self.session.headers[TOKEN_HEADER] = token
+
+    def _call(self, method, **params):
+        # A 5xx means the broker rolled the call back (e.g. "database is locked"), so it is safe to repeat
+        for attempt in range(self.retries + 1):
+            response = self.session.post(f"{self.url}/{method}", json=params, timeout=self.timeout)
+            if response.status_code < 500 or attempt == self.retries:
+                break
+            time.sleep(0.5 * 2 ** attempt)
+        response.raise_for_status()
+        return response.json()['result']
+
+    def enqueue(self, recipes, reset=False):
+        return self._call('enqueue', recipes=recipes, reset=reset)
+
+    def lease(self, worker, count=1, lease_seconds=LEASE_SECONDS):
+        return self._call('lease', worker=worker, count=count, lease_seconds=lease_seconds)
+
+    def renew(self, worker, lease_seconds=LEASE_SECONDS):
+        return self._call('renew', worker=worker, lease_seconds=lease_seconds)
+
+    def ack(self, worker, recipe_id, status, error=None):
+        return self._call('ack', worker=worker, recipe_id=recipe_id, status=status, error=error)
+
+    def release(self, worker, recipe_ids=None):
+        return self._call('release', worker=worker, recipe_ids=recipe_ids)
+
+    def requeue_failed(self):
+        return self._call('requeue_failed')
+
+    def stats(self):
+        return self._call('stats')
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BrokerServer:
+    """Serves one WorkQueue to BrokerClients as JSON over HTTP POST"""
+
+    METHODS = ('enqueue', 'lease', 'renew', 'ack', 'release', 'requeue_failed', 'stats')
+
+    def __init__(self, queue, host='127.0.0.1', port=8770, token=None):
+        self.queue = queue
+        self.token = token
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='work-queue-broker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                method = self.path.strip('/')
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if server.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), server.token):
+                    return self._reply(401, {'error': "missing or wrong broker token"})
+                if method not in server.METHODS:
+                    return self._reply(404, {'error': f"unknown method {method}"})
+                try:
+                    params = json.loads(body or b'{}')
+                    result = getattr(server.queue, method)(**params)
+                except (TypeError, ValueError) as e:
+                    return self._reply(400, {'error': str(e)})
+                except Exception as e:
+                    # e.g. sqlite3.OperationalError: database is locked; the client retries on 5xx
+                    print(f"Broker error in {method}: {type(e).__name__}: {e}", file=sys.stderr)
+                    return self._reply(500, {'error': f"{type(e).__name__}: {e}"})
+                self._reply(200, {'result': result})
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def run_worker(queue, results_dir, worker_id=None, concurrency=1, lease_seconds=LEASE_SECONDS,
+               delay_range=(1.5, 3.0), staging=True, on_log=None):
+    """Drain the queue with one BatchScraper and return this worker's results log"""
+    from batch_engine import BatchScraper
+    import change_feed
+    import staging_store
+
+    worker_id = worker_id or default_worker_id()
+    store = staging_store.open_from_env() if staging else None
+    feed = change_feed.open_from_env()
+    try:
+        engine = BatchScraper(results_dir, concurrency=concurrency, delay_range=delay_range,
+                              staging_store=store, change_feed=feed, on_log=on_log)
+        return engine.run_queue(queue, worker_id, lease_seconds)
+    finally:
+        if store:
+            store.close()
+        if feed:
+            feed.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared work queue for multi-process batch scraping")
+    parser.add_argument('--queue', help=f"queue database (default: ${QUEUE_ENV} or {DEFAULT_QUEUE_PATH})")
+    parser.add_argument('--broker', default=os.getenv(BROKER_ENV), help=f"broker URL instead of a local queue (${BROKER_ENV})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('load', help="add a JSON or JSONL list of {id, title, url} recipes")
+    load.add_argument('recipes')
+    load.add_argument('--reset', action='store_true', help="re-queue recipes that were already processed")
+    worker = commands.add_parser('worker', help="lease and scrape recipes until the queue is empty")
+    worker.add_argument('--results-dir', default='scraped_enhancements')
+    worker.add_argument('--concurrency', type=int, default=1)
+    worker.add_argument('--worker-id', default=default_worker_id())
+    worker.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS)
+    worker.add_argument('--delay', type=float, nargs=2, default=(1.5, 3.0), metavar=('MIN', 'MAX'))
+    serve = commands.add_parser('serve', help="serve the local queue to remote workers over HTTP")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8770)
+    serve.add_argument('--token', default=os.getenv(TOKEN_ENV),
+                       help=f"shared token workers must send (${TOKEN_ENV}); required unless serving on loopback")
+    commands.add_parser('stats', help="task counts by state and current leases")
+    commands.add_parser('requeue-failed', help="give failed recipes another round")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        if not args.token and args.host not in ('127.0.0.1', 'localhost', '::1'):
+            parser.error(f"serving on {args.host} needs a shared token (--token or ${TOKEN_ENV})")
+        with WorkQueue(args.queue) as queue, BrokerServer(queue, args.host, args.port, args.token) as broker:
+            print(f"Serving {queue.path} on {broker.url} (Ctrl+C to stop)")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    with open_queue(args.queue, args.broker) as queue:
+        if args.command == 'load':
+            from batch_engine import load_recipes
+            print(f"Queued {queue.enqueue(load_recipes(args.recipes), args.reset)} recipes")
+        elif args.command == 'worker':
+            results_log = run_worker(queue, args.results_dir, args.worker_id, args.concurrency,
+                                     args.lease_seconds, tuple(args.delay))
+            print(f"{args.worker_id}: {results_log['successful']} successful, {results_log['failed']} failed")
+        elif args.command == 'requeue-failed':
+            print(f"Re-queued {queue.requeue_failed()} recipes")
+        else:
+            print(json.dumps(queue.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
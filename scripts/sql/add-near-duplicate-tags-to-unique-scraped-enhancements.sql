@@ -0,0 +1,19 @@
+-- Migration: Add near-duplicate tags to unique_scraped_enhancements
+-- The scraper uploader (PANTRYPAL_DEDUP=tag) fills these for enhancements that repeat an earlier upload
+
+-- The recipe and text of the earlier (canonical) enhancement this row near-duplicates
+ALTER TABLE unique_scraped_enhancements
+ADD COLUMN IF NOT EXISTS duplicate_of_recipe_id TEXT,
+ADD COLUMN IF NOT EXISTS duplicate_of_enhancement TEXT,
+ADD COLUMN IF NOT EXISTS duplicate_similarity REAL;
+
+-- Let readers skip or group duplicates cheaply
+CREATE INDEX IF NOT EXISTS idx_unique_scraped_enhancements_duplicate_of
+ON unique_scraped_enhancements (duplicate_of_recipe_id)
+WHERE duplicate_of_recipe_id IS NOT NULL;
+
+-- Document the columns
+COMMENT ON COLUMN unique_scraped_enhancements.duplicate_of_enhancement IS
+'Earlier enhancement text this one near-duplicates (estimated word-set Jaccard >= 0.8); NULL for canonical texts';
+COMMENT ON COLUMN unique_scraped_enhancements.duplicate_similarity IS
+'Estimated Jaccard similarity to duplicate_of_enhancement; NULL for canonical texts';